@@ -0,0 +1,253 @@
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from export_archive import DEFAULT_ARCHIVE_FILENAME, ExportArchive
+from generate_synthetic_intex_db import generate_synthetic_intex_db
+from pipeline_metrics import METRICS
+from run_workspace import RunWorkspace
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+class PipelineBenchmark:
+    """
+    Times each stage of the Intex -> knowledge graph pipeline against a (synthetic) snapshot.
+    Outputs go to a private run workspace, so existing cmbs_* files next to the snapshot are neither counted
+    nor overwritten; close() removes it.
+    """
+
+    def __init__(self, db_path: str, max_cusips: Optional[int] = 200):
+        """
+        Args:
+            db_path (str): Intex-shaped SQLite database to benchmark against
+            max_cusips (Optional[int]): Number of holdings CUSIPs to push through the export stages (None = all)
+        """
+        from extract_intex_db_to_kg import CMBSDatabaseHandler
+        self.db_path = db_path
+        self.workspace = RunWorkspace(tempfile.mkdtemp(prefix='cmbs_bench_run_'))
+        self.work_dir = self.workspace.dir
+        self.handler = CMBSDatabaseHandler(db_path)
+        cusips = self.handler.get_all_holdings_cusip()
+        self.cusips = cusips[:max_cusips] if max_cusips else cusips
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def close(self) -> None:
+        """Remove the run workspace and everything the stages wrote into it."""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _time_stage(self, name: str, func: Callable[[], int]) -> None:
+        """Run one stage, recording wall time and the number of items it processed; repeats keep the fastest."""
+        start = time.perf_counter()
+        items = func()
+        seconds = time.perf_counter() - start
+        print(f"{name:<28} {seconds:10.4f}s  items={items}")
+        if name in self.results and self.results[name]['seconds'] <= seconds:
+            return
+        self.results[name] = {
+            'seconds': round(seconds, 6),
+            'items': items,
+            'per_item_ms': round(seconds * 1000.0 / items, 6) if items else None,
+        }
+
+    def bench_handler_lookups(self) -> int:
+        count = 0
+        for cusip in self.cusips:
+            deal_id = self.handler.get_deal_id_by_cusip(cusip)
+            self.handler.get_issuer_name_by_cusip(cusip)
+            count += 2
+            if deal_id is not None:
+                self.handler.get_bloomberg_name_by_deal_id(deal_id)
+                self.handler.get_property_info_by_deal_id(deal_id)
+                count += 2
+        return count
+
+    def bench_export(self) -> int:
+        for cusip in self.cusips:
+            self.handler.export_cusip_data_to_jsonld(cusip, write_jsonld=True, workspace=self.workspace)
+        return len(self.cusips)
+
+    def bench_export_archive(self) -> int:
+        """The export path of extract_intex_db_to_kg's __main__: holdings grouped by deal into one archive."""
+        from deal_memo import DealMemo
+        archive = ExportArchive(self.workspace.path(DEFAULT_ARCHIVE_FILENAME))
+        try:
+            archive.clear()
+            stats = self.handler.export_holdings(self.cusips, deal_memo=DealMemo(), archive=archive)
+        finally:
+            archive.close()
+        return stats['exported']
+
+    def bench_archive_combine_csv(self) -> int:
+        archive = ExportArchive(self.workspace.path(DEFAULT_ARCHIVE_FILENAME))
+        try:
+            archive.combine_csv(self.workspace.path('combined_archive_pltr_nodes.csv'))
+            return len(archive.cusips())
+        finally:
+            archive.close()
+
+    def bench_jsonld_to_cypher(self) -> int:
+        from jsonld_to_cypher import convert_jsonld_file_to_cypher
+        files = glob.glob(os.path.join(self.work_dir, 'cmbs_graph_*.jsonld'))
+        for path in files:
+            convert_jsonld_file_to_cypher(path, path[:-len('.jsonld')] + '.cypher')
+        return len(files)
+
+    def bench_combine_csv(self) -> int:
+        from extract_intex_db_to_kg import combine_csv_files
+        pattern = os.path.join(self.work_dir, 'cmbs_pltr_nodes*.csv')
+        combine_csv_files(pattern=pattern, output_file=os.path.join(self.work_dir, 'combined_cmbs_pltr_nodes.csv'))
+        return len(glob.glob(pattern))
+
+    def bench_convert_to_excel(self) -> int:
+        from extract_intex_db_to_kg import convert_to_excel
+        convert_to_excel(os.path.join(self.work_dir, 'combined_cmbs_pltr_nodes.csv'))
+        return 1
+
+    def bench_neo4j_import(self, uri: str, user: str, password: str, database: str) -> int:
+        from neo4j_handler import DealLister
+        lister = DealLister(uri, user, password, database)
+        try:
+            lister.create_database(database)
+            lister.clean_database(database)
+            files = glob.glob(os.path.join(self.work_dir, 'cmbs_graph_*.cypher'))
+            for path in files:
+                lister.execute_cypher_file(path, database=database)
+            return len(files)
+        finally:
+            lister.close()
+
+    def run(self, neo4j: Optional[Dict[str, str]] = None, repeat: int = 1) -> Dict[str, Dict[str, Any]]:
+        """
+        Run every stage in pipeline order.
+        Args:
+            neo4j (Optional[Dict[str, str]]): uri/user/password/database for the import stage; skipped when None
+            repeat (int): Runs of the whole pipeline; each stage reports its fastest run
+        Returns:
+            Dict[str, Dict[str, Any]]: Per-stage timings
+        """
+        for _ in range(repeat):
+            self._run_once(neo4j)
+        return self.results
+
+    def _run_once(self, neo4j: Optional[Dict[str, str]]) -> None:
+        self._time_stage('handler_lookups', self.bench_handler_lookups)
+        self._time_stage('export_cusip_data_to_jsonld', self.bench_export)
+        self._time_stage('jsonld_to_cypher', self.bench_jsonld_to_cypher)
+        self._time_stage('combine_csv_files', self.bench_combine_csv)
+        try:
+            import openpyxl  # noqa: F401 -- pandas needs it for to_excel
+            self._time_stage('convert_to_excel', self.bench_convert_to_excel)
+        except ImportError:
+            print("openpyxl not installed, skipping convert_to_excel stage.")
+        self._time_stage('export_holdings_to_archive', self.bench_export_archive)
+        self._time_stage('archive_combine_csv', self.bench_archive_combine_csv)
+        if neo4j:
+            self._time_stage('neo4j_import', lambda: self.bench_neo4j_import(**neo4j))
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.5,
+                        min_seconds: float = 0.1, meta_keys=('scale',)) -> list:
+    """
+    Compare stage timings with a stored baseline.
+    Args:
+        results (Dict[str, Any]): Current benchmark report
+        baseline (Dict[str, Any]): Baseline benchmark report
+        tolerance (float): Allowed relative slowdown before a stage counts as a regression
+        min_seconds (float): Absolute slowdown below which differences are treated as noise
+        meta_keys (Iterable[str]): Run settings in meta that must match for the timings to be comparable
+    Returns:
+        list: Regressions as dicts with stage, baseline, current and ratio
+    """
+    regressions = []
+    for key in meta_keys:
+        if results.get('meta', {}).get(key) != baseline.get('meta', {}).get(key):
+            print(f"Warning: baseline was recorded with a different {key}; comparison may not be meaningful.")
+    for stage, current in results['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or not base.get('seconds'):
+            continue
+        ratio = current['seconds'] / base['seconds']
+        status = 'ok'
+        if ratio > 1.0 + tolerance and current['seconds'] - base['seconds'] > min_seconds:
+            status = 'REGRESSION'
+            regressions.append({'stage': stage, 'baseline': base['seconds'],
+                                'current': current['seconds'], 'ratio': round(ratio, 3)})
+        print(f"{stage:<28} baseline={base['seconds']:.4f}s current={current['seconds']:.4f}s x{ratio:.2f} {status}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the Intex -> knowledge graph pipeline.')
+    parser.add_argument('--db', help='Existing Intex-shaped SQLite file; a synthetic one is generated when omitted')
+    parser.add_argument('--properties', type=int, default=1000, help='Synthetic scale (number of propinfo rows)')
+    parser.add_argument('--max-cusips', type=int, default=200, help='Holdings CUSIPs to export (0 = all)')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='Baseline JSON to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative slowdown per stage')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of the pipeline; each stage keeps its fastest (sub-second stages are noisy)')
+    parser.add_argument('--neo4j-uri', help='Also benchmark Cypher import into this Neo4j server')
+    parser.add_argument('--neo4j-user', default='neo4j')
+    parser.add_argument('--neo4j-password', default='testtest')
+    parser.add_argument('--neo4j-database', default='cmbs-bench')
+    args = parser.parse_args(argv)
+
+    db_path = args.db
+    if not db_path:
+        work_dir = tempfile.mkdtemp(prefix='cmbs_bench_')
+        db_path = os.path.join(work_dir, f"CMBS_SYNTH_{args.properties}")
+        generate_synthetic_intex_db(db_path, num_properties=args.properties)
+
+    bench = PipelineBenchmark(db_path, max_cusips=args.max_cusips or None)
+    neo4j = None
+    if args.neo4j_uri:
+        neo4j = {'uri': args.neo4j_uri, 'user': args.neo4j_user,
+                 'password': args.neo4j_password, 'database': args.neo4j_database}
+    try:
+        stages = bench.run(neo4j, repeat=max(args.repeat, 1))
+    finally:
+        bench.close()
+
+    report = {
+        'meta': {
+            'scale': args.properties if not args.db else os.path.basename(args.db),
+            'cusips': len(bench.cusips),
+            'repeat': max(args.repeat, 1),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'stages': stages,
+        'metrics': METRICS.snapshot(),
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed against {args.baseline}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
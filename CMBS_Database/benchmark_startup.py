@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from benchmark_pipeline import compare_to_baseline
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(MODULE_DIR, 'neo4j_cmbs_mcp_server.py')
+DEFAULT_BASELINE_PATH = os.path.join(MODULE_DIR, 'startup_baseline.json')
+
+
+def measure_import_time(runs: int = 5) -> float:
+    """
+    Median wall time to import the MCP server module in a fresh interpreter.
+    Returns:
+        float: Seconds
+    """
+    code = ("import time; t = time.perf_counter(); import neo4j_cmbs_mcp_server; "
+            "print(time.perf_counter() - t)")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=MODULE_DIR, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+async def _measure_first_response(tool: str, arguments: Dict[str, Any], env: Dict[str, str]) -> Dict[str, float]:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], cwd=MODULE_DIR, env=env)
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter()
+            await session.call_tool(tool, arguments)
+            first_call = time.perf_counter()
+            await session.call_tool(tool, arguments)
+            second_call = time.perf_counter()
+    return {
+        'spawn_to_initialize': initialized - start,
+        'first_tool_call': first_call - initialized,
+        'warm_tool_call': second_call - first_call,
+        'time_to_first_response': first_call - start,
+    }
+
+
+def measure_first_response(tool: str = 'get_server_metrics', arguments: Optional[Dict[str, Any]] = None,
+                           warm_up: bool = False) -> Dict[str, float]:
+    """
+    Spawn the MCP server over stdio and time initialize, the first tool call and a repeated (warm) call.
+    Args:
+        tool (str): Tool to call; use a Neo4j-backed tool to include driver creation and query compilation
+        arguments (Optional[Dict[str, Any]]): Tool arguments
+        warm_up (bool): Start the server with CMBS_WARM_UP=1
+    Returns:
+        Dict[str, float]: Seconds per phase
+    """
+    env = dict(os.environ)
+    env['CMBS_WARM_UP'] = '1' if warm_up else '0'
+    return asyncio.run(_measure_first_response(tool, arguments or {}, env))
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark MCP server import time and time to first response.')
+    parser.add_argument('--runs', type=int, default=5, help='Import-time samples (median is reported)')
+    parser.add_argument('--tool', default='get_server_metrics', help='Tool to call for the first-response timing')
+    parser.add_argument('--args', default='{}', help='JSON tool arguments, e.g. \'{"deal_id": "14"}\'')
+    parser.add_argument('--warm-up', action='store_true', help='Start the server with CMBS_WARM_UP=1')
+    parser.add_argument('--output', default='startup_results.json', help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='Baseline JSON to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative slowdown per phase')
+    args = parser.parse_args(argv)
+
+    phases = {'import_server': measure_import_time(args.runs)}
+    phases.update(measure_first_response(args.tool, json.loads(args.args), args.warm_up))
+    for name, seconds in phases.items():
+        print(f"{name:<24} {seconds:10.4f}s")
+
+    report = {
+        'meta': {
+            'tool': args.tool,
+            'warm_up': args.warm_up,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'stages': {name: {'seconds': round(seconds, 6)} for name, seconds in phases.items()},
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Startup results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_to_baseline(report, baseline, args.tolerance, meta_keys=('tool', 'warm_up')):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
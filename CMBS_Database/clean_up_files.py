@@ -1,4 +1,4 @@
-import os
+from run_workspace import clean_workspace
 
 def clean_file(filepath):
     """Cleans up a file by removing empty lines and trimming whitespace."""
@@ -11,14 +11,11 @@ def clean_file(filepath):
         file.write('\n'.join(cleaned_lines))
 
 def clean_directory(directory):
-    """Cleans up all files in the specified directory and deletes specific 'cmbs_' files."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.startswith("cmbs_") and file.endswith(('.txt','.csv', '.jsonld', '.cypher')):
-                filepath = os.path.join(root, file)
-                print(f"Deleting file: {filepath}")
-                os.remove(filepath)
+    """Cleans up a run workspace from its manifest, or the top-level 'cmbs_' files of a plain directory."""
+    removed = clean_workspace(directory)
+    print(f"Deleted {removed} files from {directory}")
 
 if __name__ == "__main__":
-    directory = "./"
-    clean_directory(directory)
+    import sys
+    for directory in sys.argv[1:] or ["./"]:
+        clean_directory(directory)
@@ -0,0 +1,219 @@
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from get_geo_from_address import format_property_address, normalize_address
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_KINDS = ['properties', 'owners', 'addresses']
+# Keys that mean "unknown" and would otherwise link unrelated deals
+PLACEHOLDER_KEYS = {'', 'NONE', 'NAN', 'NULL', 'N/A', 'UNKNOWN', 'UNKNOWNOWNER', 'UNKNOWNPROPNAME', 'UNKNOWNADDRESS'}
+# Features shared by more deals than this still join components but are left out of pairwise counts,
+# which grow with the square of the feature's degree
+DEFAULT_MAX_FEATURE_DEGREE = 200
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving and union by size."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def _normalize_key(values: pd.Series) -> pd.Series:
+    keys = values.astype('string').str.upper().str.split().str.join(' ')
+    return keys.where(~keys.isin(PLACEHOLDER_KEYS))
+
+
+def deal_features(collateral: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce (CUSIP, property) rows to distinct (deal_id, kind, key) features.
+    A property is identified by name and address, an address by its normalized form, an owner by name.
+    """
+    frame = collateral.drop_duplicates(['deal_id', 'address', 'state', 'prop_name', 'owner_name'])
+    addresses = pd.Series([normalize_address(format_property_address(a if isinstance(a, str) else None,
+                                                                     s if isinstance(s, str) else None))
+                           for a, s in zip(frame['address'], frame['state'])], index=frame.index, dtype='string')
+    addresses = addresses.where(~addresses.isin(PLACEHOLDER_KEYS))
+    names = _normalize_key(frame['prop_name'])
+    features = pd.concat([
+        pd.DataFrame({'deal_id': frame['deal_id'], 'kind': 'properties', 'key': names + ' @ ' + addresses}),
+        pd.DataFrame({'deal_id': frame['deal_id'], 'kind': 'owners', 'key': _normalize_key(frame['owner_name'])}),
+        pd.DataFrame({'deal_id': frame['deal_id'], 'kind': 'addresses', 'key': addresses}),
+    ], ignore_index=True)
+    return features.dropna().drop_duplicates()
+
+
+def _pair_counts(deal_idx: np.ndarray, feature_idx: np.ndarray, num_deals: int, max_degree: int):
+    """
+    Sparse co-occurrence (the upper triangle of M @ M.T for the deal x feature incidence matrix M):
+    every feature contributes one count to each pair of deals that share it.
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: pair codes (a * num_deals + b, a < b), counts, features skipped as hubs
+    """
+    order = np.lexsort((deal_idx, feature_idx))
+    deal_idx, feature_idx = deal_idx[order], feature_idx[order]
+    starts = np.flatnonzero(np.r_[True, feature_idx[1:] != feature_idx[:-1]])
+    sizes = np.diff(np.r_[starts, len(feature_idx)])
+    codes = []
+    hubs = 0
+    for size in np.unique(sizes[sizes >= 2]):
+        if size > max_degree:
+            hubs += int((sizes == size).sum())
+            continue
+        # All groups of the same size at once: (groups, size) member matrix, then every (i < j) column pair
+        members = deal_idx[starts[sizes == size][:, None] + np.arange(size)]
+        i, j = np.triu_indices(size, 1)
+        codes.append((members[:, i].astype(np.int64) * num_deals + members[:, j]).ravel())
+    if not codes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), hubs
+    pair_codes, counts = np.unique(np.concatenate(codes), return_counts=True)
+    return pair_codes, counts, hubs
+
+
+def analyze_collateral_overlap(collateral: pd.DataFrame, max_feature_degree: int = DEFAULT_MAX_FEATURE_DEGREE,
+                               min_shared: int = 1) -> Dict[str, Any]:
+    """
+    Find deals behind different holdings that share collateral, and group holdings into connected components.
+    Args:
+        collateral (pd.DataFrame): One row per (cusip, property), e.g. CMBSDatabaseHandler.get_holdings_collateral()
+        max_feature_degree (int): Features shared by more deals are excluded from pairwise counts
+        min_shared (int): Minimum total shared features for a deal pair to be reported
+    Returns:
+        Dict[str, Any]: summary, components (largest first) and pairs (deal pairs with shared counts by kind)
+    """
+    start = time.perf_counter()
+    holdings_by_deal = collateral.groupby('deal_id')['cusip'].agg(lambda s: sorted(set(s))).to_dict()
+    features = deal_features(collateral)
+    deal_ids = np.array(sorted(holdings_by_deal), dtype=object)
+    num_deals = len(deal_ids)
+    deal_pos = {deal_id: i for i, deal_id in enumerate(deal_ids)}
+    deal_idx = features['deal_id'].map(deal_pos).to_numpy(dtype=np.int64)
+    feature_codes = pd.factorize(features['kind'] + '\x1f' + features['key'])[0]
+
+    # Connected components: union every deal holding a feature with the feature's first holder
+    uf = UnionFind(num_deals)
+    order = np.argsort(feature_codes, kind='stable')
+    sorted_features, sorted_deals = feature_codes[order], deal_idx[order]
+    first = np.r_[True, sorted_features[1:] != sorted_features[:-1]]
+    anchors = sorted_deals[np.maximum.accumulate(np.where(first, np.arange(len(first)), 0))] if len(first) else []
+    for a, b in zip(anchors, sorted_deals):
+        if a != b:
+            uf.union(int(a), int(b))
+
+    shared: Dict[int, Dict[str, int]] = {}
+    hubs = {}
+    kinds = features['kind'].to_numpy()
+    for kind in OVERLAP_KINDS:
+        mask = kinds == kind
+        codes, counts, hubs[kind] = _pair_counts(deal_idx[mask], feature_codes[mask], num_deals, max_feature_degree)
+        for code, count in zip(codes.tolist(), counts.tolist()):
+            shared.setdefault(code, dict.fromkeys(OVERLAP_KINDS, 0))[kind] = count
+
+    pairs = []
+    for code, by_kind in shared.items():
+        total = sum(by_kind.values())
+        if total < min_shared:
+            continue
+        a, b = divmod(code, num_deals)
+        pairs.append({
+            'deal_a': str(deal_ids[a]), 'deal_b': str(deal_ids[b]),
+            'cusips_a': holdings_by_deal[deal_ids[a]], 'cusips_b': holdings_by_deal[deal_ids[b]],
+            'shared_properties': by_kind['properties'], 'shared_owners': by_kind['owners'],
+            'shared_addresses': by_kind['addresses'], 'shared_total': total,
+        })
+    pairs.sort(key=lambda p: (-p['shared_total'], p['deal_a'], p['deal_b']))
+
+    members: Dict[int, List[int]] = {}
+    for i in range(num_deals):
+        members.setdefault(uf.find(i), []).append(i)
+    components = []
+    for deals in members.values():
+        if len(deals) < 2:
+            continue
+        cusips = sorted({c for i in deals for c in holdings_by_deal[deal_ids[i]]})
+        components.append({'deals': sorted(str(deal_ids[i]) for i in deals), 'cusips': cusips,
+                           'num_deals': len(deals), 'num_cusips': len(cusips)})
+    components.sort(key=lambda c: (-c['num_cusips'], c['deals'][0]))
+    for n, component in enumerate(components, 1):
+        component['component'] = n
+
+    elapsed = time.perf_counter() - start
+    METRICS.observe('collateral_overlap', elapsed)
+    summary = {
+        'holdings': int(collateral['cusip'].nunique()), 'deals': num_deals, 'deal_pairs': len(pairs),
+        'components': len(components),
+        'largest_component_cusips': components[0]['num_cusips'] if components else 0,
+        'hub_features_skipped': hubs, 'seconds': round(elapsed, 3),
+    }
+    logger.info(f"Collateral overlap: {summary}")
+    return {'summary': summary, 'components': components, 'pairs': pairs}
+
+
+def write_overlap_report(result: Dict[str, Any], output_path: str) -> str:
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    logger.info(f"Collateral overlap report written to {output_path}")
+    return output_path
+
+
+def overlap_edge_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows for DealLister.write_collateral_overlaps: one SHARES_COLLATERAL_WITH edge per deal pair."""
+    component_of = {deal: c['component'] for c in result['components'] for deal in c['deals']}
+    return [{
+        'deal_a': p['deal_a'], 'deal_b': p['deal_b'],
+        'props': {'shared_properties': p['shared_properties'], 'shared_owners': p['shared_owners'],
+                  'shared_addresses': p['shared_addresses'], 'shared_total': p['shared_total'],
+                  'component': component_of.get(p['deal_a'])},
+    } for p in result['pairs']]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Shared-collateral overlap between holdings of an Intex snapshot.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--output', default='collateral_overlap.json', help='JSON report path')
+    parser.add_argument('--max-feature-degree', type=int, default=DEFAULT_MAX_FEATURE_DEGREE)
+    parser.add_argument('--min-shared', type=int, default=1, help='Minimum shared features per reported pair')
+    parser.add_argument('--neo4j-uri', default=None, help='Also write SHARES_COLLATERAL_WITH edges to this Neo4j')
+    parser.add_argument('--neo4j-user', default='neo4j')
+    parser.add_argument('--neo4j-password', default='testtest')
+    parser.add_argument('--database', default='gi-cmbs')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    overlap = analyze_collateral_overlap(CMBSDatabaseHandler(args.db_path).get_holdings_collateral(),
+                                         args.max_feature_degree, args.min_shared)
+    write_overlap_report(overlap, args.output)
+    if args.neo4j_uri:
+        from neo4j_handler import DealLister
+        lister = DealLister(args.neo4j_uri, args.neo4j_user, args.neo4j_password, args.database)
+        try:
+            lister.write_collateral_overlaps(overlap_edge_rows(overlap))
+        finally:
+            lister.close()
+    print(json.dumps(overlap['summary'], indent=2))
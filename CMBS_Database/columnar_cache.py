@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from optimize_intex_db import snapshot_fingerprint
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Tables converted per snapshot and the column each one is hive-partitioned by (None = single file set)
+COLUMNAR_TABLES: Dict[str, Optional[str]] = {
+    'deals': None,
+    'deal_tranche': None,
+    'account_holding': None,
+    'propinfo': 'state',
+    'collateral': None,
+}
+_CHUNK_ROWS = 100000
+_MANIFEST = '_manifest.json'
+
+
+def default_cache_dir(db_path: str) -> str:
+    """Parquet cache location for a snapshot: <db dir>/columnar_cache/<snapshot name>."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'columnar_cache', os.path.basename(db_path))
+
+
+def table_arrow_schema(conn: sqlite3.Connection, table: str):
+    """
+    Derive an Arrow schema from the declared column types, checked against the stored values.
+    SQLite does not enforce column types, so one pass counts values that do not fit the declared
+    type; such columns are widened (INTEGER -> float64 for reals, anything else -> string).
+    Returns:
+        Tuple[pa.Schema, List[bool]]: The schema and, per column, whether values must be stringified
+    """
+    import pyarrow as pa
+    columns = [(row[1], (row[2] or '').upper()) for row in conn.execute(f"PRAGMA table_info({table})")]
+    checks = []
+    for name, declared in columns:
+        checks.append(f"sum(typeof(\"{name}\") NOT IN ('integer', 'null'))")
+        checks.append(f"sum(typeof(\"{name}\") NOT IN ('integer', 'real', 'null'))")
+        checks.append(f"sum(typeof(\"{name}\") NOT IN ('text', 'null'))")
+    counts = conn.execute(f"SELECT {', '.join(checks)} FROM {table}").fetchone()
+    fields, stringify = [], []
+    for i, (name, declared) in enumerate(columns):
+        not_int, not_number, not_text = (c or 0 for c in counts[3 * i:3 * i + 3])
+        if 'INT' in declared and not not_int:
+            fields.append(pa.field(name, pa.int64()))
+            stringify.append(False)
+        elif any(t in declared for t in ('INT', 'REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL')) and not not_number:
+            fields.append(pa.field(name, pa.float64()))
+            stringify.append(False)
+        else:
+            fields.append(pa.field(name, pa.string()))
+            stringify.append(bool(not_text))
+    return pa.schema(fields), stringify
+
+
+def _iter_record_batches(conn: sqlite3.Connection, table: str, schema, stringify: List[bool], chunk_rows: int):
+    """Stream a SQLite table as Arrow record batches of a fixed schema."""
+    import pyarrow as pa
+    cursor = conn.execute(f"SELECT {', '.join(schema.names)} FROM {table}")
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        arrays = []
+        for values, field, as_text in zip(zip(*rows), schema, stringify):
+            if as_text:
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def ingest_snapshot_to_parquet(db_path: str, cache_dir: Optional[str] = None,
+                               tables: Optional[Dict[str, Optional[str]]] = None, force: bool = False) -> str:
+    """
+    Convert a snapshot's analytic tables to (partitioned) Parquet, once per snapshot.
+    Args:
+        db_path (str): Path to the Intex SQLite snapshot
+        cache_dir (Optional[str]): Output directory; defaults to default_cache_dir(db_path)
+        tables (Optional[Dict[str, Optional[str]]]): table -> partition column; defaults to COLUMNAR_TABLES
+        force (bool): Re-ingest even if the cache matches the snapshot
+    Returns:
+        str: The cache directory
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    cache_dir = cache_dir or default_cache_dir(db_path)
+    tables = tables or COLUMNAR_TABLES
+    fingerprint = snapshot_fingerprint(db_path)
+    manifest_path = os.path.join(cache_dir, _MANIFEST)
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('fingerprint') == fingerprint:
+                logger.info(f"Columnar cache at {cache_dir} is up to date.")
+                return cache_dir
+
+    start = time.perf_counter()
+    tmp_dir = f"{cache_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    manifest = {'source_path': os.path.abspath(db_path), 'fingerprint': fingerprint, 'tables': {}}
+    # The dataset writer pulls batches from its own thread; the connection is only ever used by one at a time
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table, partition_column in tables.items():
+            if table not in existing:
+                logger.warning(f"The '{table}' table was not found in {db_path}; skipping.")
+                continue
+            schema, stringify = table_arrow_schema(conn, table)
+            rows = [0]
+
+            def counted(batches):
+                for batch in batches:
+                    rows[0] += batch.num_rows
+                    yield batch
+
+            partitioning = None
+            if partition_column and partition_column in schema.names:
+                partitioning = ds.partitioning(pa.schema([schema.field(partition_column)]), flavor='hive')
+            ds.write_dataset(counted(_iter_record_batches(conn, table, schema, stringify, _CHUNK_ROWS)),
+                             os.path.join(tmp_dir, table), schema=schema, format='parquet',
+                             partitioning=partitioning, existing_data_behavior='overwrite_or_ignore',
+                             max_rows_per_group=_CHUNK_ROWS)
+            manifest['tables'][table] = {'rows': rows[0], 'partition_by': partitioning and partition_column}
+            logger.info(f"Wrote {rows[0]} rows of {table} to Parquet.")
+    finally:
+        conn.close()
+    with open(os.path.join(tmp_dir, _MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+    os.replace(tmp_dir, cache_dir)
+    METRICS.observe('columnar_ingest', time.perf_counter() - start)
+    logger.info(f"Columnar cache written to {cache_dir} in {time.perf_counter() - start:.2f}s")
+    return cache_dir
+
+
+class ColumnarQueryEngine:
+    """
+    Embedded DuckDB over a snapshot's Parquet cache. Each cached table is exposed as a view,
+    so analytic SQL gets column pruning and predicate (and partition) pushdown from the Parquet reader.
+    """
+
+    def __init__(self, cache_dir: str):
+        import duckdb
+        manifest_path = os.path.join(cache_dir, _MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No columnar cache found at: {cache_dir}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.cache_dir = cache_dir
+        self.conn = duckdb.connect(database=':memory:')
+        for table, info in self.manifest['tables'].items():
+            pattern = os.path.join(cache_dir, table, '**', '*.parquet').replace("'", "''")
+            hive = 'true' if info.get('partition_by') else 'false'
+            self.conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{pattern}', hive_partitioning={hive})")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def query(self, sql: str, params: Optional[Iterable[Any]] = None):
+        """
+        Run analytic SQL against the cached tables.
+        Returns:
+            pd.DataFrame: Query results
+        """
+        with METRICS.span('columnar_query'):
+            return self.conn.execute(sql, list(params) if params else []).fetchdf()
+
+
+# Portfolio-wide scans over held securities' collateral
+HOLDINGS_PROPINFO = """
+    SELECT p.*
+    FROM propinfo p
+    JOIN (SELECT DISTINCT t.deal_id
+          FROM account_holding h JOIN deal_tranche t ON t.tr_cusip = h.cusip) held USING (deal_id)
+"""
+
+PROPERTY_TYPE_MIX_SQL = f"""
+    SELECT trustee_prop_type_full, count(*) AS properties,
+           round(100.0 * count(*) / sum(count(*)) OVER (), 2) AS pct
+    FROM ({HOLDINGS_PROPINFO})
+    GROUP BY trustee_prop_type_full
+    ORDER BY properties DESC
+"""
+
+MSA_CONCENTRATION_SQL = f"""
+    SELECT msa_name, count(*) AS properties, count(DISTINCT deal_id) AS deals,
+           round(100.0 * count(*) / sum(count(*)) OVER (), 2) AS pct
+    FROM ({HOLDINGS_PROPINFO})
+    GROUP BY msa_name
+    ORDER BY properties DESC
+    LIMIT ?
+"""
+
+
+def property_type_mix(engine: ColumnarQueryEngine):
+    """Property type mix of all collateral behind held CUSIPs."""
+    return engine.query(PROPERTY_TYPE_MIX_SQL)
+
+
+def msa_concentration(engine: ColumnarQueryEngine, top_n: int = 25):
+    """Top MSAs by number of properties behind held CUSIPs."""
+    return engine.query(MSA_CONCENTRATION_SQL, [top_n])
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert an Intex snapshot to Parquet and run analytic SQL on it.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--cache-dir', default=None, help='Parquet cache directory')
+    parser.add_argument('--force', action='store_true', help='Re-ingest even if the cache is up to date')
+    parser.add_argument('--sql', default=None, help='Analytic SQL to run (default: property type mix and MSA concentration)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    engine = ColumnarQueryEngine(ingest_snapshot_to_parquet(args.db_path, args.cache_dir, force=args.force))
+    if args.sql:
+        print(engine.query(args.sql).to_string())
+    else:
+        print(property_type_mix(engine).to_string())
+        print(msa_concentration(engine).to_string())
+    engine.close()
@@ -0,0 +1,98 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from graph_builder import GraphBuilder
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMO_SIZE = 256
+PLTR_NODES_HEADER = "dealId|bloombergName|cusip|propertyId|addressId|yearBuilt|trusteePropType\n"
+
+
+class DealSubgraph:
+    """
+    Everything the export derives from a deal alone: its Bloomberg name, the property subgraph (every node but
+    the Deal node, see add_deal_node) and the CUSIP-independent tail of its Palantir node rows.
+    Built once per deal and shared by every tranche CUSIP of the deal.
+    """
+    __slots__ = ('deal_id', 'bloomberg_name', 'graph', 'property_ids', 'row_tails', 'node_count', 'edge_count')
+
+    def __init__(self, deal_id: str, bloomberg_name, graph: GraphBuilder, property_ids: List[str],
+                 row_tails: List[str]):
+        self.deal_id = deal_id
+        self.bloomberg_name = bloomberg_name
+        self.graph = graph
+        self.property_ids = property_ids
+        self.row_tails = row_tails
+        self.node_count = graph.node_count()
+        self.edge_count = graph.edge_count()
+
+    def add_deal_node(self, graph: GraphBuilder) -> None:
+        """
+        Add the Deal node, linked to the deal's properties. It carries no CUSIP: a deal has one node but many
+        tranches, which are Tranche nodes of their own (see DealLister.load_tranches).
+        """
+        deal_node = graph.node("Deal", self.deal_id, dealId=self.deal_id,
+                               bloomberg=self.bloomberg_name if self.bloomberg_name else "None")
+        for property_id in self.property_ids:
+            graph.ref(deal_node, "hasProperty", property_id)
+
+    def pltr_nodes(self, cusip: str) -> str:
+        """Palantir node CSV (with header) of one CUSIP of the deal."""
+        head = f"{self.deal_id}|{self.bloomberg_name}|{cusip}"
+        return PLTR_NODES_HEADER + ''.join(head + tail for tail in self.row_tails)
+
+
+class DealMemo:
+    """
+    Bounded LRU cache of DealSubgraphs shared across an export run. A memo assumes one geocoder and entity map
+    per run; use a fresh memo when either changes.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """The cached value for key, built (and cached, evicting the least recently used) on a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            METRICS.inc('deal_memo_hits_total')
+            return self._entries[key]
+        self.misses += 1
+        METRICS.inc('deal_memo_misses_total')
+        value = self._entries[key] = build()
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+def group_by_deal(deal_ids: Dict[str, Optional[str]], cusips: List[str]) -> 'OrderedDict[Optional[str], List[str]]':
+    """
+    Distinct CUSIPs grouped by deal id (None for CUSIPs without a deal), in first-seen order, so all tranches of
+    a deal are exported back to back and its subgraph is built once even with a small memo.
+    """
+    groups: 'OrderedDict[Optional[str], List[str]]' = OrderedDict()
+    seen = set()
+    for cusip in cusips:
+        if cusip in seen:
+            continue
+        seen.add(cusip)
+        groups.setdefault(deal_ids.get(cusip), []).append(cusip)
+    return groups
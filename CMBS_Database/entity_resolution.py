@@ -0,0 +1,252 @@
+import logging
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from collateral_overlap import UnionFind
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# propinfo column -> graph label whose node ids it provides
+RESOLVED_COLUMNS = {'owner_name': 'PropertyOwner', 'prop_name': 'PropName'}
+# Legal-form and filler tokens that do not distinguish entities. Single letters are not among them: initials
+# ("J C Penney", "Building C") do distinguish names.
+_STOP_TOKENS = {'LLC', 'LP', 'LLP', 'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY',
+                'LTD', 'LIMITED', 'THE', 'AND', 'OF'}
+_TOKEN_ALIASES = {'&': 'AND', 'PTNRS': 'PARTNERS', 'PRTNRS': 'PARTNERS', 'HLDGS': 'HOLDINGS', 'MGMT': 'MANAGEMENT',
+                  'PROP': 'PROPERTY', 'PROPS': 'PROPERTIES', 'APTS': 'APARTMENTS', 'APT': 'APARTMENTS',
+                  'CTR': 'CENTER', 'PLZ': 'PLAZA', 'TWR': 'TOWER', 'BLDG': 'BUILDING'}
+_SOUNDEX_CODES = {c: d for d, letters in {'1': 'BFPV', '2': 'CGJKQSXZ', '3': 'DT', '4': 'L', '5': 'MN', '6': 'R'}.items()
+                  for c in letters}
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def name_tokens(name: Optional[str]) -> List[str]:
+    """Upper-cased word tokens with punctuation, legal forms and common abbreviations normalized away."""
+    if not name:
+        return []
+    tokens = re.sub(r"[^A-Z0-9& ]", " ", str(name).upper().replace('.', '')).split()
+    tokens = [_TOKEN_ALIASES.get(t, t) for t in tokens]
+    return [t for t in tokens if t not in _STOP_TOKENS]
+
+
+@lru_cache(maxsize=65536)
+def soundex(token: str) -> str:
+    """American Soundex code of one word (digits are kept as is)."""
+    if not token or token.isdigit():
+        return token
+    first, code, last = token[0], [], _SOUNDEX_CODES.get(token[0], '')
+    for c in token[1:]:
+        digit = _SOUNDEX_CODES.get(c, '')
+        if digit and digit != last:
+            code.append(digit)
+        if c not in 'HW':
+            last = digit
+    return (first + ''.join(code) + '000')[:4]
+
+
+def _shingles(text: str, k: int = 3) -> set:
+    padded = f" {text} "
+    return {padded[i:i + k] for i in range(max(1, len(padded) - k + 1))}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashLSH:
+    """
+    MinHash signatures over character shingles, banded for locality-sensitive hashing:
+    two names land in a common bucket with high probability when their Jaccard similarity is high.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 7):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        # a, b < 2^31 and crc32 hashes < 2^32 keep a * h + b below 2^63, so uint64 never wraps
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = bands, num_perm // bands
+
+    def signatures(self, shingle_sets: List[set]) -> np.ndarray:
+        """MinHash signature matrix (one row per shingle set); each distinct shingle is hashed once."""
+        sizes = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+        codes, vocabulary = pd.factorize(pd.Series([g for s in shingle_sets for g in s], dtype=object))
+        hashes = np.fromiter((zlib.crc32(g.encode('utf-8')) for g in vocabulary), dtype=np.uint64,
+                             count=len(vocabulary))
+        starts = np.r_[0, np.cumsum(sizes)[:-1]]
+        result = np.empty((len(shingle_sets), len(self.a)), dtype=np.uint64)
+        for p, (a, b) in enumerate(zip(self.a, self.b)):
+            result[:, p] = np.minimum.reduceat(((hashes * a + b) % _MERSENNE_PRIME)[codes], starts)
+        return result
+
+    def band_keys(self, signatures: np.ndarray, partition: Optional[np.ndarray] = None) -> np.ndarray:
+        """One uint64 bucket key per (item, band); items sharing a key agree on all rows of that band."""
+        # Odd multipliers fold a band's rows and the partition key into one uint64 bucket key (wrapping on purpose)
+        weights = np.asarray(self.a[:self.rows] * 2 + 1, dtype=np.uint64)
+        keys = np.empty((len(signatures), self.bands), dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            salt = np.uint64(0) if partition is None else partition.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+            for band in range(self.bands):
+                keys[:, band] = signatures[:, band * self.rows:(band + 1) * self.rows] @ weights + salt
+        return keys
+
+    def buckets(self, signatures: np.ndarray, partition: np.ndarray) -> Iterable[np.ndarray]:
+        """Items sharing all rows of at least one band (and the same partition key), one member array per bucket."""
+        band_keys = self.band_keys(signatures, partition)
+        for band in range(self.bands):
+            keys = band_keys[:, band]
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sizes = np.diff(np.r_[starts, len(keys)])
+            for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+                yield order[start:start + size]
+
+
+class EntityResolver:
+    """
+    Cluster spelling variants of names. Names with the same sorted-token key merge outright; phonetic keys and
+    MinHash LSH then propose candidate blocks, and pairs are only compared inside a block.
+    Names whose numbers or single-letter tokens differ (e.g. "Tower 1" and "Tower 2", "Building A" and "Building B")
+    are never merged.
+    """
+
+    def __init__(self, threshold: float = 0.75, num_perm: int = 64, bands: int = 16, max_block_size: int = 100):
+        """
+        Args:
+            threshold (float): Minimum character-trigram Jaccard similarity for a match
+            num_perm (int): MinHash permutations
+            bands (int): LSH bands (num_perm / bands rows each)
+            max_block_size (int): Larger blocks are skipped; they come from generic keys and would be quadratic
+        """
+        self.threshold = threshold
+        self.lsh = MinHashLSH(num_perm, bands)
+        self.max_block_size = max_block_size
+
+    def resolve(self, counts: Dict[str, int]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        Resolve raw names (with occurrence counts) to canonical names.
+        Returns:
+            Tuple[Dict[str, str], Dict[str, Any]]: raw -> canonical for every raw name that changes, and statistics
+        """
+        start = time.perf_counter()
+        raw_names = [n for n in counts if n]
+        # Exact normalized key: case, punctuation, legal form and token order do not matter
+        by_key: Dict[str, List[str]] = defaultdict(list)
+        for name in raw_names:
+            by_key[' '.join(sorted(name_tokens(name))) or name.upper()].append(name)
+        keys = list(by_key)
+        token_lists = [k.split() for k in keys]
+        # Numbers and single letters are part of every block key, so names whose numbers or initials differ
+        # ("Tower 1" / "Tower 2", "... Phase A" / "... Phase B") are never compared
+        partition = pd.factorize(pd.Series([
+            ' '.join(re.findall(r'\d+', k)) + '|' + ' '.join(t for t in tokens if len(t) == 1 and t.isalpha())
+            for k, tokens in zip(keys, token_lists)], dtype=object))[0]
+        shingles = [_shingles(k) for k in keys]
+
+        blocks: List[List[int]] = []
+        phonetic = defaultdict(list)
+        for i, tokens in enumerate(token_lists):
+            phonetic[(partition[i], ' '.join(sorted(soundex(t) for t in tokens)))].append(i)
+        blocks.extend(members for members in phonetic.values() if len(members) > 1)
+        if keys:
+            blocks.extend(members.tolist() for members in self.lsh.buckets(self.lsh.signatures(shingles), partition))
+
+        uf = UnionFind(len(keys))
+        compared, skipped, seen = 0, 0, set()
+        for members in blocks:
+            if len(members) > self.max_block_size:
+                skipped += 1
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    i, j = members[x], members[y]
+                    if (i, j) in seen:
+                        continue
+                    seen.add((i, j))
+                    compared += 1
+                    if jaccard(shingles[i], shingles[j]) >= self.threshold:
+                        uf.union(i, j)
+
+        clusters: Dict[int, List[str]] = defaultdict(list)
+        for i, key in enumerate(keys):
+            clusters[uf.find(i)].extend(by_key[key])
+        mapping = {}
+        for names in clusters.values():
+            # The most frequent spelling wins; ties go to the shortest, then alphabetical
+            canonical = min(names, key=lambda n: (-counts[n], len(n), n))
+            mapping.update({n: canonical for n in names if n != canonical})
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            'raw': len(raw_names), 'canonical': len(clusters), 'merged': len(raw_names) - len(clusters),
+            'shrink_pct': round(100.0 * (len(raw_names) - len(clusters)) / len(raw_names), 2) if raw_names else 0.0,
+            'blocks': len(blocks), 'blocks_skipped': skipped, 'comparisons': compared,
+            'all_pairs': len(keys) * (len(keys) - 1) // 2, 'seconds': round(elapsed, 3),
+        }
+        return mapping, stats
+
+
+class AliasMap:
+    """Per-column raw -> canonical name maps, with the reverse (canonical -> aliases) for alias edges."""
+
+    def __init__(self, mappings: Optional[Dict[str, Dict[str, str]]] = None):
+        self.mappings = mappings or {}
+        self._aliases: Dict[str, Dict[str, List[str]]] = {}
+        for column, mapping in self.mappings.items():
+            by_canonical = self._aliases.setdefault(column, defaultdict(list))
+            for raw, canonical in sorted(mapping.items()):
+                by_canonical[canonical].append(raw)
+
+    def canonical(self, column: str, name):
+        return self.mappings.get(column, {}).get(name, name)
+
+    def aliases(self, column: str, canonical) -> List[str]:
+        return self._aliases.get(column, {}).get(canonical, [])
+
+
+def resolve_entities(db_handler, columns: Optional[Dict[str, str]] = None,
+                     resolver: Optional[EntityResolver] = None) -> Tuple[AliasMap, Dict[str, Any]]:
+    """
+    Resolve owner and property names of a snapshot.
+    Returns:
+        Tuple[AliasMap, Dict[str, Any]]: the alias map for export_cusip_data_to_jsonld(entity_map=...)
+        and a per-label report of the node-count shrink
+    """
+    resolver = resolver or EntityResolver()
+    mappings, report = {}, {}
+    with METRICS.span('entity_resolution'):
+        for column, label in (columns or RESOLVED_COLUMNS).items():
+            counts = Counter(db_handler.get_propinfo_value_counts(column))
+            mappings[column], stats = resolver.resolve(counts)
+            report[label] = stats
+            logger.info(f"{label}: {stats['raw']} -> {stats['canonical']} nodes ({stats['shrink_pct']}% fewer), "
+                        f"{stats['comparisons']} comparisons instead of {stats['all_pairs']} in {stats['seconds']}s")
+    return AliasMap(mappings), report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Resolve owner and property-name spelling variants of an Intex snapshot.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--threshold', type=float, default=0.75, help='Trigram Jaccard similarity for a match')
+    parser.add_argument('--output', default=None, help='Write the alias map and report to this JSON file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    aliases, shrink = resolve_entities(CMBSDatabaseHandler(args.db_path), resolver=EntityResolver(args.threshold))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'report': shrink, 'aliases': aliases.mappings}, f, indent=2, ensure_ascii=False)
+    print(json.dumps(shrink, indent=2))
@@ -0,0 +1,124 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_FILENAME = 'cmbs_export.sqlite'
+# Payload kinds written by export_cusip_data_to_jsonld
+PLTR_NODES = 'pltr_nodes'
+JSONLD_GRAPH = 'jsonld'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    cusip TEXT, kind TEXT, payload TEXT, written_at REAL,
+    PRIMARY KEY (kind, cusip)) WITHOUT ROWID;
+"""
+
+
+class ExportArchive:
+    """
+    Single-file container for per-CUSIP export payloads (the Palantir node CSV, JSON-LD), keyed by
+    (kind, cusip). Replaces one small file per CUSIP: appends are batched into few transactions,
+    any CUSIP can be read back directly, and combining or removing the output touches one file.
+    """
+
+    def __init__(self, path: str, commit_every: int = 500):
+        """
+        Args:
+            path (str): Archive file; created if missing, appended to otherwise
+            commit_every (int): Payloads per transaction while appending
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def put(self, cusip: str, kind: str, payload: str) -> None:
+        """Store (or replace) the payload of a CUSIP."""
+        with METRICS.span('file_write', format='archive'):
+            self.conn.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?)",
+                              (cusip, kind, payload, time.time()))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self.flush()
+
+    def flush(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def clear(self) -> None:
+        """Drop every payload, e.g. left over from an interrupted run."""
+        self.conn.execute("DELETE FROM exports")
+        self.flush()
+
+    def get(self, cusip: str, kind: str = PLTR_NODES) -> Optional[str]:
+        row = self.conn.execute("SELECT payload FROM exports WHERE kind = ? AND cusip = ?", (kind, cusip)).fetchone()
+        return row[0] if row else None
+
+    def cusips(self, kind: str = PLTR_NODES) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT cusip FROM exports WHERE kind = ? ORDER BY cusip", (kind,))]
+
+    def iter_payloads(self, kind: str = PLTR_NODES) -> Iterator[Tuple[str, str]]:
+        """(cusip, payload) pairs of a kind in CUSIP order."""
+        return self.conn.execute("SELECT cusip, payload FROM exports WHERE kind = ? ORDER BY cusip", (kind,))
+
+    def combine_csv(self, output_file: str, kind: str = PLTR_NODES) -> Optional[str]:
+        """
+        Concatenate the CSV payloads of a kind into one file, keeping the header of the first only.
+        Returns:
+            Optional[str]: output_file, or None if the archive holds no payload of that kind
+        """
+        self.flush()
+        count = 0
+        with open(output_file, 'w', encoding='utf-8') as outfile:
+            for _, payload in self.iter_payloads(kind):
+                if count:
+                    payload = payload.split('\n', 1)[1] if '\n' in payload else ''
+                outfile.write(payload if payload.endswith('\n') or not payload else payload + '\n')
+                count += 1
+        if not count:
+            os.remove(output_file)
+            logger.warning(f"No {kind} payloads in {self.path}")
+            return None
+        logger.info(f"Combined {count} {kind} payloads from {self.path} into {output_file}")
+        return output_file
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def remove(self) -> None:
+        """Close the archive and delete it (with its WAL files)."""
+        self.conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        logger.info(f"Removed export archive {self.path}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect or combine a per-CUSIP export archive.')
+    parser.add_argument('archive', help='Path to the export archive')
+    parser.add_argument('--kind', default=PLTR_NODES, help='Payload kind')
+    parser.add_argument('--get', default=None, metavar='CUSIP', help='Print the payload of one CUSIP')
+    parser.add_argument('--combine', default=None, metavar='CSV', help='Combine all payloads into this CSV file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    archive = ExportArchive(args.archive)
+    if args.get:
+        print(archive.get(args.get, args.kind))
+    elif args.combine:
+        archive.combine_csv(args.combine, args.kind)
+    else:
+        print('\n'.join(archive.cusips(args.kind)))
+    archive.close()
@@ -0,0 +1,258 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from optimize_intex_db import snapshot_fingerprint
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLUP_FILENAME = 'exposure_rollups.sqlite'
+# propinfo fields rolled up per holding and per portfolio
+ROLLUP_DIMENSIONS = ['msa_name', 'trustee_prop_type_full', 'year_built', 'state']
+# Portfolio key covering every holding, whatever its account
+ALL_PORTFOLIOS = 'ALL'
+# Bumped when the stored rollups change meaning; a side table of another version is rebuilt
+ROLLUP_SCHEMA_VERSION = '2'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS holdings (portfolio TEXT, cusip TEXT, PRIMARY KEY (portfolio, cusip)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cusip_deals (cusip TEXT PRIMARY KEY, deal_id TEXT) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cusip_rollups (
+    cusip TEXT, dimension TEXT, value TEXT, properties INTEGER, pct REAL,
+    PRIMARY KEY (cusip, dimension, value)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS portfolio_rollups (
+    portfolio TEXT, dimension TEXT, value TEXT, properties INTEGER, holdings INTEGER, pct REAL,
+    PRIMARY KEY (portfolio, dimension, value)) WITHOUT ROWID;
+"""
+
+
+def default_rollup_path(db_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), DEFAULT_ROLLUP_FILENAME)
+
+
+def _dimension_labels(frame: pd.DataFrame) -> pd.DataFrame:
+    """Dimension values as strings; whole numbers read as floats (year_built next to NULLs) lose their '.0'."""
+    frame = frame.copy()
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            frame[column] = values.astype('Int64')
+    return frame.astype('string')
+
+
+def compute_cusip_rollups(collateral: pd.DataFrame, dimensions: Iterable[str] = ROLLUP_DIMENSIONS) -> pd.DataFrame:
+    """
+    Count properties per (CUSIP, dimension, value) with one vectorized group-by over all dimensions.
+    Args:
+        collateral (pd.DataFrame): One row per (cusip, property), e.g. CMBSDatabaseHandler.get_holdings_collateral()
+        dimensions (Iterable[str]): propinfo columns to roll up
+    Returns:
+        pd.DataFrame: cusip, dimension, value, properties, pct (share of the CUSIP's properties)
+    """
+    dimensions = [d for d in dimensions if d in collateral.columns]
+    if collateral.empty or not dimensions:
+        return pd.DataFrame(columns=['cusip', 'dimension', 'value', 'properties', 'pct'])
+    labels = _dimension_labels(collateral[dimensions]).fillna('Unknown')
+    long = pd.concat([collateral[['cusip']], labels], axis=1) \
+        .melt(id_vars='cusip', var_name='dimension', value_name='value')
+    counts = long.groupby(['cusip', 'dimension', 'value']).size().rename('properties').reset_index()
+    totals = counts.groupby(['cusip', 'dimension'])['properties'].transform('sum')
+    counts['pct'] = (100.0 * counts['properties'] / totals).round(2)
+    counts['properties'] = counts['properties'].astype(int)
+    return counts
+
+
+class ExposureRollups:
+    """
+    Side table of precomputed exposure rollups. Reads are primary-key range scans, so an answer
+    costs the same whatever the size of the book.
+
+    Tranches of one deal share its collateral, so a portfolio counts each deal's properties once however
+    many of its CUSIPs it holds; 'holdings' counts the positions exposed to a value.
+    """
+
+    def __init__(self, rollup_path: str):
+        self.rollup_path = rollup_path
+        self.conn = sqlite3.connect(rollup_path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM rollup_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def cusip_exposure(self, cusip: str, dimension: str) -> List[Dict[str, Any]]:
+        """Exposure of one holding by a dimension, largest first."""
+        cursor = self.conn.execute(
+            "SELECT value, properties, pct FROM cusip_rollups WHERE cusip = ? AND dimension = ? "
+            "ORDER BY properties DESC, value", (cusip, dimension))
+        return [{'value': v, 'properties': n, 'pct': pct} for v, n, pct in cursor]
+
+    def portfolio_exposure(self, dimension: str, portfolio: str = ALL_PORTFOLIOS,
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Exposure of a portfolio (an account, or ALL) by a dimension, largest first."""
+        query = ("SELECT value, properties, holdings, pct FROM portfolio_rollups WHERE portfolio = ? AND dimension = ? "
+                 "ORDER BY properties DESC, value")
+        params: Tuple = (portfolio, dimension)
+        if limit:
+            query += " LIMIT ?"
+            params += (int(limit),)
+        return [{'value': v, 'properties': n, 'holdings': h, 'pct': pct}
+                for v, n, h, pct in self.conn.execute(query, params)]
+
+    def portfolios(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT portfolio FROM holdings ORDER BY portfolio")]
+
+    def _apply_position_delta(self, positions_query: str, sign: int) -> None:
+        """
+        Add (sign=1) or subtract (sign=-1) the positions returned by positions_query to the portfolio rollups,
+        then recompute the shares of the portfolios touched. Every position changes the holdings counts; property
+        counts only change for deals that no kept position of the portfolio (temp.kept_deals) already covers.
+        """
+        conn = self.conn
+        conn.execute("DROP TABLE IF EXISTS temp.position_delta")
+        conn.execute(f"CREATE TEMP TABLE position_delta AS {positions_query}")
+        if not conn.execute("SELECT 1 FROM temp.position_delta LIMIT 1").fetchone():
+            return
+        conn.execute("""
+            INSERT INTO portfolio_rollups (portfolio, dimension, value, properties, holdings, pct)
+            SELECT d.portfolio, r.dimension, r.value, 0, ? * count(*), 0
+            FROM temp.position_delta d JOIN cusip_rollups r ON r.cusip = d.cusip
+            GROUP BY d.portfolio, r.dimension, r.value
+            ON CONFLICT (portfolio, dimension, value) DO UPDATE SET holdings = holdings + excluded.holdings
+        """, (sign,))
+        # One CUSIP stands for each deal entering or leaving a portfolio; its rollup is the deal's
+        conn.execute("""
+            INSERT INTO portfolio_rollups (portfolio, dimension, value, properties, holdings, pct)
+            SELECT g.portfolio, r.dimension, r.value, ? * sum(r.properties), 0, 0
+            FROM (SELECT d.portfolio, min(d.cusip) AS cusip
+                  FROM temp.position_delta d JOIN cusip_deals c ON c.cusip = d.cusip
+                  WHERE NOT EXISTS (SELECT 1 FROM temp.kept_deals k
+                                    WHERE k.portfolio = d.portfolio AND k.deal_id = c.deal_id)
+                  GROUP BY d.portfolio, c.deal_id) g
+            JOIN cusip_rollups r ON r.cusip = g.cusip
+            GROUP BY g.portfolio, r.dimension, r.value
+            ON CONFLICT (portfolio, dimension, value) DO UPDATE SET properties = properties + excluded.properties
+        """, (sign,))
+        conn.execute("DELETE FROM portfolio_rollups WHERE holdings <= 0")
+        conn.execute("""
+            UPDATE portfolio_rollups SET pct = round(100.0 * properties / totals.total, 2)
+            FROM (SELECT portfolio, dimension, sum(properties) AS total FROM portfolio_rollups
+                  WHERE portfolio IN (SELECT DISTINCT portfolio FROM temp.position_delta)
+                  GROUP BY portfolio, dimension) AS totals
+            WHERE portfolio_rollups.portfolio = totals.portfolio AND portfolio_rollups.dimension = totals.dimension
+        """)
+
+    def refresh(self, db_handler, holdings: Optional[pd.DataFrame] = None, full: bool = False) -> Dict[str, int]:
+        """
+        Bring the rollups up to date with the snapshot and the holdings.
+
+        Per-CUSIP rollups only depend on the collateral snapshot, so while the snapshot is unchanged only
+        newly held CUSIPs are computed and sold ones dropped; a new snapshot recomputes everything.
+        Portfolio rollups are maintained by adding and subtracting the rollups of the positions that changed.
+        Args:
+            db_handler (CMBSDatabaseHandler): Handler of the snapshot
+            holdings (Optional[pd.DataFrame]): account/cusip positions; defaults to the snapshot's account_holding
+            full (bool): Recompute every CUSIP
+        Returns:
+            Dict[str, int]: Number of CUSIPs added, removed and held
+        """
+        start = time.perf_counter()
+        if holdings is None:
+            holdings = db_handler.get_account_holdings()
+        if holdings.empty:
+            holdings = pd.DataFrame(columns=['account', 'cusip'])
+        accounts = holdings['account'] if 'account' in holdings.columns else ALL_PORTFOLIOS
+        positions = pd.DataFrame({'portfolio': accounts, 'cusip': holdings['cusip']}).dropna().drop_duplicates()
+        positions = pd.concat([positions, pd.DataFrame({'portfolio': ALL_PORTFOLIOS, 'cusip': positions['cusip']})]) \
+            .drop_duplicates()
+
+        fingerprint = snapshot_fingerprint(db_handler.db_path)
+        conn = self.conn
+        if full or self.meta('fingerprint') != fingerprint or self.meta('schema_version') != ROLLUP_SCHEMA_VERSION:
+            for table in ('cusip_rollups', 'cusip_deals', 'portfolio_rollups', 'holdings'):
+                conn.execute(f"DELETE FROM {table}")
+        computed = {row[0] for row in conn.execute("SELECT DISTINCT cusip FROM holdings")}
+        held = set(positions['cusip'])
+        added, removed = sorted(held - computed), sorted(computed - held)
+
+        with METRICS.span('exposure_rollups'):
+            conn.execute("DROP TABLE IF EXISTS temp.new_holdings")
+            conn.execute("CREATE TEMP TABLE new_holdings (portfolio TEXT, cusip TEXT, PRIMARY KEY (portfolio, cusip))")
+            conn.executemany("INSERT INTO new_holdings VALUES (?, ?)", positions.itertuples(index=False))
+            # Deals still covered by a position that stays in the portfolio
+            conn.execute("DROP TABLE IF EXISTS temp.kept_deals")
+            conn.execute("""
+                CREATE TEMP TABLE kept_deals (portfolio TEXT, deal_id TEXT, PRIMARY KEY (portfolio, deal_id))
+            """)
+            conn.execute("""
+                INSERT OR IGNORE INTO temp.kept_deals
+                SELECT h.portfolio, c.deal_id FROM holdings h
+                JOIN temp.new_holdings n ON n.portfolio = h.portfolio AND n.cusip = h.cusip
+                JOIN cusip_deals c ON c.cusip = h.cusip
+            """)
+            # Positions sold are subtracted from the portfolio rollups while their CUSIP rows still exist
+            self._apply_position_delta(
+                "SELECT portfolio, cusip FROM holdings EXCEPT SELECT portfolio, cusip FROM temp.new_holdings", -1)
+            if removed:
+                conn.executemany("DELETE FROM cusip_rollups WHERE cusip = ?", ((c,) for c in removed))
+                conn.executemany("DELETE FROM cusip_deals WHERE cusip = ?", ((c,) for c in removed))
+            if added:
+                collateral = db_handler.get_holdings_collateral(added)
+                rollups = compute_cusip_rollups(collateral)
+                columns = [rollups[c].tolist() for c in ('cusip', 'dimension', 'value', 'properties', 'pct')]
+                conn.executemany("INSERT OR REPLACE INTO cusip_rollups VALUES (?, ?, ?, ?, ?)", zip(*columns))
+                if not collateral.empty:
+                    deals = collateral[['cusip', 'deal_id']].drop_duplicates('cusip')
+                    conn.executemany("INSERT OR REPLACE INTO cusip_deals VALUES (?, ?)",
+                                     zip(deals['cusip'], deals['deal_id'].astype(str)))
+            self._apply_position_delta(
+                "SELECT portfolio, cusip FROM temp.new_holdings EXCEPT SELECT portfolio, cusip FROM holdings", 1)
+            conn.execute("DELETE FROM holdings")
+            conn.execute("INSERT INTO holdings SELECT portfolio, cusip FROM temp.new_holdings")
+            conn.executemany("INSERT OR REPLACE INTO rollup_meta VALUES (?, ?)", [
+                ('fingerprint', fingerprint),
+                ('schema_version', ROLLUP_SCHEMA_VERSION),
+                ('source_path', os.path.abspath(db_handler.db_path)),
+                ('refreshed_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ])
+            conn.commit()
+        counts = {'added': len(added), 'removed': len(removed), 'held': len(held)}
+        logger.info(f"Exposure rollups refreshed in {time.perf_counter() - start:.2f}s: {counts}")
+        return counts
+
+
+def refresh_exposure_rollups(db_handler, rollup_path: Optional[str] = None,
+                             holdings: Optional[pd.DataFrame] = None) -> ExposureRollups:
+    """Refresh (or build) the rollup side table next to the snapshot and return it."""
+    rollups = ExposureRollups(rollup_path or default_rollup_path(db_handler.db_path))
+    rollups.refresh(db_handler, holdings)
+    return rollups
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Build or refresh the portfolio exposure rollups of an Intex snapshot.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--output', default=None, help=f'Rollup side table (default: {DEFAULT_ROLLUP_FILENAME} next to the DB)')
+    parser.add_argument('--full', action='store_true', help='Recompute every CUSIP')
+    parser.add_argument('--show', default=None, choices=ROLLUP_DIMENSIONS, help='Print the portfolio rollup of a dimension')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    handler = CMBSDatabaseHandler(args.db_path)
+    table = ExposureRollups(args.output or default_rollup_path(args.db_path))
+    table.refresh(handler, full=args.full)
+    if args.show:
+        print(json.dumps(table.portfolio_exposure(args.show), indent=2))
+    table.close()
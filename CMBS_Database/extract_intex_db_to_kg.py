@@ -2,10 +2,70 @@ import sqlite3
 import pandas as pd
 import os
 import json
-from typing import List, Dict, Any, Optional, Union
+import logging
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from jsonld_to_cypher import convert_jsonld_file_to_cypher
+from get_geo_from_address import format_property_address, geocode_propinfo_addresses
+from pipeline_metrics import METRICS
+from exposure_rollups import refresh_exposure_rollups
+from entity_resolution import resolve_entities
+from graph_builder import GraphBuilder
+from deal_memo import DealMemo, DealSubgraph, group_by_deal
+from export_archive import DEFAULT_ARCHIVE_FILENAME, JSONLD_GRAPH, PLTR_NODES, ExportArchive
+from run_workspace import RunWorkspace, clean_workspace
+from lookup_tables import DEFAULT_LOOKUP_FILENAME, build_lookup_tables
+from optimize_intex_db import build_optimized_copy, ensure_optimized_copy, is_sidecar_fresh, sidecar_path_for
 import glob
 
+logger = logging.getLogger(__name__)
+
+# propinfo columns whose value counts can be queried (entity resolution)
+PROPINFO_VALUE_COLUMNS = ('owner_name', 'prop_name', 'msa_name', 'trustee_prop_type_full', 'state')
+
+
+# Rows per batch of the iterator API (and per cursor fetch of the DataFrame methods built on it)
+DEFAULT_BATCH_ROWS = 50000
+
+
+def _first_batch_schema(columns: List[str], rows: List[tuple]):
+    """Schema of a query without declared types: each column's type in the first batch (string when all null)."""
+    import pyarrow as pa
+    fields = []
+    for name, values in zip(columns, zip(*rows)):
+        try:
+            arrow_type = pa.array(values).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrow_type = pa.string()
+        fields.append(pa.field(name, pa.string() if arrow_type == pa.null() else arrow_type))
+    return pa.schema(fields)
+
+
+def _record_batch(rows: List[tuple], schema, stringify: Optional[List[bool]] = None):
+    """
+    Arrow RecordBatch of fetched rows under the fixed schema of their query (see iter_query). stringify marks the
+    string columns whose values are not all text. Values that still do not fit their column's type (SQLite does
+    not enforce declared types) are stringified in string columns and become null, with a warning, in the others.
+    """
+    import pyarrow as pa
+    arrays = []
+    for i, (field, values) in enumerate(zip(schema, zip(*rows))):
+        if field.type == pa.string() and (stringify is None or stringify[i]):
+            values = [v if v is None or type(v) is str else str(v) for v in values]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            fitting = []
+            for v in values:
+                try:
+                    fitting.append(pa.scalar(v, type=field.type).as_py())
+                except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                    fitting.append(None)
+            logger.warning(f"{sum(v is not None for v in values) - sum(v is not None for v in fitting)} values of "
+                           f"column '{field.name}' do not fit its type {field.type}; they are read as null")
+            arrays.append(pa.array(fitting, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
 
 # Main handler class for CMBS database operations
 class CMBSDatabaseHandler:
@@ -13,14 +73,30 @@ class CMBSDatabaseHandler:
     A class to handle operations on CMBS SQLite database files.
     """
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, use_sidecar: bool = True):
         """
         Initialize the database handler with a path to the SQLite database.
         Args:
             db_path (str): Path to the SQLite database file
+            use_sidecar (bool): Serve lookups from the optimized working copy (see optimize_intex_db) when present
         """
         self.db_path = db_path
         self._validate_db_path()
+        self.lookup_db_path = self._resolve_lookup_db_path() if use_sidecar else db_path
+        self._columnar_engine = None
+
+    def _resolve_lookup_db_path(self) -> str:
+        """
+        Pick the database used for key lookups: the sidecar if it exists, rebuilt first if the
+        snapshot changed since it was built, otherwise the vendor file itself.
+        """
+        sidecar_path = sidecar_path_for(self.db_path)
+        if not os.path.exists(sidecar_path):
+            return self.db_path
+        if not is_sidecar_fresh(self.db_path, sidecar_path):
+            logger.info(f"Snapshot changed since {sidecar_path} was built; rebuilding.")
+            build_optimized_copy(self.db_path, sidecar_path)
+        return sidecar_path
 
     def _validate_db_path(self) -> None:
         """
@@ -31,26 +107,153 @@ class CMBSDatabaseHandler:
         if not os.path.exists(self.db_path):
             raise FileNotFoundError(f"Database file not found at: {self.db_path}")
 
-    def _execute_query(self, query: str, params: tuple = ()) -> pd.DataFrame:
+    def _fetch_batches(self, query: str, params: tuple = (), batch_rows: int = DEFAULT_BATCH_ROWS,
+                       db_path: Optional[str] = None) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """
+        Run a query and fetch its rows in batches from the open cursor. Yields (column names, rows) pairs,
+        at least once (with no rows for an empty result) so callers always see the columns.
+        """
+        conn = sqlite3.connect(db_path or self.db_path)
+        fetch_s, fetched = 0.0, 0
+        try:
+            start = time.perf_counter()
+            cursor = conn.execute(query, params)
+            columns = [d[0] for d in cursor.description or ()]
+            rows = cursor.fetchmany(batch_rows)
+            fetch_s += time.perf_counter() - start
+            yield columns, rows
+            while rows:
+                fetched += len(rows)
+                start = time.perf_counter()
+                rows = cursor.fetchmany(batch_rows)
+                fetch_s += time.perf_counter() - start
+                if rows:
+                    yield columns, rows
+        finally:
+            conn.close()
+            # Only the time spent in SQLite, not in the consumer between batches
+            METRICS.observe('sqlite_query', fetch_s)
+            METRICS.inc('rows_fetched_total', fetched)
+
+    def _execute_query(self, query: str, params: tuple = (), db_path: Optional[str] = None) -> pd.DataFrame:
         """
         Execute a SQL query and return the results as a DataFrame.
         Args:
             query (str): SQL query to execute
             params (tuple): Parameters for the query
+            db_path (Optional[str]): Database to query; defaults to the vendor snapshot
         Returns:
             pd.DataFrame: Results of the query
         """
-        conn = None  # Initialize conn to None
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query(query, conn, params=params)
-            return df
+            columns, rows = [], []
+            for columns, batch in self._fetch_batches(query, params, DEFAULT_BATCH_ROWS, db_path):
+                rows.extend(batch)
+            # As pd.read_sql_query builds its frame
+            return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
         except sqlite3.Error as e:
-            print(f"SQLite error: {e}")
+            METRICS.inc('errors_total', stage='sqlite_query')
+            logger.error(f"SQLite error: {e}")
             return pd.DataFrame()
+
+    def iter_query(self, query: str, params: tuple = (), batch_rows: int = DEFAULT_BATCH_ROWS,
+                   as_arrow: bool = False, db_path: Optional[str] = None, schema=None,
+                   stringify: Optional[List[bool]] = None) -> Iterator[Union[List[tuple], Any]]:
+        """
+        Stream a query's rows in batches instead of materializing the whole result.
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Parameters for the query
+            batch_rows (int): Rows per batch
+            as_arrow (bool): Yield pyarrow RecordBatches, all of one schema, instead of lists of tuples in SELECT order
+            db_path (Optional[str]): Database to query; defaults to the vendor snapshot
+            schema (Optional[pa.Schema]): Schema of the batches (e.g. arrow_schema of a table); by default it is
+                                          fixed by the first batch, and later batches are converted to it
+            stringify (Optional[List[bool]]): Per column of schema, whether values must be stringified
+        Returns:
+            Iterator[Union[List[tuple], pa.RecordBatch]]: Non-empty batches of at most batch_rows rows
+        """
+        for columns, rows in self._fetch_batches(query, params, batch_rows, db_path):
+            if not rows:
+                continue
+            if as_arrow:
+                if schema is None:
+                    schema = _first_batch_schema(columns, rows)
+                yield _record_batch(rows, schema, stringify)
+            else:
+                yield rows
+
+    def arrow_schema(self, table: str, columns: Optional[List[str]] = None, db_path: Optional[str] = None):
+        """
+        Arrow schema of a table from its declared column types, widened where stored values do not fit them
+        (see columnar_cache.table_arrow_schema), restricted to columns in that order.
+        Returns:
+            Tuple[pa.Schema, List[bool]]: The schema and, per column, whether values must be stringified
+        """
+        import pyarrow as pa
+        from columnar_cache import table_arrow_schema
+        conn = sqlite3.connect(db_path or self.db_path)
+        try:
+            schema, stringify = table_arrow_schema(conn, f'"{table}"')
+        finally:
+            conn.close()
+        if columns is None:
+            return schema, stringify
+        positions = [schema.get_field_index(c) for c in columns]
+        return pa.schema([schema.field(i) for i in positions]), [stringify[i] for i in positions]
+
+    def _table_columns(self, table: str, db_path: Optional[str] = None) -> List[str]:
+        conn = sqlite3.connect(db_path or self.db_path)
+        try:
+            return [row[1] for row in conn.execute("SELECT * FROM pragma_table_info(?)", (table,))]
         finally:
-            if conn:
-                conn.close()  # Ensure connection is closed in finally block
+            conn.close()
+
+    def _table_query(self, table: str, columns: Optional[List[str]] = None, where: Optional[str] = None) -> str:
+        """SELECT of a projection of a table; table and column names are checked against the schema."""
+        existing = self._table_columns(table)
+        if not existing:
+            raise ValueError(f"The '{table}' table was not found.")
+        unknown = [c for c in columns or () if c not in existing]
+        if unknown:
+            raise ValueError(f"Unknown columns of '{table}': {unknown}")
+        projection = ', '.join(f'"{c}"' for c in columns) if columns else '*'
+        return f'SELECT {projection} FROM "{table}"' + (f" WHERE {where}" if where else '')
+
+    def iter_table(self, table: str, columns: Optional[List[str]] = None, where: Optional[str] = None,
+                   params: tuple = (), batch_rows: int = DEFAULT_BATCH_ROWS,
+                   as_arrow: bool = False) -> Iterator[Union[List[tuple], Any]]:
+        """
+        Stream a table, or a projection of it, in batches (see iter_query).
+        Args:
+            table (str): Table name
+            columns (Optional[List[str]]): Columns to read, in this order (default: all)
+            where (Optional[str]): SQL condition, with ? placeholders bound from params
+            params (tuple): Parameters of the condition
+            batch_rows (int): Rows per batch
+            as_arrow (bool): Yield pyarrow RecordBatches of the table's arrow_schema instead of lists of tuples
+        Returns:
+            Iterator[Union[List[tuple], pa.RecordBatch]]: Non-empty batches of at most batch_rows rows
+        Raises:
+            ValueError: If the table or a column does not exist
+        """
+        query = self._table_query(table, columns, where)
+        schema, stringify = self.arrow_schema(table, columns) if as_arrow else (None, None)
+        return self.iter_query(query, params, batch_rows, as_arrow, schema=schema, stringify=stringify)
+
+    def _table_frame(self, table: str, columns: Optional[List[str]] = None, where: Optional[str] = None,
+                     params: tuple = ()) -> pd.DataFrame:
+        """A table projection as one DataFrame (empty, with a warning, if the table does not exist)."""
+        try:
+            query = self._table_query(table, columns, where)
+        except ValueError as e:
+            logger.warning(str(e))
+            return pd.DataFrame()
+        return self._execute_query(query, params)
+
+    def _lookup_query(self, query: str, params: tuple = ()) -> pd.DataFrame:
+        """Execute a key lookup against the optimized working copy when available."""
+        return self._execute_query(query, params, db_path=self.lookup_db_path)
 
     def get_all_holdings_cusip(self) -> list:
         """
@@ -60,14 +263,14 @@ class CMBSDatabaseHandler:
         """
         try:
             query = "SELECT cusip FROM account_holding"
-            cusips_df = self._execute_query(query)
+            cusips_df = self._lookup_query(query)
             return cusips_df['cusip'].tolist()
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'account_holding' table was not found.")
+                logger.warning("The 'account_holding' table was not found.")
                 return []
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return []
 
     def get_deal_id_by_cusip(self, cusip: str) -> Optional[int]:
@@ -80,16 +283,16 @@ class CMBSDatabaseHandler:
         """
         try:
             query = "SELECT deal_id FROM deal_tranche WHERE tr_cusip = ?"
-            result = self._execute_query(query, (cusip,))
+            result = self._lookup_query(query, (cusip,))
             if not result.empty:
                 return result['deal_id'].iloc[0]
-            print(f"No deal_id found for CUSIP: {cusip}")
+            logger.info(f"No deal_id found for CUSIP: {cusip}")
             return None
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'deal_tranche' table was not found.")
+                logger.warning("The 'deal_tranche' table was not found.")
                 # Attempt alternative lookup if schema is different
-                print("Attempting to find deal_id through alternative methods...")
+                logger.info("Attempting to find deal_id through alternative methods...")
                 try:
                     custom_query = """
                     SELECT d.deal_id 
@@ -103,79 +306,114 @@ class CMBSDatabaseHandler:
                         return result['deal_id'].iloc[0]
                 except sqlite3.Error:
                     pass
-                print(f"Could not find deal_id for CUSIP: {cusip} using alternative methods")
+                logger.info(f"Could not find deal_id for CUSIP: {cusip} using alternative methods")
                 return None
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return None
 
-    def get_deals(self) -> pd.DataFrame:
+    def get_deal_ids_by_cusips(self, cusips: List[str], batch_size: int = 500) -> Dict[str, str]:
+        """
+        Map many CUSIPs to their deal ids with batched IN queries instead of one lookup per CUSIP.
+        Args:
+            cusips (List[str]): CUSIPs to look up
+            batch_size (int): CUSIPs per query (below SQLite's bound-parameter limit)
+        Returns:
+            Dict[str, str]: CUSIP -> deal id (as a string) for the CUSIPs found in deal_tranche
+        """
+        distinct = list(dict.fromkeys(cusips))
+        deal_ids: Dict[str, str] = {}
+        try:
+            for start in range(0, len(distinct), batch_size):
+                batch = distinct[start:start + batch_size]
+                query = f"SELECT tr_cusip, deal_id FROM deal_tranche WHERE tr_cusip IN ({','.join('?' * len(batch))})"
+                for cusip, deal_id in self._lookup_query(query, tuple(batch)).itertuples(index=False):
+                    deal_ids.setdefault(cusip, str(deal_id))
+        except sqlite3.OperationalError as e:
+            logger.error(f"An error occurred: {e}")
+        return deal_ids
+
+    def get_deals(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Retrieve all deals from the deals table.
         
+        Args:
+            columns (Optional[List[str]]): Columns to read (default: all)
+            
         Returns:
             pd.DataFrame: DataFrame containing all deals
         """
-        try:
-            query = "SELECT * FROM deals"
-            return self._execute_query(query)
-        except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                print("The 'deals' table was not found.")
-                return pd.DataFrame()
-            else:
-                print(f"An error occurred: {e}")
-                return pd.DataFrame()
+        return self._table_frame('deals', columns)
 
-    def get_collateral(self, deal_id: Optional[int] = None) -> pd.DataFrame:
+    def get_collateral(self, deal_id: Optional[int] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Retrieve collateral data, optionally filtered by deal_id.
+        The whole table is large; iter_table('collateral', ...) streams it instead.
         
         Args:
             deal_id (Optional[int]): Deal ID to filter by
+            columns (Optional[List[str]]): Columns to read (default: all)
             
         Returns:
             pd.DataFrame: DataFrame containing collateral data
         """
-        try:
-            if deal_id is not None:
-                query = "SELECT * FROM collateral WHERE deal_id = ?"
-                return self._execute_query(query, (deal_id,))
-            else:
-                query = "SELECT * FROM collateral"
-                return self._execute_query(query)
-        except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                print("The 'collateral' table was not found.")
-                return pd.DataFrame()
-            else:
-                print(f"An error occurred: {e}")
-                return pd.DataFrame()
+        if deal_id is not None:
+            return self._table_frame('collateral', columns, 'deal_id = ?', (deal_id,))
+        return self._table_frame('collateral', columns)
 
-    def get_account_holdings(self, cusip: Optional[str] = None) -> pd.DataFrame:
+    def get_account_holdings(self, cusip: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Retrieve account holdings data, optionally filtered by CUSIP.
         
         Args:
             cusip (Optional[str]): CUSIP to filter by
+            columns (Optional[List[str]]): Columns to read (default: all)
             
         Returns:
             pd.DataFrame: DataFrame containing account holdings data
         """
-        try:
-            if cusip is not None:
-                query = "SELECT * FROM account_holding WHERE cusip = ?"
-                return self._execute_query(query, (cusip,))
-            else:
-                query = "SELECT * FROM account_holding"
-                return self._execute_query(query)
-        except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                print("The 'account_holding' table was not found.")
-                return pd.DataFrame()
-            else:
-                print(f"An error occurred: {e}")
-                return pd.DataFrame()
+        if cusip is not None:
+            return self._table_frame('account_holding', columns, 'cusip = ?', (cusip,))
+        return self._table_frame('account_holding', columns)
+
+    def get_tranche_rows(self) -> List[Dict[str, Any]]:
+        """
+        Every deal_tranche row with its holding flags, as parameter rows for DealLister.load_tranches.
+        A tranche is held when account_holding has positions in its CUSIP; par_amount and market_value are
+        summed over those positions when the table carries them.
+        Returns:
+            List[Dict[str, Any]]: cusip, deal_id (str), name, rating, balance, held, positions, par_amount,
+                                  market_value per distinct CUSIP
+        """
+        tranches = self.execute_custom_query("SELECT * FROM deal_tranche")
+        if tranches.empty:
+            return []
+        tranches = tranches.drop_duplicates('tr_cusip').dropna(subset=['tr_cusip'])
+        holdings = self.get_account_holdings()
+        sums = [c for c in ('par_amount', 'market_value') if c in holdings.columns]
+        if holdings.empty:
+            positions = pd.DataFrame(columns=['positions', *sums])
+        else:
+            grouped = holdings.groupby('cusip')
+            positions = grouped[sums].sum() if sums else pd.DataFrame(index=grouped.size().index)
+            positions.insert(0, 'positions', grouped.size())
+        tranches = tranches.join(positions, on='tr_cusip')
+        tranches['positions'] = tranches['positions'].fillna(0).astype(int)
+        # NaN is not a Cypher null
+        tranches = tranches.astype(object).where(tranches.notna(), None)
+        rows = [{
+            'cusip': row['tr_cusip'],
+            'deal_id': str(row['deal_id']),
+            'name': row.get('tr_name'),
+            'rating': row.get('tr_rating'),
+            'balance': row.get('tr_balance'),
+            'held': row['positions'] > 0,
+            'positions': row['positions'],
+            'par_amount': row.get('par_amount'),
+            'market_value': row.get('market_value'),
+        } for row in tranches.to_dict('records')]
+        logger.info(f"{len(rows)} tranches, {sum(r['held'] for r in rows)} held.")
+        return rows
 
     def execute_custom_query(self, query: str, params: tuple = ()) -> pd.DataFrame:
         """
@@ -190,6 +428,49 @@ class CMBSDatabaseHandler:
         """
         return self._execute_query(query, params)
 
+    def ingest_loans(self, output_dir: Optional[str] = None, deal_lister=None, chunk_rows: int = 50000) -> Dict[str, Any]:
+        """
+        Stream the collateral table into Loan nodes and Parquet files with bounded memory (see loan_ingest).
+        Args:
+            output_dir (Optional[str]): Parquet output directory; defaults to loans/<snapshot name> next to the DB
+            deal_lister (Optional[DealLister]): Also load the loans into Neo4j
+            chunk_rows (int): Rows per chunk
+        Returns:
+            Dict[str, Any]: Ingestion stats
+        """
+        from loan_ingest import ingest_loans
+        return ingest_loans(self, output_dir, deal_lister, chunk_rows)
+
+    def ingest_columnar_cache(self, cache_dir: Optional[str] = None, force: bool = False) -> str:
+        """
+        Convert the snapshot's analytic tables to Parquet (see columnar_cache), skipped if already current.
+        Args:
+            cache_dir (Optional[str]): Parquet cache directory; defaults to columnar_cache/<snapshot name> next to the DB
+            force (bool): Re-ingest even if the cache matches the snapshot
+        Returns:
+            str: The cache directory
+        """
+        from columnar_cache import ColumnarQueryEngine, ingest_snapshot_to_parquet
+        cache_dir = ingest_snapshot_to_parquet(self.db_path, cache_dir, force=force)
+        if self._columnar_engine is not None:
+            self._columnar_engine.close()
+        self._columnar_engine = ColumnarQueryEngine(cache_dir)
+        return cache_dir
+
+    def query_analytics(self, query: str, params: tuple = ()) -> pd.DataFrame:
+        """
+        Run analytic SQL (DuckDB dialect) over the columnar cache of this snapshot, building the cache on first use.
+        Tables are exposed under their SQLite names (deals, deal_tranche, account_holding, propinfo, collateral).
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Parameters for the query
+        Returns:
+            pd.DataFrame: Results of the query
+        """
+        if self._columnar_engine is None:
+            self.ingest_columnar_cache()
+        return self._columnar_engine.query(query, params)
+
     def get_issuer_name_by_cusip(self, cusip: str) -> Optional[str]:
         """
         Function to retrieve the issuer name associated with a given CUSIP.
@@ -203,24 +484,24 @@ class CMBSDatabaseHandler:
         """
         try:
             query = "SELECT ult_issuer_name FROM account_holding WHERE cusip = ?"
-            result = self._execute_query(query, (cusip,))
+            result = self._lookup_query(query, (cusip,))
 
             if not result.empty:
                 return result['ult_issuer_name'].iloc[0]
 
             # If we can't find the CUSIP, return None
-            print(f"No issuer name found for CUSIP: {cusip}")
+            logger.info(f"No issuer name found for CUSIP: {cusip}")
             return None
 
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'account_holding' table was not found.")
+                logger.warning("The 'account_holding' table was not found.")
                 return None
             elif "no such column" in str(e):
-                print("The 'ult_issuer_name' column was not found in the account_holding table.")
+                logger.warning("The 'ult_issuer_name' column was not found in the account_holding table.")
                 return None
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return None
 
     def get_bloomberg_name_by_deal_id(self, deal_id: int) -> Optional[str]:
@@ -236,24 +517,24 @@ class CMBSDatabaseHandler:
         """
         try:
             query = "SELECT bloomberg_name FROM deals WHERE deal_id = ?"
-            result = self._execute_query(query, (deal_id,))
+            result = self._lookup_query(query, (deal_id,))
 
             if not result.empty:
                 return result['bloomberg_name'].iloc[0]
 
             # If we can't find the deal_id, return None
-            print(f"No Bloomberg name found for deal_id: {deal_id}")
+            logger.info(f"No Bloomberg name found for deal_id: {deal_id}")
             return None
 
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'deals' table was not found.")
+                logger.warning("The 'deals' table was not found.")
                 return None
             elif "no such column" in str(e):
-                print("The 'bloomberg_name' column was not found in the deals table.")
+                logger.warning("The 'bloomberg_name' column was not found in the deals table.")
                 return None
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return None
 
     def get_owner_info_by_deal_id(self, deal_id: int) -> Optional[list]:
@@ -266,23 +547,23 @@ class CMBSDatabaseHandler:
         """
         try:
             query = "SELECT owner_name, owner_type FROM propinfo WHERE deal_id = ?"
-            result = self._execute_query(query, (deal_id,))
+            result = self._lookup_query(query, (deal_id,))
             if not result.empty:
                 return result.apply(lambda row: {
                     'owner_name': row['owner_name'],
                     'owner_type': row['owner_type']
                 }, axis=1).tolist()
-            print(f"No owner information found for deal_id: {deal_id}")
+            logger.info(f"No owner information found for deal_id: {deal_id}")
             return None
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'propinfo' table was not found.")
+                logger.warning("The 'propinfo' table was not found.")
                 return None
             elif "no such column" in str(e):
-                print("The 'owner_name' or 'owner_type' column was not found in the propinfo table.")
+                logger.warning("The 'owner_name' or 'owner_type' column was not found in the propinfo table.")
                 return None
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return None
 
     def get_property_info_by_deal_id(self, deal_id: int) -> Optional[Dict[str, Any]]:
@@ -299,33 +580,95 @@ class CMBSDatabaseHandler:
         """
         try:
             query = """
-            SELECT address, year_built, trustee_prop_type_full, state, msa_name, prop_name
+            SELECT address, year_built, trustee_prop_type_full, state, msa_name, prop_name, owner_name, owner_type
             FROM propinfo 
             WHERE deal_id = ?
             """
-            result = self._execute_query(query, (deal_id,))
+            result = self._lookup_query(query, (deal_id,))
 
             if not result.empty:
+                # A NULL owner is None rather than NaN, so it cannot become an owner named 'nan'
+                owners = result[['owner_name', 'owner_type']].astype(object)
+                result[['owner_name', 'owner_type']] = owners.where(owners.notna(), None)
                 return result.apply(lambda row: {
                     'address': row['address'],
                     'year_built': row['year_built'],
                     'trustee_prop_type_full': row['trustee_prop_type_full'],
                     'state': row['state'],
                     'msa_name': row['msa_name'],
-                    'prop_name': row['prop_name']
+                    'prop_name': row['prop_name'],
+                    'owner_name': row['owner_name'],
+                    'owner_type': row['owner_type']
                 }, axis=1).tolist()
 
-            print(f"No property information found for deal_id: {deal_id}")
+            logger.info(f"No property information found for deal_id: {deal_id}")
             return None
 
         except sqlite3.OperationalError as e:
             if "no such table" in str(e):
-                print("The 'propinfo' table was not found.")
+                logger.warning("The 'propinfo' table was not found.")
                 return None
             else:
-                print(f"An error occurred: {e}")
+                logger.error(f"An error occurred: {e}")
                 return None
 
+    def get_distinct_property_addresses(self) -> list:
+        """
+        Retrieve every distinct property address in the propinfo table, formatted like Address node ids.
+        Returns:
+            List[str]: Distinct addresses, e.g. "9600 Forest Lane, Dallas, TX"
+        """
+        try:
+            query = "SELECT DISTINCT address, state FROM propinfo"
+            result = self._lookup_query(query)
+            if result.empty:
+                return []
+            return sorted({format_property_address(address, state)
+                           for address, state in zip(result['address'], result['state'])})
+        except sqlite3.OperationalError as e:
+            logger.error(f"An error occurred: {e}")
+            return []
+
+    def get_propinfo_value_counts(self, column: str) -> Dict[str, int]:
+        """
+        Count the properties per distinct value of a propinfo column (e.g. owner_name, prop_name).
+        Args:
+            column (str): One of PROPINFO_VALUE_COLUMNS
+        Returns:
+            Dict[str, int]: value -> number of properties
+        """
+        if column not in PROPINFO_VALUE_COLUMNS:
+            raise ValueError(f"Unsupported propinfo column: {column}")
+        result = self._lookup_query(f"SELECT {column} AS value, count(*) AS n FROM propinfo "
+                                    f"WHERE {column} IS NOT NULL GROUP BY {column}")
+        if result.empty:
+            return {}
+        return dict(zip(result['value'].astype(str), result['n'].astype(int)))
+
+    def get_holdings_collateral(self, cusips: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Retrieve one row per (CUSIP, property) for the given CUSIPs, or for every held CUSIP,
+        in a single join instead of one lookup per deal.
+        Args:
+            cusips (Optional[List[str]]): CUSIPs to include; defaults to all CUSIPs in account_holding
+        Returns:
+            pd.DataFrame: cusip, deal_id, address, state, year_built, trustee_prop_type_full, msa_name,
+                          prop_name, owner_name
+        """
+        select = """
+            SELECT t.tr_cusip AS cusip, p.deal_id, p.address, p.state, p.year_built, p.trustee_prop_type_full,
+                   p.msa_name, p.prop_name, p.owner_name
+            FROM deal_tranche t JOIN propinfo p ON p.deal_id = t.deal_id
+        """
+        if cusips is None:
+            return self._lookup_query(select + " WHERE t.tr_cusip IN (SELECT DISTINCT cusip FROM account_holding)")
+        cusips = list(dict.fromkeys(cusips))
+        # Stay below SQLite's bound-parameter limit
+        frames = [self._lookup_query(select + f" WHERE t.tr_cusip IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+                  for chunk in (cusips[i:i + 500] for i in range(0, len(cusips), 500))]
+        frames = [f for f in frames if not f.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
     def print_node_info_from_jsonld(self, cusip_to_load):
         """Reads a JSON-LD file for a given CUSIP and prints node information."""
         input_filename = f"cmbs_graph_{cusip_to_load}.jsonld"
@@ -335,10 +678,10 @@ class CMBSDatabaseHandler:
             with open(input_file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
         except FileNotFoundError:
-            print(f"Error: JSON-LD file not found at {input_file_path}")
+            logger.error(f"Error: JSON-LD file not found at {input_file_path}")
             return
         except json.JSONDecodeError:
-            print(f"Error: Could not decode JSON from {input_file_path}")
+            logger.error(f"Error: Could not decode JSON from {input_file_path}")
             return
 
         print(f"\n--- Node Information for CUSIP: {cusip_to_load} ---")
@@ -362,10 +705,98 @@ class CMBSDatabaseHandler:
         else:
             print("No graph data found in the JSON-LD file.")
 
-    def export_cusip_data_to_jsonld(self, cusip_to_export):
+    def build_deal_subgraph(self, deal_id, geocoder=None, entity_map=None) -> DealSubgraph:
+        """
+        Build the CUSIP-independent part of a deal's export: the Bloomberg name, the property subgraph and
+        the tails of its Palantir node rows (see deal_memo.DealSubgraph).
+        Args:
+            deal_id: Deal id (as in the deals table)
+            geocoder: Optional get_geo_from_address.BatchGeocoder for Address latitude/longitude
+            entity_map: Optional entity_resolution.AliasMap for canonical owner and property names
+        Returns:
+            DealSubgraph: The deal's subgraph (without properties if propinfo has none)
+        """
+        deal_id = str(deal_id)
+        build_start = time.perf_counter()
+        bloomberg_name = self.get_bloomberg_name_by_deal_id(deal_id)
+        prop_info_list = self.get_property_info_by_deal_id(deal_id)
+        graph = GraphBuilder()
+        property_ids, row_tails = [], []
+        # For each property, create nodes and link them; repeated entities (the same year, type or MSA) are merged
+        for prop_info in prop_info_list or ():
+            address_for_id = format_property_address(prop_info['address'], prop_info.get('state'))
+            property_id = f"{address_for_id}"
+            address_id = f"{address_for_id}"
+            year_built_id = f"{prop_info['year_built']}"
+            trustee_prop_type_full_id = f"{prop_info['trustee_prop_type_full']}"
+            # Properties without a reported owner get no owner edge, rather than one shared unknown-owner hub
+            owner_name = prop_info.get('owner_name') or None
+            owner_type = prop_info.get('owner_type')
+            # Add msa_name and prop_name nodes
+            msa_name = prop_info.get('msa_name', 'UnknownMSA')
+            prop_name = prop_info.get('prop_name', 'UnknownPropName')
+            msa_name_id = f"{msa_name}"
+            if entity_map is not None:
+                if owner_name is not None:
+                    owner_name = entity_map.canonical('owner_name', owner_name)
+                prop_name = entity_map.canonical('prop_name', prop_name)
+            property_owner_id = f"{owner_name}"
+            prop_name_id = f"{prop_name}"
+
+            # The Palantir vertex row after dealId|bloombergName|cusip
+            row_tails.append(f"|{property_id}|{address_id}|{year_built_id}|{trustee_prop_type_full_id}\n")
+
+            location = geocoder.lookup(address_id) if geocoder else None
+            if location:
+                graph.node("Address", address_id, latitude=location[0], longitude=location[1])
+            else:
+                graph.node("Address", address_id)
+            graph.node("YearBuilt", year_built_id)
+            property_node = graph.node("Property", property_id)
+            graph.ref(property_node, "locatedAt", address_id)
+            graph.ref(property_node, "builtAt", year_built_id)
+            graph.ref(property_node, "partOfDeal", f"deal:{deal_id}")
+            graph.ref(property_node, "propertyType", trustee_prop_type_full_id)
+            if owner_name is not None:
+                graph.ref(property_node, "ownedBy", property_owner_id)
+            graph.ref(property_node, "inMsa", msa_name_id)
+            graph.ref(property_node, "namedAs", prop_name_id)
+            graph.ref(graph.node("TrusteePropTypeFull", trustee_prop_type_full_id), "usedProperty", property_id)
+            resolved_nodes = []
+            if owner_name is not None:
+                resolved_nodes.append(('owner_name', graph.node("PropertyOwner", property_owner_id,
+                                                                ownerName=owner_name, ownerType=owner_type)))
+            graph.node("MSAName", msa_name_id, name=msa_name)
+            resolved_nodes.append(('prop_name', graph.node("PropName", prop_name_id, name=prop_name)))
+            if entity_map is not None:
+                for column, node in resolved_nodes:
+                    for alias in entity_map.aliases(column, node.id):
+                        graph.ref(node, "hasAlias", graph.node("Alias", f"alias:{column}:{alias}", name=alias).id)
+            property_ids.append(property_id)
+        METRICS.observe('graph_build', time.perf_counter() - build_start)
+        return DealSubgraph(deal_id, bloomberg_name, graph, property_ids, row_tails)
+
+    def export_cusip_data_to_jsonld(self, cusip_to_export, geocoder=None, write_jsonld=False, write_csv=True,
+                                    graph_collector=None, entity_map=None, archive=None, workspace=None,
+                                    deal_memo=None, deal_id=None):
         """
         Exports all relevant data for a single CUSIP to a JSON-LD file, which can be used for graph database import.
+        If a geocoder (see get_geo_from_address.BatchGeocoder) is given, Address nodes carry latitude/longitude.
+        The cmbs_graph_{cusip}.jsonld file is only written when write_jsonld is True.
+        If graph_collector is given, the CUSIP's graph is added to it, e.g. to build a whole-snapshot graph
+        for versioned loading (see versioned_graph): a list receives the @graph items, a graph_builder.GraphBuilder
+        merges the nodes so each distinct entity is held once.
+        If entity_map (see entity_resolution.AliasMap) is given, PropertyOwner and PropName nodes use canonical
+        names and list their other spellings as Alias nodes.
+        If archive (see export_archive.ExportArchive) is given, the CSV and JSON-LD payloads are stored in it
+        under the CUSIP instead of being written as cmbs_* files next to the database.
+        If workspace (see run_workspace.RunWorkspace) is given, files go to the run's directory and are
+        recorded in its manifest.
+        If deal_memo (see deal_memo.DealMemo) is given, the deal's subgraph is built once and reused for every
+        CUSIP of the deal; deal_id skips the CUSIP -> deal lookup when the caller already has it.
         """
+        export_start = time.perf_counter()
+        output_dir = workspace.dir if workspace is not None else os.path.dirname(self.db_path)
         json_ld_data = {
             "@context": {
                 "cusip": "http://schema.org/identifier",
@@ -377,6 +808,8 @@ class CMBSDatabaseHandler:
                 "yearBuilt": "http://schema.org/dateCreated",
                 "propertyType": "http://schema.org/propertyType",
                 "dealId": "http://schema.org/productID",
+                "latitude": "http://schema.org/latitude",
+                "longitude": "http://schema.org/longitude",
                 "hasProperty": "http://schema.org/location",
                 "issuedBy": "http://schema.org/issuedBy",
                 "issues": "http://schema.org/makesOffer",
@@ -384,208 +817,118 @@ class CMBSDatabaseHandler:
             },
             "@graph": []
         }
-        deal_id = str(self.get_deal_id_by_cusip(cusip_to_export))
-        issuer_name = self.get_issuer_name_by_cusip(cusip_to_export)
-        RAG_deal_description = ""
-        plt_vertex_nodes = "dealId|bloombergName|cusip|propertyId|addressId|yearBuilt|trusteePropType"+"\n"
-        plt_vertex_relations = "parent|relation|child"+"\n"
+        if deal_id is None:
+            deal_id = self.get_deal_id_by_cusip(cusip_to_export)
+        deal_id = str(deal_id)
         if deal_id is not None and deal_id.lower() != 'none':
-            bloomberg_name = self.get_bloomberg_name_by_deal_id(deal_id)
-            # print(f"*********Deal_id: {deal_id}")
-            prop_info_list = self.get_property_info_by_deal_id(deal_id)
-            # print(f"*********Prop_info_list: {prop_info_list}")
-            # Create the Deal node
-            deal_node = {
-                "@type": "Deal",
-                "@id": f"{deal_id}",
-                "dealId": deal_id,
-                "bloomberg": bloomberg_name if bloomberg_name else "None",
-                "cusip": cusip_to_export if cusip_to_export else "None"
-            }
-            if prop_info_list:
-                deal_node["hasProperty"] = []
-                # For each property, create nodes and link them
-                for prop_info in prop_info_list:
-                    address_for_id = (
-                        f"{prop_info['address']}, {prop_info['state']}" if prop_info['address'] and 'state' in prop_info and prop_info['state']
-                        else (prop_info['address'] if prop_info['address'] else "UnknownAddress")
-                    )
-                    # print(f"*********address_for_id: {address_for_id}")
-                    # a=input("Press any key to continue...")
-                    property_id = f"{address_for_id}"
-                    address_id = f"{address_for_id}"
-                    year_built_id = f"{prop_info['year_built']}"
-                    trustee_prop_type_full_id = f"{prop_info['trustee_prop_type_full']}"
-                    owner_name = prop_info.get('owner_name', 'UnknownOwner')
-                    owner_type = prop_info.get('owner_type', 'UnknownType')
-                    property_owner_id = f"{owner_name}"
-                    # Add msa_name and prop_name nodes
-                    msa_name = prop_info.get('msa_name', 'UnknownMSA')
-                    prop_name = prop_info.get('prop_name', 'UnknownPropName')
-                    msa_name_id = f"{msa_name}"
-                    prop_name_id = f"{prop_name}"
-
-                    # Create the descption entry for RAG
-                    description = f"the deal {deal_id} has cusip:{cusip_to_export}, the name of this security is {bloomberg_name}, it contains property: {prop_name}, which address is {address_for_id},in the MSA arae:{msa_name} , was built in {prop_info['year_built']} , the trustee property type is {prop_info['trustee_prop_type_full']}"
-                    RAG_deal_description += description + "\n"
-
-
-
-                    # Create the vertex entry for plt
-                    vertex_node_entry = f"{deal_id}|{bloomberg_name}|{cusip_to_export}|{property_id}|{address_id}|{year_built_id}|{trustee_prop_type_full_id}"+"\n"
-                    plt_vertex_nodes += vertex_node_entry
-
-                    vertex_relation_entry = f"{bloomberg_name}|hasProperty|{prop_name}"+"\n"+f"{prop_name}|locatedAt|{address_id}"+"\n"+f"{prop_name}|isUsedAs|{trustee_prop_type_full_id}"+"\n"
-                    plt_vertex_relations += vertex_relation_entry
-
-
-                    # Create the knowledge graph node
-                    address_node = {
-                        "@type": "Address",
-                        "@id": address_id,
-                    }
-                    year_built_node = {
-                        "@type": "YearBuilt",
-                        "@id": year_built_id,
-                    }
-                    trustee_prop_type_full_node = {
-                        "@type": "TrusteePropTypeFull",
-                        "@id": trustee_prop_type_full_id,
-                        "usedProperty": {"@id": property_id}
-                    }
-                    property_owner_node = {
-                        "@type": "PropertyOwner",
-                        "@id": property_owner_id,
-                        "ownerName": owner_name,
-                        "ownerType": owner_type
-                    }
-
-                    msa_name_node = {
-                        "@type": "MSAName",
-                        "@id": msa_name_id,
-                        "name": msa_name
-                    }
-                    prop_name_node = {
-                        "@type": "PropName",
-                        "@id": prop_name_id,
-                        "name": prop_name
-                    }
-                    property_node = {
-                        "@type": "Property",
-                        "@id": property_id,
-                        "locatedAt": {"@id": address_id},
-                        "builtAt": {"@id": year_built_id},
-                        "partOfDeal": {"@id": f"deal:{deal_id}"},
-                        "propertyType": {"@id": trustee_prop_type_full_id},
-                        "ownedBy": {"@id": property_owner_id},
-                        "inMsa": {"@id": msa_name_id},
-                        "namedAs": {"@id": prop_name_id}
-                    }
-                    deal_node["hasProperty"].append({"@id": property_id})
-                    json_ld_data["@graph"].append(address_node)
-                    json_ld_data["@graph"].append(year_built_node)
-                    json_ld_data["@graph"].append(property_node)
-                    json_ld_data["@graph"].append(trustee_prop_type_full_node)
-                    json_ld_data["@graph"].append(property_owner_node)
-                    json_ld_data["@graph"].append(msa_name_node)
-                    json_ld_data["@graph"].append(prop_name_node)
-                json_ld_data["@graph"].append(deal_node)
-            # output_filename = f"cmbs_graph_{cusip_to_export}.jsonld"
-            # output_file_path = os.path.join(os.path.dirname(self.db_path), output_filename)
-            # print(f"*********output_file_path: {output_file_path}")
-            # if os.path.exists(output_file_path):
-            #     os.remove(output_file_path)
-            # with open(output_file_path, 'w', encoding='utf-8') as f:
-            #     json.dump(json_ld_data, f, indent=2, ensure_ascii=False)
-            # print(f"\nJSON-LD data for CUSIP {cusip_to_export} has been exported to: {output_file_path}")
-
-            # rag_output_filename = f"cmbs_rag_{cusip_to_export}.txt"
-            # rag_output_file_path = os.path.join(os.path.dirname(self.db_path), rag_output_filename)
-            # if os.path.exists(rag_output_file_path):
-            #     os.remove(rag_output_file_path)
-            # with open(rag_output_file_path, 'w', encoding='utf-8') as f:
-            #     f.write(RAG_deal_description)
-            # print(f"\nRAG description for CUSIP {cusip_to_export} has been exported to: {rag_output_file_path}")
+            if deal_memo is not None:
+                deal = deal_memo.get(deal_id, lambda: self.build_deal_subgraph(deal_id, geocoder, entity_map))
+            else:
+                deal = self.build_deal_subgraph(deal_id, geocoder, entity_map)
+            if deal.property_ids:
+                # Every CUSIP of the deal exports the same subgraph: CUSIPs are Tranche nodes
+                # (DealLister.load_tranches), not a property of the Deal node
+                if write_jsonld or isinstance(graph_collector, list):
+                    graph = GraphBuilder()
+                    graph.merge(deal.graph)
+                    deal.add_deal_node(graph)
+                    items = graph.jsonld_graph()
+                    if write_jsonld:
+                        json_ld_data["@graph"] = items
+                    if isinstance(graph_collector, list):
+                        graph_collector.extend(items)
+                elif isinstance(graph_collector, GraphBuilder):
+                    graph_collector.merge(deal.graph, key=('deal', deal.deal_id))
+                    deal.add_deal_node(graph_collector)
+                METRICS.inc('graph_nodes_total', deal.node_count + 1)
+                METRICS.inc('graph_edges_total', deal.edge_count + len(deal.property_ids))
+            if write_jsonld and archive is not None:
+                archive.put(cusip_to_export, JSONLD_GRAPH, json.dumps(json_ld_data, ensure_ascii=False))
+            elif write_jsonld:
+                output_filename = f"cmbs_graph_{cusip_to_export}.jsonld"
+                output_file_path = os.path.join(output_dir, output_filename)
+                if os.path.exists(output_file_path):
+                    os.remove(output_file_path)
+                with METRICS.span('file_write', format='jsonld'), open(output_file_path, 'w', encoding='utf-8') as f:
+                    json.dump(json_ld_data, f, indent=2, ensure_ascii=False)
+                if workspace is not None:
+                    workspace.register(output_file_path, JSONLD_GRAPH)
+                logger.debug(f"JSON-LD data for CUSIP {cusip_to_export} has been exported to: {output_file_path}")
 
+            if not write_csv:
+                METRICS.observe('cusip_export', time.perf_counter() - export_start)
+                return None
+            plt_vertex_nodes = deal.pltr_nodes(cusip_to_export)
+            if archive is not None:
+                archive.put(cusip_to_export, PLTR_NODES, plt_vertex_nodes)
+                METRICS.observe('cusip_export', time.perf_counter() - export_start)
+                return archive.path
             pltr_vertex_relations_output_filename = f"cmbs_pltr_nodes_{cusip_to_export}.csv"
-            pltr_vertex_nodes_output_file_path = os.path.join(os.path.dirname(self.db_path), pltr_vertex_relations_output_filename)
+            pltr_vertex_nodes_output_file_path = os.path.join(output_dir, pltr_vertex_relations_output_filename)
             if os.path.exists(pltr_vertex_nodes_output_file_path):
                 os.remove(pltr_vertex_nodes_output_file_path)
-            with open(pltr_vertex_nodes_output_file_path, 'w', encoding='utf-8') as f:
+            with METRICS.span('file_write', format='csv'), open(pltr_vertex_nodes_output_file_path, 'w', encoding='utf-8') as f:
                 f.write(plt_vertex_nodes)
-            print(f"\nPalantir description for CUSIP {cusip_to_export} has been exported to: {pltr_vertex_relations_output_filename}")
-            
-            # pltr_vertex_relations_output_filename = f"cmbs_pltr_edges_{cusip_to_export}.csv"
-            # pltr_vertex_nodes_output_file_path = os.path.join(os.path.dirname(self.db_path), pltr_vertex_relations_output_filename)
-            # if os.path.exists(pltr_vertex_nodes_output_file_path):
-            #     os.remove(pltr_vertex_nodes_output_file_path)
-            # with open(pltr_vertex_nodes_output_file_path, 'w', encoding='utf-8') as f:
-            #     f.write(plt_vertex_relations)
-            # print(f"\nPalantir description for CUSIP {cusip_to_export} has been exported to: {pltr_vertex_relations_output_filename}")
-            
+            if workspace is not None:
+                workspace.register(pltr_vertex_nodes_output_file_path, PLTR_NODES)
+            logger.debug(f"Palantir description for CUSIP {cusip_to_export} has been exported to: {pltr_vertex_relations_output_filename}")
 
+            METRICS.observe('cusip_export', time.perf_counter() - export_start)
             return pltr_vertex_nodes_output_file_path
+        METRICS.observe('cusip_export', time.perf_counter() - export_start)
         return None
 
-    # Clean up generated files
-def clean_directory(directory):
-    """Cleans up all files in the specified directory and deletes specific 'cmbs_' files."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.startswith("cmbs_") and file.endswith(('.txt','.csv', '.jsonld', '.cypher')):
-                filepath = os.path.join(root, file)
-                print(f"Deleting file: {filepath}")
-                os.remove(filepath)
-    # Combine CSV files and export to Excel
-def combine_csv_files(pattern="cmbs_pltr_nodes*.csv", output_file="combined_cmbs_pltr_nodes.csv"):
-    """Combine multiple CSV files matching a pattern into a single output file."""
-    # Get all files matching the pattern
-    input_files = sorted(glob.glob(pattern))
-    
-    if not input_files:
-        print(f"No files found matching pattern: {pattern}")
-        return None
-    
-    # Combine files
-    with open(output_file, "w", encoding="utf-8") as outfile:
-        first_file = True
-        for file in input_files:
-            with open(file, "r", encoding="utf-8") as infile:
-                lines = infile.readlines()
-                if first_file:
-                    outfile.writelines(lines)
-                    first_file = False
-                else:
-                    outfile.writelines(lines[1:])  # Skip header
-                outfile.write("\n")  # Optional: Add newline between files
-    
-    print(f"Combined {len(input_files)} files into {output_file}")
-    return output_file
+    def export_holdings(self, cusips: Optional[List[str]] = None, deal_memo: Optional[DealMemo] = None,
+                        **export_kwargs) -> Dict[str, Any]:
+        """
+        Export every distinct holding CUSIP, grouped by deal so each deal's subgraph is built once and reused
+        for all of its tranches. Export cost scales with distinct deals rather than holdings.
+        Args:
+            cusips (Optional[List[str]]): CUSIPs to export (default: all holdings)
+            deal_memo (Optional[DealMemo]): Memo shared across the run (default: a new DealMemo)
+            **export_kwargs: Passed to export_cusip_data_to_jsonld (geocoder, entity_map, archive, ...)
+        Returns:
+            Dict[str, Any]: Counts of holdings, distinct CUSIPs, deals, exported and failed CUSIPs, and memo stats
+        """
+        cusips = self.get_all_holdings_cusip() if cusips is None else cusips
+        deal_memo = deal_memo if deal_memo is not None else DealMemo()
+        groups = group_by_deal(self.get_deal_ids_by_cusips(cusips), cusips)
+        exported = failed = 0
+        for deal_id, deal_cusips in groups.items():
+            for cusip in deal_cusips:
+                logger.debug(f"Processing data for CUSIP: {cusip}")
+                try:
+                    self.export_cusip_data_to_jsonld(cusip, deal_memo=deal_memo, deal_id=deal_id, **export_kwargs)
+                    exported += 1
+                except Exception:
+                    failed += 1
+                    METRICS.inc('errors_total', stage='cusip_export')
+                    logger.exception(f"Failed to export CUSIP {cusip}")
+        stats = {'holdings': len(cusips), 'cusips': sum(len(c) for c in groups.values()),
+                 'deals': sum(1 for deal_id in groups if deal_id is not None), 'exported': exported,
+                 'failed': failed, 'memo': deal_memo.stats()}
+        logger.info(f"Exported {exported} CUSIPs of {stats['deals']} deals ({len(cusips)} holdings), "
+                    f"deal memo hit rate {stats['memo']['hit_rate']:.1%}")
+        return stats
 
-def convert_to_excel(csv_file, excel_file=None, separator='|'):
-    """Convert a CSV file to Excel format using the specified separator."""
-    if excel_file is None:
-        excel_file = csv_file.replace('.csv', '.xlsx')
-    
-    # Read the CSV file with the specified separator
-    df = pd.read_csv(csv_file, sep=separator)
-    
-    # Write to Excel file
-    df.to_excel(excel_file, index=False)
-    
-    print(f"Converted {csv_file} to Excel format: {excel_file}")
 
+def count_jsonld_edges(graph: List[Dict[str, Any]]) -> int:
+    """Count the node references (edges) in a JSON-LD @graph."""
+    edges = 0
+    for item in graph:
+        for value in item.values():
+            if isinstance(value, dict) and '@id' in value:
+                edges += 1
+            elif isinstance(value, list):
+                edges += sum(1 for v in value if isinstance(v, dict) and '@id' in v)
+    return edges
 
- # Clean up generated files
+# Clean up generated files
 def clean_directory(directory):
-    """Cleans up all files in the specified directory and deletes specific 'cmbs_' files."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.startswith("cmbs_") and file.endswith(('.txt','.csv', '.jsonld', '.cypher')):
-                filepath = os.path.join(root, file)
-                print(f"Deleting file: {filepath}")
-                os.remove(filepath)
-    
+    """Remove a run's intermediate artifacts from its workspace manifest (see run_workspace.clean_workspace)."""
+    return clean_workspace(directory)
+
+
 # Combine CSV files and export to Excel
 def combine_csv_files(pattern="cmbs_pltr_nodes*.csv", output_file="combined_cmbs_pltr_nodes.csv"):
     """Combine multiple CSV files matching a pattern into a single output file."""
@@ -593,7 +936,7 @@ def combine_csv_files(pattern="cmbs_pltr_nodes*.csv", output_file="combined_cmbs
     input_files = sorted(glob.glob(pattern))
     
     if not input_files:
-        print(f"No files found matching pattern: {pattern}")
+        logger.warning(f"No files found matching pattern: {pattern}")
         return None
     
     # Combine files
@@ -609,7 +952,7 @@ def combine_csv_files(pattern="cmbs_pltr_nodes*.csv", output_file="combined_cmbs
                     outfile.writelines(lines[1:])  # Skip header
                 outfile.write("\n")  # Optional: Add newline between files
     
-    print(f"Combined {len(input_files)} files into {output_file}")
+    logger.info(f"Combined {len(input_files)} files into {output_file}")
     return output_file
 
 def convert_to_excel(csv_file, excel_file=None, separator='|'):
@@ -623,40 +966,74 @@ def convert_to_excel(csv_file, excel_file=None, separator='|'):
     # Write to Excel file
     df.to_excel(excel_file, index=False)
     
-    print(f"Converted {csv_file} to Excel format: {excel_file}")
+    logger.info(f"Converted {csv_file} to Excel format: {excel_file}")
 
  
 
 # Example usage of the class
 if __name__ == "__main__":
-    # Set the default path to the Intex SQLite database
-    # Change from hardcoded path to current directory
+    import argparse
+    import shutil
+    from exposure_rollups import DEFAULT_ROLLUP_FILENAME
+    from run_workspace import latest_artifact
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    default_db_path = os.path.join(current_dir, 'CMBS_H_20250430')
-    db_handler = CMBSDatabaseHandler(default_db_path)
+    parser = argparse.ArgumentParser(description='Export the held CUSIPs of an Intex snapshot to JSON-LD, CSV and Excel.')
+    parser.add_argument('db_path', nargs='?', default=os.path.join(current_dir, 'CMBS_H_20250430'),
+                        help='Path to the Intex SQLite database (default: CMBS_H_20250430 next to this script)')
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get('CMBS_LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    db_path = os.path.abspath(args.db_path)
+    base_dir = os.path.dirname(db_path)
+    # Prepare the indexed working copy of the snapshot (no-op when it is up to date)
+    ensure_optimized_copy(db_path)
+    db_handler = CMBSDatabaseHandler(db_path)
+    # Outputs of this run live in their own workspace, so concurrent runs never share files
+    workspace = RunWorkspace.create(base_dir, os.path.basename(db_path))
     # Get all CUSIPs and process one as an example
     all_cusips = db_handler.get_all_holdings_cusip()
+    # Geocode all distinct property addresses once against the offline gazetteer
+    geocoder = geocode_propinfo_addresses(db_handler)
+    # Materialize exposure rollups per holding and portfolio; starting from the previous run's table keeps the
+    # refresh incremental when only holdings changed (a different snapshot is detected and rebuilt)
+    rollup_path = workspace.path(DEFAULT_ROLLUP_FILENAME)
+    previous_rollups = latest_artifact(base_dir, 'exposure_rollups', exclude=workspace.dir)
+    if previous_rollups:
+        shutil.copy2(previous_rollups, rollup_path)
+    refresh_exposure_rollups(db_handler, rollup_path).close()
+    workspace.register(rollup_path, 'exposure_rollups', save=True)
+    # Collapse owner and property-name spelling variants to canonical nodes with alias edges
+    entity_map, _ = resolve_entities(db_handler)
+    # Per-CUSIP payloads go to one archive file instead of one small file per CUSIP
+    archive = ExportArchive(workspace.register(workspace.path(DEFAULT_ARCHIVE_FILENAME), 'archive', save=True))
+    # Static lookup tables (address/CUSIP/MSA/owner -> deals, deal -> Bloomberg name) ship with the export
+    lookup_path = workspace.path(DEFAULT_LOOKUP_FILENAME)
+    build_lookup_tables(db_handler, lookup_path, entity_map)
+    workspace.register(lookup_path, 'lookup_tables', save=True)
     if all_cusips:
-        # cusip_to_process = all_cusips[6]  # Taking one of the CUSIPs as an example
-        for cusip_to_process in all_cusips:
-            print(f"Processing data for CUSIP: {cusip_to_process}")
-            input_jsonld=db_handler.export_cusip_data_to_jsonld(cusip_to_process)  # Export to JSON-LD
-            # input_jsonld = f"/Users/jacpltr_vertex_nodes_output_fikyfox/PycharmProjects/TWGglobal_fc/CMBS_Database/cmbs_graph_{cusip_to_process}.jsonld"
-            # if input_jsonld != None:
-            #     output_cypher = f"/Users/jackyfox/PycharmProjects/TWGglobal_fc/CMBS_Database/cmbs_graph_{cusip_to_process}.cypher"
-            #     convert_jsonld_file_to_cypher(input_jsonld, output_cypher)
+        # Tranches of the same deal share one deal subgraph, built once per deal
+        db_handler.export_holdings(all_cusips, deal_memo=DealMemo(), geocoder=geocoder, entity_map=entity_map,
+                                   archive=archive)
     else:
-        print("No CUSIPs found to process.")
-        
-   
-    
+        logger.info("No CUSIPs found to process.")
+    geocoder.close()
+
     # Process the files
-    print("\nCombining CSV files and exporting to Excel...")
-    combined_file = combine_csv_files()
+    logger.info("Combining CSV files and exporting to Excel...")
+    with METRICS.span('combine_csv_files'):
+        combined_file = archive.combine_csv(workspace.path("combined_cmbs_pltr_nodes.csv"))
+    archive.close()
     if combined_file:
-        convert_to_excel(combined_file)
-    
-    # Clean up the current directory
-    print("\nCleaning up generated files...")
-    clean_directory(os.path.dirname(default_db_path))
-    print("Cleanup complete.")
+        workspace.register(combined_file, 'combined_csv')
+        with METRICS.span('convert_to_excel'):
+            convert_to_excel(combined_file)
+        workspace.register(combined_file.replace('.csv', '.xlsx'), 'excel')
+    # Export run metrics in Prometheus text format
+    metrics_path = workspace.register(METRICS.write_prometheus(workspace.path('pipeline_metrics.prom')), 'metrics')
+    logger.info(f"Pipeline metrics written to {metrics_path}")
+    workspace.save(status='complete')
+
+    # Clean up the run's intermediate artifacts
+    logger.info("Cleaning up generated files...")
+    clean_directory(workspace.dir)
+    logger.info(f"Cleanup complete; deliverables are in {workspace.dir}")
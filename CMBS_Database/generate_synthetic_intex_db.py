@@ -0,0 +1,131 @@
+import os
+import random
+import sqlite3
+
+# Vocabulary for synthetic Intex-shaped rows
+PROPERTY_TYPES = ['Office', 'Retail', 'Multifamily', 'Lodging', 'Industrial', 'Mixed Use',
+                  'Self Storage', 'Manufactured Housing', 'Healthcare', 'Other']
+MSAS = [('Dallas-Fort Worth-Arlington, TX', 'TX', 'Dallas'), ('Austin-Round Rock, TX', 'TX', 'Austin'),
+        ('New York-Newark-Jersey City, NY-NJ-PA', 'NY', 'New York'), ('Chicago-Naperville-Elgin, IL-IN-WI', 'IL', 'Chicago'),
+        ('Los Angeles-Long Beach-Anaheim, CA', 'CA', 'Los Angeles'), ('San Francisco-Oakland-Berkeley, CA', 'CA', 'San Francisco'),
+        ('Las Vegas-Henderson-Paradise, NV', 'NV', 'Las Vegas'), ('Atlanta-Sandy Springs-Alpharetta, GA', 'GA', 'Atlanta'),
+        ('Miami-Fort Lauderdale-Pompano Beach, FL', 'FL', 'Miami'), ('Seattle-Tacoma-Bellevue, WA', 'WA', 'Seattle')]
+STREETS = ['Main Street', 'Forest Lane', 'Congress Avenue', 'Market Street', 'Balcones Club Drive',
+           'Wacker Drive', 'Peachtree Road', 'Ocean Boulevard', 'Commerce Parkway', 'Industrial Way']
+OWNER_TYPES = ['LLC', 'LP', 'REIT', 'Corporation', 'Trust']
+SHELVES = ['BANK', 'BMARK', 'CGCMT', 'COMM', 'CSAIL', 'GSMS', 'JPMBB', 'MSC', 'WFCM', 'BACM']
+
+SCHEMA = """
+CREATE TABLE deals (deal_id INTEGER, deal_name TEXT, bloomberg_name TEXT, issue_date TEXT, deal_balance REAL);
+CREATE TABLE deal_tranche (deal_id INTEGER, tr_cusip TEXT, tr_name TEXT, tr_rating TEXT, tr_balance REAL);
+CREATE TABLE account_holding (account TEXT, cusip TEXT, ult_issuer_name TEXT, par_amount REAL, market_value REAL);
+CREATE TABLE propinfo (deal_id INTEGER, prop_id INTEGER, loan_id INTEGER, prop_name TEXT, address TEXT, state TEXT,
+                       msa_name TEXT, year_built INTEGER, trustee_prop_type_full TEXT, owner_name TEXT, owner_type TEXT,
+                       sq_ft REAL, units INTEGER);
+CREATE TABLE collateral (deal_id INTEGER, loan_id INTEGER, loan_name TEXT, orig_balance REAL, curr_balance REAL,
+                         coupon REAL, maturity_date TEXT, dscr REAL, ltv REAL, status TEXT);
+"""
+
+_BATCH_SIZE = 10000
+
+
+def _cusip(rng: random.Random) -> str:
+    """Random 9-character CUSIP-shaped identifier."""
+    alphabet = '0123456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+    return ''.join(rng.choice(alphabet) for _ in range(9))
+
+
+def generate_synthetic_intex_db(output_path: str, num_properties: int = 1000, properties_per_deal: int = 40,
+                                tranches_per_deal: int = 10, holdings_ratio: float = 0.3, seed: int = 42) -> dict:
+    """
+    Write a synthetic Intex-shaped SQLite database.
+
+    Like the vendor snapshot, the tables are created without indexes.
+
+    Args:
+        output_path (str): Path of the SQLite file to create (overwritten if it exists)
+        num_properties (int): Number of propinfo rows (1k-1M)
+        properties_per_deal (int): Average number of properties per deal
+        tranches_per_deal (int): Number of deal_tranche rows per deal
+        holdings_ratio (float): Fraction of tranches that appear in account_holding
+        seed (int): Random seed, so the same arguments produce the same database
+    Returns:
+        dict: Row counts per table
+    """
+    rng = random.Random(seed)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    num_deals = max(1, num_properties // properties_per_deal)
+    counts = {'deals': 0, 'deal_tranche': 0, 'account_holding': 0, 'propinfo': 0, 'collateral': 0}
+
+    conn = sqlite3.connect(output_path)
+    try:
+        conn.executescript(SCHEMA)
+        deals, tranches, holdings = [], [], []
+        for deal_id in range(1, num_deals + 1):
+            year = rng.randint(2012, 2024)
+            name = f"{rng.choice(SHELVES)} {year}-C{rng.randint(1, 40)}"
+            deals.append((deal_id, name.replace(' ', '_'), name, f"{year}-0{rng.randint(1, 9)}-15",
+                          round(rng.uniform(5e8, 1.5e9), 2)))
+            for t in range(tranches_per_deal):
+                cusip = _cusip(rng)
+                tranches.append((deal_id, cusip, f"A-{t + 1}", rng.choice(['AAA', 'AA-', 'A-', 'BBB-', 'BB', 'NR']),
+                                 round(rng.uniform(1e7, 3e8), 2)))
+                if rng.random() < holdings_ratio:
+                    par = round(rng.uniform(1e6, 5e7), 2)
+                    holdings.append((f"ACCT{rng.randint(1, 20):03d}", cusip, f"{name} Mortgage Trust", par,
+                                     round(par * rng.uniform(0.7, 1.02), 2)))
+        conn.executemany("INSERT INTO deals VALUES (?, ?, ?, ?, ?)", deals)
+        conn.executemany("INSERT INTO deal_tranche VALUES (?, ?, ?, ?, ?)", tranches)
+        conn.executemany("INSERT INTO account_holding VALUES (?, ?, ?, ?, ?)", holdings)
+        counts.update(deals=len(deals), deal_tranche=len(tranches), account_holding=len(holdings))
+
+        props, loans = [], []
+        loan_id = 0
+        for prop_id in range(1, num_properties + 1):
+            deal_id = rng.randint(1, num_deals)
+            # Roughly one loan per 1.5 properties, so some loans are portfolios
+            if prop_id == 1 or rng.random() < 0.67:
+                loan_id += 1
+                balance = round(rng.uniform(2e6, 1.5e8), 2)
+                loans.append((deal_id, loan_id, f"Loan {loan_id}", balance, round(balance * rng.uniform(0.6, 1.0), 2),
+                              round(rng.uniform(0.03, 0.07), 5), f"{rng.randint(2025, 2035)}-0{rng.randint(1, 9)}-01",
+                              round(rng.uniform(0.8, 2.5), 2), round(rng.uniform(0.4, 0.8), 3),
+                              rng.choice(['Current', 'Current', 'Current', '30 Days', 'Special Servicing'])))
+            msa, state, city = rng.choice(MSAS)
+            street = f"{rng.randint(1, 9999)} {rng.choice(STREETS)}"
+            owner = f"{rng.choice(STREETS).split()[0]} {rng.choice(['Holdings', 'Partners', 'Owner', 'Realty'])} {rng.randint(1, num_deals)}"
+            props.append((deal_id, prop_id, loan_id, f"{street.split(' ', 1)[1]} {rng.choice(PROPERTY_TYPES)} {prop_id}",
+                          f"{street}, {city}", state, msa, rng.randint(1950, 2023), rng.choice(PROPERTY_TYPES),
+                          owner, rng.choice(OWNER_TYPES), round(rng.uniform(1e4, 1e6)), rng.randint(0, 800)))
+            if len(props) >= _BATCH_SIZE:
+                conn.executemany("INSERT INTO propinfo VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", props)
+                counts['propinfo'] += len(props)
+                props = []
+            if len(loans) >= _BATCH_SIZE:
+                conn.executemany("INSERT INTO collateral VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", loans)
+                counts['collateral'] += len(loans)
+                loans = []
+        conn.executemany("INSERT INTO propinfo VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", props)
+        conn.executemany("INSERT INTO collateral VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", loans)
+        counts['propinfo'] += len(props)
+        counts['collateral'] += len(loans)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Synthetic Intex database written to {output_path}: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic Intex-shaped SQLite database.')
+    parser.add_argument('output', help='Output SQLite file, e.g. ./CMBS_SYNTH_1K')
+    parser.add_argument('--properties', type=int, default=1000, help='Number of propinfo rows (1k-1M)')
+    parser.add_argument('--properties-per-deal', type=int, default=40)
+    parser.add_argument('--tranches-per-deal', type=int, default=10)
+    parser.add_argument('--holdings-ratio', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate_synthetic_intex_db(args.output, args.properties, args.properties_per_deal,
+                                args.tranches_per_deal, args.holdings_ratio, args.seed)
@@ -1,8 +1,259 @@
-import pandas as pd
-import geopandas as gpd
+import csv
+import logging
+import os
+import re
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
 
-# Perform geocoding
-gdf = gpd.tools.geocode("Champ de Mars, 5 Avenue Anatole France, 75007 Paris, France")
+logger = logging.getLogger(__name__)
 
-# Print the coordinates
-gdf.geometry.iloc[0].x, gdf.geometry.iloc[0].y
\ No newline at end of file
+# Default locations for the offline gazetteer and the persistent geocode cache
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer_sample.csv')
+DEFAULT_CACHE_FILENAME = 'geocode_cache.sqlite'
+# Address/Property node id of every property without an address; shared, so it identifies no single property
+UNKNOWN_ADDRESS = 'UnknownAddress'
+
+# USPS-style abbreviations so "Forest Lane" and "Forest Ln." share one key
+_STREET_ABBREVIATIONS = {
+    'STREET': 'ST', 'AVENUE': 'AVE', 'ROAD': 'RD', 'DRIVE': 'DR', 'LANE': 'LN',
+    'BOULEVARD': 'BLVD', 'PARKWAY': 'PKWY', 'HIGHWAY': 'HWY', 'COURT': 'CT',
+    'PLACE': 'PL', 'SQUARE': 'SQ', 'TERRACE': 'TER', 'CIRCLE': 'CIR', 'TRAIL': 'TRL',
+    'FREEWAY': 'FWY', 'EXPRESSWAY': 'EXPY', 'SUITE': 'STE',
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+}
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """
+    Build the normalized lookup key for an address string.
+    Upper-cases, drops punctuation, collapses whitespace and abbreviates street suffixes/directionals.
+    Args:
+        address (Optional[str]): Free-form address, e.g. "9600 Forest Lane, Dallas, TX"
+    Returns:
+        str: Normalized key, e.g. "9600 FOREST LN DALLAS TX"
+    """
+    if not address:
+        return ""
+    tokens = re.sub(r"[^A-Z0-9 ]", " ", str(address).upper()).split()
+    return " ".join(_STREET_ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def format_property_address(address: Optional[str], state: Optional[str]) -> str:
+    """Compose the address string used as Address/Property node id from propinfo fields."""
+    if address and state:
+        return f"{address}, {state}"
+    return address if address else UNKNOWN_ADDRESS
+
+
+def gazetteer_version(gazetteer_path: str) -> str:
+    """Cheap identity of a gazetteer file (size and modification time); cached misses are only valid for it."""
+    stat = os.stat(gazetteer_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class GazetteerIndex:
+    """
+    In-memory normalized-key index over a local gazetteer CSV file.
+
+    Accepts either the simple layout (address, state, latitude, longitude) or an
+    OpenAddresses extract (NUMBER, STREET, CITY, REGION, LAT, LON).
+    """
+
+    def __init__(self, gazetteer_path: str = DEFAULT_GAZETTEER_PATH):
+        """
+        Load the gazetteer and build the normalized-key index.
+        Args:
+            gazetteer_path (str): Path to the gazetteer CSV file
+        """
+        if not os.path.exists(gazetteer_path):
+            raise FileNotFoundError(f"Gazetteer file not found at: {gazetteer_path}")
+        self.gazetteer_path = gazetteer_path
+        self.index: Dict[str, Tuple[float, float]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        with open(self.gazetteer_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            columns = {name.lower(): name for name in reader.fieldnames or []}
+            for row in reader:
+                if 'address' in columns:
+                    address = format_property_address(row[columns['address']], row.get(columns.get('state', ''), ''))
+                    lat, lon = row[columns['latitude']], row[columns['longitude']]
+                else:
+                    street = f"{row[columns['number']]} {row[columns['street']]}"
+                    address = f"{street}, {row[columns['city']]}, {row[columns['region']]}"
+                    lat, lon = row[columns['lat']], row[columns['lon']]
+                try:
+                    self.index.setdefault(normalize_address(address), (float(lat), float(lon)))
+                except (TypeError, ValueError):
+                    continue
+
+    def lookup(self, address: str) -> Optional[Tuple[float, float]]:
+        """Return (latitude, longitude) for an address, or None if not in the gazetteer."""
+        return self.index.get(normalize_address(address))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class GeocodeCache:
+    """
+    Persistent on-disk cache of geocoding results, keyed by normalized address.
+    Misses are cached too (with NULL coordinates), tagged with the gazetteer version they were looked up in,
+    so an address is only attempted once per gazetteer and retried after the gazetteer changes.
+    """
+
+    def __init__(self, cache_path: str):
+        """
+        Open (or create) the cache database.
+        Args:
+            cache_path (str): Path to the SQLite cache file
+        """
+        self.cache_path = cache_path
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode_cache ("
+            "address_key TEXT PRIMARY KEY, address TEXT, latitude REAL, longitude REAL, source TEXT, "
+            "gazetteer_version TEXT)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(geocode_cache)")}
+        if 'gazetteer_version' not in columns:
+            # Caches written before misses were versioned; their misses get retried once
+            self.conn.execute("ALTER TABLE geocode_cache ADD COLUMN gazetteer_version TEXT")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, address: str) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """Return the cached (latitude, longitude) for an address; (None, None) for a cached miss, None if unseen."""
+        row = self.conn.execute(
+            "SELECT latitude, longitude FROM geocode_cache WHERE address_key = ?",
+            (normalize_address(address),)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def known_keys(self, gazetteer_version: Optional[str] = None) -> set:
+        """Keys that need no lookup: resolved addresses, and misses recorded against gazetteer_version."""
+        return {row[0] for row in self.conn.execute(
+            "SELECT address_key FROM geocode_cache WHERE latitude IS NOT NULL OR gazetteer_version IS ?",
+            (gazetteer_version,))}
+
+    def put_many(self, rows: Iterable[Tuple[str, str, Optional[float], Optional[float], str, Optional[str]]]) -> None:
+        """
+        Insert or replace (address_key, address, latitude, longitude, source, gazetteer_version) rows
+        in one transaction.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocode_cache "
+                "(address_key, address, latitude, longitude, source, gazetteer_version) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def all_locations(self) -> Dict[str, Tuple[float, float]]:
+        """Return {address: (latitude, longitude)} for every successfully geocoded address."""
+        result = self.conn.execute(
+            "SELECT address, latitude, longitude FROM geocode_cache WHERE latitude IS NOT NULL"
+        )
+        return {address: (lat, lon) for address, lat, lon in result}
+
+
+class BatchGeocoder:
+    """
+    Offline batch geocoder: resolves addresses against a local gazetteer and
+    remembers the result in a persistent cache so each address is geocoded only once.
+    """
+
+    def __init__(self, cache_path: str, gazetteer_path: str = DEFAULT_GAZETTEER_PATH):
+        """
+        Args:
+            cache_path (str): Path to the SQLite geocode cache
+            gazetteer_path (str): Path to the gazetteer CSV; only loaded when there are uncached addresses
+        """
+        self.cache = GeocodeCache(cache_path)
+        self.gazetteer_path = gazetteer_path
+        self._gazetteer: Optional[GazetteerIndex] = None
+
+    @property
+    def gazetteer(self) -> GazetteerIndex:
+        if self._gazetteer is None:
+            self._gazetteer = GazetteerIndex(self.gazetteer_path)
+        return self._gazetteer
+
+    def close(self) -> None:
+        self.cache.close()
+
+    def geocode_batch(self, addresses: Iterable[str]) -> Dict[str, int]:
+        """
+        Geocode every address not already in the cache.
+        Args:
+            addresses (Iterable[str]): Addresses to geocode (duplicates are ignored)
+        Returns:
+            Dict[str, int]: Counts of distinct addresses served from the cache ('cached'), and of new ones
+                            'resolved' and 'missed'
+        """
+        version = gazetteer_version(self.gazetteer_path)
+        known = self.cache.known_keys(version)
+        pending, hits = {}, set()
+        for address in addresses:
+            key = normalize_address(address)
+            if not key:
+                continue
+            if key in known:
+                hits.add(key)
+            else:
+                pending.setdefault(key, address)
+        rows = []
+        resolved = 0
+        for key, address in pending.items():
+            location = self.gazetteer.index.get(key)
+            if location:
+                resolved += 1
+                rows.append((key, address, location[0], location[1], 'gazetteer', version))
+            else:
+                rows.append((key, address, None, None, 'miss', version))
+        self.cache.put_many(rows)
+        stats = {'cached': len(hits), 'resolved': resolved, 'missed': len(pending) - resolved}
+        logger.info(f"Geocoded {len(pending)} new addresses: {stats}")
+        return stats
+
+    def lookup(self, address: str) -> Optional[Tuple[float, float]]:
+        """Return the cached (latitude, longitude) for an address, or None if unknown or unresolved."""
+        location = self.cache.get(address)
+        if location and location[0] is not None:
+            return location
+        return None
+
+
+def geocode_propinfo_addresses(db_handler, cache_path: Optional[str] = None,
+                               gazetteer_path: str = DEFAULT_GAZETTEER_PATH) -> BatchGeocoder:
+    """
+    Batch geocoding stage: resolve all distinct propinfo addresses of a snapshot.
+    Args:
+        db_handler (CMBSDatabaseHandler): Handler for the Intex snapshot
+        cache_path (Optional[str]): Cache location; defaults to geocode_cache.sqlite next to the database
+        gazetteer_path (str): Path to the gazetteer CSV
+    Returns:
+        BatchGeocoder: Geocoder with a populated cache, ready to pass to export_cusip_data_to_jsonld
+    """
+    if cache_path is None:
+        cache_path = os.path.join(os.path.dirname(db_handler.db_path), DEFAULT_CACHE_FILENAME)
+    geocoder = BatchGeocoder(cache_path, gazetteer_path)
+    geocoder.geocode_batch(db_handler.get_distinct_property_addresses())
+    return geocoder
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Geocode all propinfo addresses of an Intex snapshot offline.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--gazetteer', default=DEFAULT_GAZETTEER_PATH, help='Gazetteer CSV file')
+    parser.add_argument('--cache', default=None, help='Geocode cache file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    geocoder = geocode_propinfo_addresses(CMBSDatabaseHandler(args.db_path), args.cache, args.gazetteer)
+    geocoder.close()
@@ -0,0 +1,192 @@
+import json
+import logging
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Reference keys always rendered as JSON-LD lists, even with a single target
+LIST_REFERENCE_KEYS = frozenset({'hasProperty', 'hasAlias'})
+# Literal properties collected over every mention of a node instead of overwritten, so the merged value does not
+# depend on the order the mentions were added in (an owner reported with different owner types on its properties).
+# Null values are skipped; a node without any value renders without the property.
+SET_VALUED_PROPERTIES = frozenset({'ownerType'})
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _value_set(*values) -> tuple:
+    """Sorted distinct non-null values of a SET_VALUED_PROPERTIES property (tuples are earlier merged sets)."""
+    collected = set()
+    for value in values:
+        for item in value if type(value) is tuple else (value,):
+            if item is not None and item == item:
+                collected.add(_intern(str(item)))
+    return tuple(sorted(collected))
+
+
+class NodeRecord:
+    """
+    One graph node: label, id, literal properties and outgoing references. A reference key maps to its single
+    target id, or to an insertion-ordered dict of target ids once it has several.
+    """
+    __slots__ = ('label', 'id', 'props', 'refs')
+
+    def __init__(self, label: str, node_id: str):
+        self.label = label
+        self.id = node_id
+        self.props: Optional[Dict[str, Any]] = None
+        self.refs: Optional[Dict[str, Union[str, Dict[str, None]]]] = None
+
+
+class GraphBuilder:
+    """
+    Deduplicating graph under construction. Each (label, id) exists once, ids, keys and string values are
+    interned, and nodes seen again (the same YearBuilt, MSA or property type for thousands of properties)
+    only merge their properties and references into the existing record. Sinks render from the records:
+    JSON-LD items (iter_jsonld), nodes/edges (flatten) and Cypher (to_cypher).
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, NodeRecord]] = {}
+        self._merged_keys = set()
+
+    def node(self, label: str, node_id, **props) -> NodeRecord:
+        """
+        Get or create the node (label, node_id); later property values overwrite earlier ones, except for
+        SET_VALUED_PROPERTIES, which collect every value.
+        """
+        label, node_id = sys.intern(label), _intern(str(node_id))
+        table = self.tables.get(label)
+        if table is None:
+            table = self.tables[label] = {}
+        record = table.get(node_id)
+        if record is None:
+            record = table[node_id] = NodeRecord(label, node_id)
+        if props:
+            if record.props is None:
+                record.props = {}
+            for key, value in props.items():
+                if key in SET_VALUED_PROPERTIES:
+                    record.props[key] = _value_set(record.props.get(key), value)
+                else:
+                    record.props[sys.intern(key)] = _intern(value)
+        return record
+
+    def ref(self, record: NodeRecord, key: str, target_id) -> None:
+        """Add a reference from record to target_id under key (duplicates are ignored)."""
+        target_id = _intern(str(target_id))
+        if record.refs is None:
+            record.refs = {}
+        targets = record.refs.get(key)
+        if targets is None:
+            record.refs[sys.intern(key)] = target_id
+        elif type(targets) is dict:
+            targets[target_id] = None
+        elif targets != target_id:
+            record.refs[key] = {targets: None, target_id: None}
+
+    def merge(self, other: 'GraphBuilder', key=None) -> None:
+        """
+        Merge every node of another builder into this one. With a key, a graph already merged under that key
+        (e.g. a deal subgraph shared by several CUSIPs) is skipped.
+        """
+        if key is not None:
+            if key in self._merged_keys:
+                return
+            self._merged_keys.add(key)
+        for record in other.iter_nodes():
+            target = self.node(record.label, record.id, **(record.props or {}))
+            for key, targets in (record.refs or {}).items():
+                for target_id in (targets if type(targets) is dict else (targets,)):
+                    self.ref(target, key, target_id)
+
+    def iter_nodes(self) -> Iterator[NodeRecord]:
+        for table in self.tables.values():
+            yield from table.values()
+
+    def node_count(self) -> int:
+        return sum(len(table) for table in self.tables.values())
+
+    def edge_count(self) -> int:
+        return sum(len(targets) if type(targets) is dict else 1
+                   for record in self.iter_nodes() for targets in (record.refs or {}).values())
+
+    def label_counts(self) -> Dict[str, int]:
+        return {label: len(table) for label, table in self.tables.items()}
+
+    def iter_jsonld(self) -> Iterator[Dict[str, Any]]:
+        """Render each node as a JSON-LD @graph item."""
+        for record in self.iter_nodes():
+            item = {"@type": record.label, "@id": record.id}
+            if record.props:
+                item.update(record.props)
+                for key in SET_VALUED_PROPERTIES.intersection(record.props):
+                    if record.props[key]:
+                        item[key] = '; '.join(record.props[key])
+                    else:
+                        del item[key]
+            for key, targets in (record.refs or {}).items():
+                if type(targets) is dict:
+                    item[key] = [{"@id": target_id} for target_id in targets]
+                elif key in LIST_REFERENCE_KEYS:
+                    item[key] = [{"@id": targets}]
+                else:
+                    item[key] = {"@id": targets}
+            yield item
+
+    def jsonld_graph(self) -> List[Dict[str, Any]]:
+        return list(self.iter_jsonld())
+
+    def write_jsonld(self, output_path: str, context: Optional[Dict[str, str]] = None) -> str:
+        """Stream the graph to a JSON-LD file without materializing the whole document."""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write('{"@context": ' + json.dumps(context or {}, ensure_ascii=False) + ', "@graph": [')
+            for n, item in enumerate(self.iter_jsonld()):
+                f.write(',\n' if n else '\n')
+                json.dump(item, f, ensure_ascii=False)
+            f.write('\n]}\n')
+        logger.info(f"Wrote {self.node_count()} nodes to {output_path}")
+        return output_path
+
+    def flatten(self) -> Tuple[Dict[Tuple[str, str], Dict[str, Any]], set]:
+        """Nodes and edges in the form of versioned_graph.flatten_jsonld."""
+        from versioned_graph import flatten_jsonld
+        return flatten_jsonld(self.iter_jsonld())
+
+    def to_cypher(self) -> List[str]:
+        """MERGE/CREATE statements in the form of jsonld_to_cypher."""
+        from jsonld_to_cypher import jsonld_to_cypher
+        return jsonld_to_cypher({'@graph': self.iter_jsonld()})
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import tracemalloc
+    parser = argparse.ArgumentParser(description='Compare the memory of a full-book graph as JSON-LD dicts '
+                                                 'and as an interned GraphBuilder.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--limit', type=int, default=None, help='Only export the first N CUSIPs')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    # The exporter checks for graph_builder.GraphBuilder, not this script's __main__ copy of the class
+    from graph_builder import GraphBuilder
+    handler = CMBSDatabaseHandler(args.db_path)
+    cusips = handler.get_all_holdings_cusip()[:args.limit]
+    for name, make in (('jsonld_dicts', list), ('graph_builder', GraphBuilder)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        collector = make()
+        for cusip in cusips:
+            handler.export_cusip_data_to_jsonld(cusip, write_csv=False, graph_collector=collector)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        nodes = len(collector) if isinstance(collector, list) else collector.node_count()
+        print(f"{name}: {nodes} nodes, {current / 2 ** 20:.1f} MiB held, {peak / 2 ** 20:.1f} MiB peak, "
+              f"{time.perf_counter() - start:.1f}s")
+        del collector
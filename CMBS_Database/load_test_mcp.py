@@ -0,0 +1,513 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from neo4j import Record
+from neo4j.exceptions import ClientError
+
+import neo4j_handler
+from neo4j_handler import DealLister
+
+logger = logging.getLogger(__name__)
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(MODULE_DIR, 'neo4j_cmbs_mcp_server.py')
+# Tool -> the lookup key it takes; deal-id tools draw from deal ids, address tools from property addresses
+TOOL_KEYS = {
+    'get_bloomberg_name_by_deal_id': 'deal_id',
+    'get_deal_card': 'deal_id',
+    'list_properties_by_deal_id': 'deal_id',
+    'search_deal_id_by_address': 'address',
+    'search_deal_by_address': 'address',
+}
+SCENARIO_DEFAULTS = {
+    'concurrency': 8,            # concurrent callers (threads in-process, in-flight requests over stdio)
+    'requests': None,            # total calls; when None the scenario runs for duration_s
+    'duration_s': 10.0,
+    'mix': {'get_bloomberg_name_by_deal_id': 0.4, 'search_deal_id_by_address': 0.4, 'get_deal_card': 0.2},
+    'skew': 1.0,                 # Zipf exponent of key popularity (0 = uniform)
+    'miss_rate': 0.0,            # fraction of lookups for ids/addresses that do not exist
+    'think_ms': 0.0,             # pause between a caller's requests
+    'pool_size': 100,            # driver max_connection_pool_size
+    'acquisition_timeout': 10.0,  # seconds to wait for a pooled connection
+    'stub_latency_ms': 2.0,      # simulated query time of the stub backend
+}
+DEFAULT_SCENARIOS = {
+    'smoke': {'concurrency': 2, 'requests': 200},
+    'lookup_mix': {'concurrency': 16, 'duration_s': 30.0, 'skew': 1.1, 'miss_rate': 0.05,
+                   'mix': {'get_bloomberg_name_by_deal_id': 0.45, 'search_deal_id_by_address': 0.35,
+                           'get_deal_card': 0.1, 'list_properties_by_deal_id': 0.1}},
+    'address_heavy': {'concurrency': 16, 'duration_s': 30.0, 'skew': 0.8, 'miss_rate': 0.1,
+                      'mix': {'search_deal_id_by_address': 0.7, 'search_deal_by_address': 0.3}},
+    'pool_pressure': {'concurrency': 64, 'duration_s': 30.0, 'pool_size': 8, 'acquisition_timeout': 0.5,
+                      'stub_latency_ms': 20.0},
+}
+SAMPLE_KEYS_QUERY = (
+    "MATCH (d:Deal)-[:HASPROPERTY]->(:Property)-[:LOCATEDAT]->(a:Address) "
+    "RETURN d.id AS deal_id, a.id AS address LIMIT $limit"
+)
+
+
+class StubGraph:
+    """
+    In-memory stand-in for the CMBS graph, shaped like the export (Deal id = str(deal_id), Property id = address),
+    answering the DealLister tool queries from dict indexes.
+    """
+
+    def __init__(self, deals: Dict[str, Dict[str, Any]]):
+        self.deals = deals
+        self.deals_by_address: Dict[str, List[str]] = defaultdict(list)
+        for deal_id, deal in deals.items():
+            for prop in deal['properties']:
+                if deal_id not in self.deals_by_address[prop['address']]:
+                    self.deals_by_address[prop['address']].append(deal_id)
+        self.handlers = {
+            neo4j_handler.BLOOMBERG_NAME_BY_DEAL_ID_QUERY: self._bloomberg_name,
+            neo4j_handler.DEAL_IDS_BY_ADDRESS_QUERY: self._deal_ids_by_address,
+            neo4j_handler.DEALS_BY_ADDRESS_QUERY: self._deals_by_address,
+            neo4j_handler.PROPERTIES_BY_DEAL_ID_QUERY: self._properties_by_deal_id,
+            neo4j_handler.DEAL_CARD_QUERY: self._deal_card,
+            SAMPLE_KEYS_QUERY: self._sample_keys,
+        }
+
+    @classmethod
+    def from_intex_db(cls, db_path: str) -> 'StubGraph':
+        """Build the stand-in from an Intex SQLite snapshot (real or from generate_synthetic_intex_db)."""
+        conn = sqlite3.connect(db_path)
+        try:
+            names = dict(conn.execute("SELECT deal_id, bloomberg_name FROM deals"))
+            deals: Dict[str, Dict[str, Any]] = {}
+            rows = conn.execute("SELECT deal_id, prop_name, address, msa_name, trustee_prop_type_full, owner_name, "
+                                "year_built FROM propinfo WHERE address IS NOT NULL ORDER BY deal_id, address")
+            for deal_id, name, address, msa, prop_type, owner, year_built in rows:
+                deal = deals.setdefault(str(deal_id), {'bloomberg': names.get(deal_id), 'cusip': None,
+                                                       'properties': []})
+                deal['properties'].append({'id': address, 'name': name, 'address': address, 'owner': owner,
+                                           'msa': msa, 'property_type': prop_type,
+                                           'year_built': None if year_built is None else str(year_built)})
+        finally:
+            conn.close()
+        logger.info(f"Stub graph: {len(deals)} deals from {db_path}")
+        return cls(deals)
+
+    def run(self, query: str, params: Dict[str, Any]) -> List[Record]:
+        handler = self.handlers.get(query)
+        if handler is None:
+            raise ClientError(f"Query not supported by the stub graph: {query[:60]}")
+        return handler(**params)
+
+    def _bloomberg_name(self, deal_id):
+        deal = self.deals.get(deal_id)
+        return [Record({'bloomberg': deal['bloomberg']})] if deal else []
+
+    def _deal_ids_by_address(self, address):
+        return [Record({'deal_id': deal_id}) for deal_id in self.deals_by_address.get(address, ())]
+
+    def _deals_by_address(self, address):
+        return [Record({'id': deal_id, 'bloomberg': self.deals[deal_id]['bloomberg'],
+                        'cusip': self.deals[deal_id]['cusip'], 'property_ids': [address]})
+                for deal_id in self.deals_by_address.get(address, ())]
+
+    def _properties_by_deal_id(self, deal_id):
+        deal = self.deals.get(deal_id, {'properties': ()})
+        return [Record({'id': p['id'], 'name': p['name'], 'address': p['address']}) for p in deal['properties']]
+
+    def _deal_card(self, deal_id, max_properties, max_groups):
+        deal = self.deals.get(deal_id)
+        if deal is None:
+            return []
+
+        def groups(field):
+            counts = Counter(p[field] for p in deal['properties'] if p[field] is not None)
+            ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:max_groups]
+            return [{'value': value, 'properties': n} for value, n in ranked]
+
+        return [Record({'deal_id': deal_id, 'bloomberg': deal['bloomberg'], 'cusip': deal['cusip'],
+                        'property_count': len(deal['properties']), 'msas': groups('msa'),
+                        'property_types': groups('property_type'), 'owners': groups('owner'),
+                        'properties': [dict(p) for p in deal['properties'][:max_properties]]})]
+
+    def _sample_keys(self, limit):
+        pairs = ((deal_id, p['address']) for deal_id, deal in self.deals.items() for p in deal['properties'])
+        return [Record({'deal_id': deal_id, 'address': address}) for deal_id, address in itertools.islice(pairs, limit)]
+
+
+class _StubSession:
+    def __init__(self, driver: 'StubDriver'):
+        self.driver = driver
+        self._connected = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, query, parameters=None, **kwargs):
+        # Like the driver, a connection is taken from the pool on first use and held until the session closes
+        if not self._connected:
+            if not self.driver.pool.acquire(timeout=self.driver.acquisition_timeout):
+                raise ClientError(f"Failed to obtain a connection from the pool within "
+                                  f"{self.driver.acquisition_timeout}s")
+            self._connected = True
+        if self.driver.latency:
+            time.sleep(self.driver.latency)
+        return self.driver.graph.run(query, {**(parameters or {}), **kwargs})
+
+    def close(self):
+        if self._connected:
+            self.driver.pool.release()
+            self._connected = False
+
+
+class StubDriver:
+    """Driver stand-in with a bounded connection pool and a fixed per-query latency."""
+
+    def __init__(self, graph: StubGraph, latency_ms: float = 2.0, pool_size: int = 100,
+                 acquisition_timeout: float = 10.0):
+        self.graph = graph
+        self.latency = latency_ms / 1000.0
+        self.pool = threading.BoundedSemaphore(pool_size)
+        self.acquisition_timeout = acquisition_timeout
+
+    def session(self, **kwargs):
+        return _StubSession(self)
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        return None
+
+
+class StubDealLister(DealLister):
+    """DealLister over a StubDriver, so tool calls run the real lister code without a Neo4j server."""
+
+    def __init__(self, graph: StubGraph, latency_ms: float = 2.0, pool_size: int = 100,
+                 acquisition_timeout: float = 10.0):
+        super().__init__(None, None, None, 'stub',
+                         driver=StubDriver(graph, latency_ms, pool_size, acquisition_timeout))
+
+
+def make_scenario(name: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A scenario from SCENARIO_DEFAULTS, the named built-in scenario (if any) and overrides."""
+    scenario = {**SCENARIO_DEFAULTS, **DEFAULT_SCENARIOS.get(name, {}), **(overrides or {}), 'name': name}
+    unknown = set(scenario['mix']) - set(TOOL_KEYS)
+    if unknown:
+        raise ValueError(f"Scenario '{name}' uses unsupported tools: {sorted(unknown)}")
+    return scenario
+
+
+def load_scenarios(path: str) -> List[Dict[str, Any]]:
+    """Scenarios from a JSON file: {"name": {settings...}, ...}; unset settings come from SCENARIO_DEFAULTS."""
+    with open(path, encoding='utf-8') as f:
+        return [make_scenario(name, settings) for name, settings in json.load(f).items()]
+
+
+class Workload:
+    """
+    Draws tool calls for a scenario: the tool by the scenario mix, the key by a Zipf-like popularity over the
+    sampled deal ids and addresses (a few hot deals, a long tail), and a miss_rate share of unknown keys.
+    """
+
+    def __init__(self, deal_ids: List[str], addresses: List[str], scenario: Dict[str, Any]):
+        if not deal_ids or not addresses:
+            raise ValueError("The workload needs at least one deal id and one address")
+        self.tools = list(scenario['mix'])
+        self.tool_weights = list(itertools.accumulate(scenario['mix'][t] for t in self.tools))
+        self.keys = {'deal_id': deal_ids, 'address': addresses}
+        self.key_weights = {kind: list(itertools.accumulate(1.0 / (rank + 1) ** scenario['skew']
+                                                            for rank in range(len(keys))))
+                            for kind, keys in self.keys.items()}
+        self.miss_rate = scenario['miss_rate']
+
+    def next_call(self, rng: random.Random) -> Tuple[str, Dict[str, str]]:
+        tool = rng.choices(self.tools, cum_weights=self.tool_weights)[0]
+        kind = TOOL_KEYS[tool]
+        if rng.random() < self.miss_rate:
+            key = f"missing-{rng.randrange(10 ** 9)}"
+        else:
+            key = rng.choices(self.keys[kind], cum_weights=self.key_weights[kind])[0]
+        return tool, {kind: key}
+
+
+def sample_keys(lister: DealLister, limit: int = 10000, seed: int = 42) -> Tuple[List[str], List[str]]:
+    """
+    Deal ids and addresses present in the graph, shuffled so popularity ranks are not tied to id order.
+    Returns:
+        Tuple[List[str], List[str]]: deal ids, addresses
+    """
+    with lister.driver.session(database=lister.database) as session:
+        records = list(session.run(SAMPLE_KEYS_QUERY, limit=limit))
+    deal_ids = sorted({r['deal_id'] for r in records})
+    addresses = sorted({r['address'] for r in records})
+    rng = random.Random(seed)
+    rng.shuffle(deal_ids)
+    rng.shuffle(addresses)
+    return deal_ids, addresses
+
+
+def _error_name(error: BaseException) -> str:
+    # FastMCP wraps tool exceptions in ToolError; the cause says what actually failed
+    return type(error.__cause__ or error).__name__
+
+
+def summarize(calls: List[Tuple[str, float, Optional[str]]], elapsed: float) -> Dict[str, Any]:
+    """
+    Throughput, latency percentiles (ms) and error rates, overall and per tool.
+    Args:
+        calls: (tool, latency in seconds, error name or None) per call
+        elapsed (float): Wall time of the scenario
+    """
+    def stats(subset):
+        latencies = np.array([latency for _, latency, _ in subset]) * 1000.0
+        errors = Counter(error for _, _, error in subset if error)
+        p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99]) if len(latencies) else (0.0,) * 4
+        return {
+            'requests': len(subset), 'throughput_rps': round(len(subset) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(float(p50), 2), 'p90_ms': round(float(p90), 2), 'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2), 'max_ms': round(float(latencies.max()), 2) if len(latencies) else 0.0,
+            'error_rate': round(sum(errors.values()) / len(subset), 4) if subset else 0.0, 'errors': dict(errors),
+        }
+
+    by_tool = defaultdict(list)
+    for call in calls:
+        by_tool[call[0]].append(call)
+    return {'elapsed_s': round(elapsed, 3), **stats(calls),
+            'tools': {tool: stats(subset) for tool, subset in sorted(by_tool.items())}}
+
+
+def run_in_process(server, workload: Workload, scenario: Dict[str, Any], seed: int = 42) -> Dict[str, Any]:
+    """
+    Call the FastMCP tools in this process from scenario['concurrency'] threads, each with its own event loop
+    (the tools are synchronous, so each call occupies its caller's thread).
+    """
+    total = scenario['requests']
+    deadline = None if total else time.perf_counter() + scenario['duration_s']
+    issued = itertools.count()
+    calls: List[Tuple[str, float, Optional[str]]] = []
+    think = scenario['think_ms'] / 1000.0
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        loop = asyncio.new_event_loop()
+        local = []
+        try:
+            while (next(issued) < total) if total else (time.perf_counter() < deadline):
+                tool, arguments = workload.next_call(rng)
+                start = time.perf_counter()
+                error = None
+                try:
+                    loop.run_until_complete(server.call_tool(tool, arguments))
+                except Exception as e:
+                    error = _error_name(e)
+                local.append((tool, time.perf_counter() - start, error))
+                if think:
+                    time.sleep(think)
+        finally:
+            loop.close()
+            calls.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), name=f'load-{n}') for n in range(scenario['concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(calls, time.perf_counter() - start)
+
+
+async def _run_stdio(command: List[str], env: Dict[str, str], workload: Workload, scenario: Dict[str, Any],
+                     seed: int) -> Dict[str, Any]:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=command[0], args=command[1:], cwd=MODULE_DIR, env=env)
+    total = scenario['requests']
+    think = scenario['think_ms'] / 1000.0
+    calls: List[Tuple[str, float, Optional[str]]] = []
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            issued = itertools.count()
+            deadline = None if total else time.perf_counter() + scenario['duration_s']
+
+            async def caller(n):
+                rng = random.Random(seed + n)
+                while (next(issued) < total) if total else (time.perf_counter() < deadline):
+                    tool, arguments = workload.next_call(rng)
+                    start = time.perf_counter()
+                    error = None
+                    try:
+                        result = await session.call_tool(tool, arguments)
+                        if result.isError:
+                            error = 'ToolError'
+                    except Exception as e:
+                        error = _error_name(e)
+                    calls.append((tool, time.perf_counter() - start, error))
+                    if think:
+                        await asyncio.sleep(think)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(caller(n) for n in range(scenario['concurrency'])))
+            elapsed = time.perf_counter() - start
+    return summarize(calls, elapsed)
+
+
+def run_stdio(command: List[str], workload: Workload, scenario: Dict[str, Any], env: Optional[Dict[str, str]] = None,
+              seed: int = 42) -> Dict[str, Any]:
+    """
+    Spawn the MCP server over stdio and keep scenario['concurrency'] requests in flight on its session, as
+    concurrent agents sharing one server process would.
+    """
+    return asyncio.run(_run_stdio(command, {**os.environ, **(env or {})}, workload, scenario, seed))
+
+
+def _stub_db_path(args) -> str:
+    if args.stub_db:
+        return args.stub_db
+    from generate_synthetic_intex_db import generate_synthetic_intex_db
+    path = os.path.join(tempfile.gettempdir(), f'cmbs_load_test_stub_{args.stub_properties}.sqlite')
+    if not os.path.exists(path):
+        generate_synthetic_intex_db(path, num_properties=args.stub_properties)
+    return path
+
+
+def make_lister(args, scenario: Dict[str, Any]) -> DealLister:
+    """The lister for a scenario: a stub over the snapshot, or a Neo4j driver with the scenario's pool settings."""
+    if args.backend == 'stub':
+        return StubDealLister(StubGraph.from_intex_db(_stub_db_path(args)), scenario['stub_latency_ms'],
+                              scenario['pool_size'], scenario['acquisition_timeout'])
+    import neo4j_cmbs_mcp_server as mcp_server
+    return DealLister(args.uri, args.user, args.password, args.database,
+                      connection_timeout=mcp_server.CONNECTION_TIMEOUT,
+                      connection_acquisition_timeout=scenario['acquisition_timeout'],
+                      max_connection_pool_size=scenario['pool_size'])
+
+
+def serve_stub(args) -> None:
+    """Run the MCP server over stdio with a stub backend (the child process of --transport stdio --backend stub)."""
+    import neo4j_cmbs_mcp_server as mcp_server
+    scenario = make_scenario('serve', {'stub_latency_ms': args.stub_latency_ms, 'pool_size': args.pool_size,
+                                       'acquisition_timeout': args.acquisition_timeout})
+    mcp_server._deal_lister = make_lister(args, scenario)
+    mcp_server.USE_LOOKUP_TABLES = False
+    mcp_server.server.run()
+
+
+def run_scenario(args, scenario: Dict[str, Any]) -> Dict[str, Any]:
+    lister = make_lister(args, scenario)
+    try:
+        deal_ids, addresses = sample_keys(lister, args.sample_keys, args.seed)
+    finally:
+        if args.transport == 'stdio':
+            lister.close()
+    workload = Workload(deal_ids, addresses, scenario)
+    if args.transport == 'stdio':
+        if args.backend == 'stub':
+            command = [sys.executable, os.path.abspath(__file__), '--serve-stub', '--stub-db', _stub_db_path(args),
+                       '--stub-latency-ms', str(scenario['stub_latency_ms']),
+                       '--pool-size', str(scenario['pool_size']),
+                       '--acquisition-timeout', str(scenario['acquisition_timeout'])]
+        else:
+            command = [sys.executable, SERVER_SCRIPT]
+        # The lookup tables would answer some tools without touching the backend under test
+        env = {'CMBS_NEO4J_POOL_SIZE': str(scenario['pool_size']),
+               'CMBS_NEO4J_ACQUIRE_TIMEOUT': str(scenario['acquisition_timeout']),
+               'CMBS_USE_LOOKUP_TABLES': '0'}
+        if args.backend == 'neo4j':
+            env.update({'CMBS_NEO4J_URI': args.uri, 'CMBS_NEO4J_USER': args.user,
+                        'CMBS_NEO4J_PASSWORD': args.password, 'CMBS_NEO4J_DATABASE': args.database})
+        return run_stdio(command, workload, scenario, env, args.seed)
+
+    import neo4j_cmbs_mcp_server as mcp_server
+    mcp_server._deal_lister, use_lookup_tables = lister, mcp_server.USE_LOOKUP_TABLES
+    # Every call goes to the backend under test, never to the lookup tables
+    mcp_server.USE_LOOKUP_TABLES = False
+    try:
+        return run_in_process(mcp_server.server, workload, scenario, args.seed)
+    finally:
+        mcp_server._deal_lister, mcp_server.USE_LOOKUP_TABLES = None, use_lookup_tables
+        lister.close()
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='Load-test the MCP server tools with concurrent deal-id and '
+                                                 'address lookups against Neo4j or an in-process stub graph.')
+    parser.add_argument('--scenario', action='append', default=None,
+                        help=f"Built-in scenario to run (repeatable; default smoke): {', '.join(DEFAULT_SCENARIOS)}")
+    parser.add_argument('--scenario-file', default=None, help='JSON file of named scenarios')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Override a scenario setting for every scenario, e.g. --set concurrency=32')
+    parser.add_argument('--backend', choices=('stub', 'neo4j'), default='stub')
+    parser.add_argument('--transport', choices=('inprocess', 'stdio'), default='inprocess',
+                        help='Call the tools in this process, or through a spawned server over stdio')
+    parser.add_argument('--stub-db', default=None, help='Intex SQLite snapshot for the stub (default: synthetic)')
+    parser.add_argument('--stub-properties', type=int, default=10000, help='Size of the synthetic stub snapshot')
+    parser.add_argument('--uri', default=neo4j_handler.NEO4J_URI)
+    parser.add_argument('--user', default=neo4j_handler.NEO4J_USER)
+    parser.add_argument('--password', default=neo4j_handler.NEO4J_PASSWORD)
+    parser.add_argument('--database', default='gi-cmbs')
+    parser.add_argument('--sample-keys', type=int, default=10000, help='Deal/address pairs sampled as lookup keys')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='load_test_results.json', help='Where to write the JSON results')
+    parser.add_argument('--serve-stub', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--stub-latency-ms', type=float, default=SCENARIO_DEFAULTS['stub_latency_ms'],
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--pool-size', type=int, default=SCENARIO_DEFAULTS['pool_size'], help=argparse.SUPPRESS)
+    parser.add_argument('--acquisition-timeout', type=float, default=SCENARIO_DEFAULTS['acquisition_timeout'],
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    # Tool calls log per lookup at INFO; keep the harness output readable
+    logging.basicConfig(level=os.environ.get('CMBS_LOG_LEVEL', 'WARNING'))
+
+    if args.serve_stub:
+        serve_stub(args)
+        return 0
+
+    overrides = {}
+    for setting in args.set:
+        key, _, value = setting.partition('=')
+        if key not in SCENARIO_DEFAULTS:
+            parser.error(f"Unknown scenario setting: {key}")
+        overrides[key] = json.loads(value)
+    scenarios = load_scenarios(args.scenario_file) if args.scenario_file else []
+    if args.scenario or not scenarios:
+        scenarios += [make_scenario(name) for name in args.scenario or ['smoke']]
+    scenarios = [{**scenario, **overrides} for scenario in scenarios]
+
+    results = {}
+    for scenario in scenarios:
+        summary = run_scenario(args, scenario)
+        results[scenario['name']] = {'scenario': scenario, **summary}
+        print(f"{scenario['name']}: {summary['requests']} requests in {summary['elapsed_s']}s, "
+              f"{summary['throughput_rps']} req/s, error rate {summary['error_rate']:.2%}")
+        print(f"  {'tool':<32} {'requests':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8} {'errors':>7}")
+        for tool, stats in [('all', summary)] + list(summary['tools'].items()):
+            print(f"  {tool:<32} {stats['requests']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                  f"{stats['p99_ms']:>8} {stats['max_ms']:>8} {stats['error_rate']:>7.2%}")
+            for error, count in stats['errors'].items() if tool == 'all' else ():
+                print(f"    {error}: {count}")
+
+    report = {'meta': {'backend': args.backend, 'transport': args.transport,
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}, 'scenarios': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Load test results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
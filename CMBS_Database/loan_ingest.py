@@ -0,0 +1,215 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from get_geo_from_address import format_property_address
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 50000
+LOANS_FILENAME = 'loans.parquet'
+LOAN_PROPERTIES_FILENAME = 'loan_properties.parquet'
+LOAN_PROPERTIES_SCHEMA = pa.schema([('loan_id', pa.string()), ('property_id', pa.string())])
+# Downcasts of known collateral columns, applied when the column's Arrow type (see loan_dtypes) matches:
+# ratios fit float32 (balances stay float64, float32 cannot hold dollar amounts to the cent), statuses are few
+LOAN_DOWNCASTS = {
+    'coupon': 'float32',
+    'dscr': 'float32',
+    'ltv': 'float32',
+    'status': 'category',
+}
+
+
+def default_output_dir(db_path: str) -> str:
+    """Loan files of a snapshot: <db dir>/loans/<snapshot name>."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'loans', os.path.basename(db_path))
+
+
+def loan_node_id(deal_id, loan_id) -> str:
+    """Loan node id; loan ids are only unique within a deal."""
+    return f"{deal_id}:{loan_id}"
+
+
+def loan_dtypes(schema: pa.Schema) -> Dict[str, str]:
+    """
+    In-memory dtypes of the collateral columns from their Arrow schema (CMBSDatabaseHandler.arrow_schema):
+    integers nullable Int64, reals float64, with LOAN_DOWNCASTS on top; other columns pass through as read.
+    """
+    dtypes = {}
+    for field in schema:
+        downcast = LOAN_DOWNCASTS.get(field.name)
+        if downcast == 'float32' and field.type == pa.float64() or downcast == 'category' and field.type == pa.string():
+            dtypes[field.name] = downcast
+        elif field.type == pa.int64():
+            dtypes[field.name] = 'Int64'
+        elif field.type == pa.float64():
+            dtypes[field.name] = 'float64'
+    return dtypes
+
+
+def loan_schema(schema: pa.Schema, dtypes: Dict[str, str]) -> pa.Schema:
+    """
+    Parquet schema of the loans file, fixed before the first chunk: the collateral schema, narrowed to float32
+    where the dtype is (categories are written as their string values).
+    """
+    return pa.schema([pa.field(field.name, pa.float32()) if dtypes.get(field.name) == 'float32' else field
+                      for field in schema])
+
+
+def downcast_loans(chunk: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Apply loan_dtypes to the columns of a collateral chunk that have them."""
+    return chunk.astype({column: dtype for column, dtype in dtypes.items() if column in chunk.columns})
+
+
+def loan_property_edges(rows: List[tuple]) -> pd.DataFrame:
+    """Loan -> Property id pairs of a batch of propinfo (deal_id, loan_id, address, state) rows."""
+    return pd.DataFrame({
+        'loan_id': [loan_node_id(d, l) for d, l, _, _ in rows],
+        'property_id': [format_property_address(a, s) for _, _, a, s in rows],
+    }).drop_duplicates()
+
+
+def loan_rows(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Parameter rows for DealLister.load_loans: node id, deal id and the remaining columns as properties."""
+    props = chunk.drop(columns=['deal_id', 'loan_id'])
+    for column, dtype in props.dtypes.items():
+        if dtype == 'float32':
+            # float32 values widen to float64 noise (0.0627 -> 0.06270000338...); round back to what was stored
+            props[column] = props[column].astype('float64').round(6)
+    props = props.astype(object).where(props.notna(), None)
+    ids = [loan_node_id(d, l) for d, l in zip(chunk['deal_id'], chunk['loan_id'])]
+    return [{'id': node_id, 'deal_id': str(deal_id), 'props': row}
+            for node_id, deal_id, row in zip(ids, chunk['deal_id'], props.to_dict('records'))]
+
+
+class _ParquetSink:
+    """
+    Append chunks to one Parquet file, one row group each, under a schema fixed up front (not inferred from the
+    first chunk, whose all-null columns would have no type for the chunks after it).
+    """
+
+    def __init__(self, path: str, schema: pa.Schema):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.schema = schema
+        self.writer = None
+        self.rows = 0
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        # Category codes differ per chunk; they are written as the strings of the schema
+        self.writer.write_table(table.select(self.schema.names).cast(self.schema))
+        self.rows += len(chunk)
+
+    def __enter__(self) -> '_ParquetSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """The file only replaces a previous one once every chunk is written."""
+        if self.writer is not None:
+            self.writer.close()
+            if exc_type is None:
+                os.replace(self.tmp_path, self.path)
+            else:
+                os.remove(self.tmp_path)
+
+
+def ingest_loans(db_handler, output_dir: Optional[str] = None, deal_lister=None,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Stream the collateral table into Loan nodes and Parquet files, one chunk at a time.
+    Loans are read in chunks of chunk_rows with downcast dtypes, appended to loans.parquet and (with a
+    DealLister) upserted as Loan nodes linked from their Deal; loans of deals not in the graph are skipped and
+    counted. A second pass streams propinfo into
+    Loan -> Property edges (loan_properties.parquet, SECURED_BY in the graph). Memory is bounded by the
+    chunk size, not by the size of either table.
+    Args:
+        db_handler (CMBSDatabaseHandler): Snapshot to read
+        output_dir (Optional[str]): Directory of the Parquet files; defaults to default_output_dir(db_path)
+        deal_lister (Optional[DealLister]): Also load the loans into Neo4j
+        chunk_rows (int): Rows per chunk
+    Returns:
+        Dict[str, Any]: Row, chunk and edge counts (with a DealLister, loans loaded into and skipped by Neo4j),
+                        output paths and elapsed time
+    """
+    output_dir = output_dir or default_output_dir(db_handler.db_path)
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    stats = {'loans': 0, 'loan_chunks': 0, 'loan_properties': 0, 'output_dir': output_dir}
+    if deal_lister is not None:
+        deal_lister.ensure_loan_schema()
+        stats.update(loans_loaded=0, loans_skipped=0)
+
+    schema, _ = db_handler.arrow_schema('collateral')
+    dtypes = loan_dtypes(schema)
+    with METRICS.span('loan_ingest'):
+        with _ParquetSink(os.path.join(output_dir, LOANS_FILENAME), loan_schema(schema, dtypes)) as sink:
+            for batch in db_handler.iter_table('collateral', batch_rows=chunk_rows, as_arrow=True):
+                chunk = downcast_loans(batch.to_pandas().dropna(subset=['deal_id', 'loan_id']), dtypes)
+                sink.write(chunk)
+                if deal_lister is not None:
+                    counts = deal_lister.load_loans(loan_rows(chunk))
+                    stats['loans_loaded'] += counts['loaded']
+                    stats['loans_skipped'] += counts['skipped']
+                stats['loans'] += len(chunk)
+                stats['loan_chunks'] += 1
+                METRICS.inc('loans_ingested_total', len(chunk))
+
+        with _ParquetSink(os.path.join(output_dir, LOAN_PROPERTIES_FILENAME), LOAN_PROPERTIES_SCHEMA) as sink:
+            for rows in db_handler.iter_table('propinfo', ['deal_id', 'loan_id', 'address', 'state'],
+                                              'loan_id IS NOT NULL', batch_rows=chunk_rows):
+                edges = loan_property_edges(rows)
+                sink.write(edges)
+                if deal_lister is not None:
+                    deal_lister.link_loan_properties(edges.to_dict('records'))
+                stats['loan_properties'] += len(edges)
+
+    stats['elapsed_s'] = round(time.perf_counter() - start, 3)
+    logger.info(f"Ingested {stats['loans']} loans in {stats['loan_chunks']} chunks and "
+                f"{stats['loan_properties']} loan-property edges in {stats['elapsed_s']}s to {output_dir}.")
+    if stats.get('loans_skipped'):
+        logger.warning(f"{stats['loans_skipped']} loans of deals not in the graph were not loaded into Neo4j.")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import resource
+    import tracemalloc
+    parser = argparse.ArgumentParser(description='Stream an Intex snapshot\'s collateral into Loan nodes and Parquet.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--output-dir', default=None, help='Parquet output directory (default: loans/<snapshot> next to the DB)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows per chunk')
+    parser.add_argument('--neo4j-uri', default=None, help='Also load the loans into this Neo4j')
+    parser.add_argument('--neo4j-user', default='neo4j')
+    parser.add_argument('--neo4j-password', default='testtest')
+    parser.add_argument('--database', default='gi-cmbs')
+    parser.add_argument('--trace-memory', action='store_true', help='Report the peak of Python allocations')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    lister = None
+    if args.neo4j_uri:
+        from neo4j_handler import DealLister
+        lister = DealLister(args.neo4j_uri, args.neo4j_user, args.neo4j_password, args.database)
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        result = ingest_loans(CMBSDatabaseHandler(args.db_path), args.output_dir, lister, args.chunk_rows)
+    finally:
+        if lister:
+            lister.close()
+    if args.trace_memory:
+        result['peak_traced_mib'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    result['max_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1)
+    print(json.dumps(result, indent=2))
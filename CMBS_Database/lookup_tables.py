@@ -0,0 +1,263 @@
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from get_geo_from_address import format_property_address
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKUP_FILENAME = 'cmbs_lookup_tables.bin'
+_MAGIC = b'CMBSLKP1'
+_ALIGN = 8
+# Table -> what its keys and values are
+LOOKUP_TABLES = {
+    'address_deals': 'property address (graph Address id) -> deal ids',
+    'cusip_deal': 'tranche CUSIP -> deal id',
+    'msa_deals': 'MSA name -> deal ids',
+    'owner_deals': 'property owner (canonical name or any alias) -> deal ids',
+    'deal_bloomberg': 'deal id -> Bloomberg name',
+}
+_ARRAYS = ('key_blob', 'key_offsets', 'value_blob', 'value_offsets', 'value_ranges')
+# numpy dtype strings of the stored arrays -> memoryview formats (native byte order)
+_FORMATS = {'|u1': 'B', '<i8': 'q'}
+
+
+def normalize_key(key) -> str:
+    """Keys match case-insensitively and regardless of repeated whitespace."""
+    return ' '.join(str(key).split()).casefold()
+
+
+def _encode_strings(strings) -> tuple:
+    """UTF-8 blob and (n + 1) offsets of a sequence of strings."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def build_table(pairs: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Arrays of one sorted table from (key, value) string pairs: the distinct normalized keys in code-point order
+    (which is also UTF-8 byte order, so byte comparisons agree), and per key a range of distinct values, numeric
+    values (deal ids) in numeric order followed by any others alphabetically (result_projection.deal_id_order).
+    """
+    pairs = pairs.dropna().astype(str)
+    pairs = pd.DataFrame({'key': pairs['key'].map(normalize_key), 'value': pairs['value']})
+    pairs = pairs[pairs['key'] != ''].drop_duplicates()
+    numeric = pd.to_numeric(pairs['value'].where(pairs['value'].str.isdigit()), errors='coerce')
+    pairs = pairs.assign(numeric=numeric).sort_values(['key', 'numeric', 'value'], kind='stable', na_position='last')
+    keys, counts = np.unique(pairs['key'].to_numpy(dtype=object), return_counts=True)
+    key_blob, key_offsets = _encode_strings(keys)
+    value_blob, value_offsets = _encode_strings(pairs['value'].tolist())
+    value_ranges = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=value_ranges[1:])
+    return {'key_blob': key_blob, 'key_offsets': key_offsets, 'value_blob': value_blob,
+            'value_offsets': value_offsets, 'value_ranges': value_ranges}
+
+
+def write_lookup_file(path: str, tables: Dict[str, Dict[str, np.ndarray]], meta: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Write tables into one file: magic, header length, JSON header (array offsets, dtypes, lengths), then the
+    8-byte aligned arrays, so a reader can memory-map the file and view each array in place.
+    """
+    layout, position = {}, 0
+    for name, arrays in tables.items():
+        layout[name] = {}
+        for array_name in _ARRAYS:
+            array = arrays[array_name]
+            layout[name][array_name] = [position, array.dtype.str, len(array)]
+            position += -(-array.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({'meta': meta or {}, 'tables': layout}).encode('utf-8')
+    data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MAGIC + np.uint64(len(header)).tobytes() + header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for name, arrays in tables.items():
+            for array_name in _ARRAYS:
+                data = np.ascontiguousarray(arrays[array_name]).tobytes()
+                f.write(data + b'\0' * (-len(data) % _ALIGN))
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_lookup_tables(db_handler, output_path: str, entity_map=None) -> Dict[str, int]:
+    """
+    Build the static lookup file of a snapshot from its Intex tables.
+    Args:
+        db_handler (CMBSDatabaseHandler): Snapshot to read
+        output_path (str): Lookup file to write
+        entity_map (Optional[entity_resolution.AliasMap]): Owner names resolve to canonical names, and every
+            alias is also a key of owner_deals
+    Returns:
+        Dict[str, int]: Number of keys per table
+    """
+    with METRICS.span('build_lookup_tables'):
+        props = db_handler.execute_custom_query(
+            "SELECT DISTINCT deal_id, address, state, msa_name, owner_name FROM propinfo")
+        tranches = db_handler.execute_custom_query("SELECT DISTINCT tr_cusip, deal_id FROM deal_tranche")
+        deals = db_handler.execute_custom_query("SELECT deal_id, bloomberg_name FROM deals")
+
+        deal_ids = props['deal_id'].astype(str)
+        addresses = [format_property_address(a, s) for a, s in zip(props['address'], props['state'])]
+        owners = props[['owner_name']].assign(value=deal_ids).rename(columns={'owner_name': 'key'})
+        if entity_map is not None:
+            canonical = owners['key'].map(lambda name: entity_map.canonical('owner_name', name))
+            owners = pd.concat([owners, owners.assign(key=canonical)])
+        tables = {
+            'address_deals': build_table(pd.DataFrame({'key': addresses, 'value': deal_ids})),
+            'cusip_deal': build_table(pd.DataFrame({'key': tranches['tr_cusip'],
+                                                    'value': tranches['deal_id'].astype(str)})),
+            'msa_deals': build_table(pd.DataFrame({'key': props['msa_name'], 'value': deal_ids})),
+            'owner_deals': build_table(owners),
+            'deal_bloomberg': build_table(pd.DataFrame({'key': deals['deal_id'].astype(str),
+                                                        'value': deals['bloomberg_name']})),
+        }
+        counts = {name: len(arrays['key_offsets']) - 1 for name, arrays in tables.items()}
+        write_lookup_file(output_path, tables, {'snapshot': os.path.basename(db_handler.db_path),
+                                                'built_at': time.time(), 'keys': counts})
+    logger.info(f"Lookup tables written to {output_path}: {counts}")
+    return counts
+
+
+class LookupTable:
+    """One memory-mapped table: binary search over the sorted keys, then a slice of its values."""
+
+    def __init__(self, name: str, arrays: Dict[str, memoryview]):
+        self.name = name
+        self.key_blob = arrays['key_blob']
+        self.key_offsets = arrays['key_offsets']
+        self.value_blob = arrays['value_blob']
+        self.value_offsets = arrays['value_offsets']
+        self.value_ranges = arrays['value_ranges']
+
+    def __len__(self) -> int:
+        return len(self.key_offsets) - 1
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self.key_blob[self.key_offsets[i]:self.key_offsets[i + 1]])
+
+    def _bisect(self, target: bytes) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _values(self, i: int) -> List[str]:
+        offsets = self.value_offsets[self.value_ranges[i]:self.value_ranges[i + 1] + 1]
+        return [str(self.value_blob[a:b], 'utf-8') for a, b in zip(offsets, offsets[1:])]
+
+    def get(self, key) -> List[str]:
+        """Values of a key (empty if the key is absent)."""
+        target = normalize_key(key).encode('utf-8')
+        i = self._bisect(target)
+        if i < len(self) and self._key(i) == target:
+            return self._values(i)
+        return []
+
+    def keys_with_prefix(self, prefix, limit: int = 20) -> List[str]:
+        """Up to limit normalized keys starting with prefix, in sorted order."""
+        target = normalize_key(prefix).encode('utf-8')
+        keys = []
+        i = self._bisect(target)
+        while i < len(self) and len(keys) < limit:
+            key = self._key(i)
+            if not key.startswith(target):
+                break
+            keys.append(key.decode('utf-8'))
+            i += 1
+        return keys
+
+
+class LookupTables:
+    """
+    Reader of a lookup file written by build_lookup_tables. The file is memory-mapped and its arrays are read
+    in place through memoryviews, so opening it is cheap and lookups need neither a database nor numpy;
+    each lookup is a binary search over one table's sorted keys.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Not a CMBS lookup file: {path}")
+            header_len = int.from_bytes(f.read(8), sys.byteorder)
+            header = json.loads(f.read(header_len))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data_start = -(-(len(_MAGIC) + 8 + header_len) // _ALIGN) * _ALIGN
+        self.meta = header['meta']
+        view = memoryview(self._mmap)
+        self.tables = {}
+        for name, layout in header['tables'].items():
+            arrays = {}
+            for array_name, (offset, dtype, length) in layout.items():
+                itemsize = np.dtype(dtype).itemsize
+                start = data_start + offset
+                arrays[array_name] = view[start:start + length * itemsize].cast(_FORMATS[dtype])
+            self.tables[name] = LookupTable(name, arrays)
+
+    def lookup(self, table: str, key) -> List[str]:
+        return self.tables[table].get(key)
+
+    def deal_ids_by_address(self, address: str) -> List[str]:
+        return self.lookup('address_deals', address)
+
+    def deal_id_by_cusip(self, cusip: str) -> Optional[str]:
+        deal_ids = self.lookup('cusip_deal', cusip)
+        return deal_ids[0] if deal_ids else None
+
+    def deal_ids_by_msa(self, msa_name: str) -> List[str]:
+        return self.lookup('msa_deals', msa_name)
+
+    def deal_ids_by_owner(self, owner_name: str) -> List[str]:
+        return self.lookup('owner_deals', owner_name)
+
+    def bloomberg_name_by_deal_id(self, deal_id) -> Optional[str]:
+        names = self.lookup('deal_bloomberg', deal_id)
+        return names[0] if names else None
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Build or query the static lookup tables of an Intex snapshot.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='Build the lookup file from a snapshot')
+    build.add_argument('db_path', help='Path to the Intex SQLite database')
+    build.add_argument('--output', default=None, help=f'Lookup file (default: {DEFAULT_LOOKUP_FILENAME} next to the DB)')
+    build.add_argument('--resolve-entities', action='store_true', help='Index canonical owner names and aliases')
+    query = subparsers.add_parser('query', help='Look up keys')
+    query.add_argument('lookup_file', help='Lookup file')
+    query.add_argument('table', choices=sorted(LOOKUP_TABLES))
+    query.add_argument('keys', nargs='+')
+    query.add_argument('--prefix', action='store_true', help='List keys starting with each key instead')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'build':
+        from extract_intex_db_to_kg import CMBSDatabaseHandler
+        handler = CMBSDatabaseHandler(args.db_path)
+        aliases = None
+        if args.resolve_entities:
+            from entity_resolution import resolve_entities
+            aliases, _ = resolve_entities(handler)
+        build_lookup_tables(handler, args.output or os.path.join(os.path.dirname(os.path.abspath(args.db_path)),
+                                                                 DEFAULT_LOOKUP_FILENAME), aliases)
+    else:
+        tables = LookupTables(args.lookup_file)
+        for key in args.keys:
+            start = time.perf_counter()
+            values = (tables.tables[args.table].keys_with_prefix(key) if args.prefix
+                      else tables.lookup(args.table, key))
+            print(f"{key}: {values} ({(time.perf_counter() - start) * 1e6:.1f} us)")
@@ -1,14 +1,122 @@
+import logging
+import os
+import threading
+import time
+
 from mcp.server.fastmcp import FastMCP
-from neo4j_handler import DealLister
+from pipeline_metrics import METRICS, serve_metrics
+from result_projection import to_json
+
+# Neo4j connection details, overridable per deployment (and by load_test_mcp.py for a spawned server)
+NEO4J_URI = os.environ.get('CMBS_NEO4J_URI', "bolt://localhost:7689")
+NEO4J_USER = os.environ.get('CMBS_NEO4J_USER', "neo4j")
+NEO4J_PASSWORD = os.environ.get('CMBS_NEO4J_PASSWORD', "testtest")
+DATABASE = os.environ.get('CMBS_NEO4J_DATABASE', "gi-cmbs")
+# Bounded connection establishment so a missing Neo4j fails fast instead of hanging a tool call
+CONNECTION_TIMEOUT = float(os.environ.get('CMBS_NEO4J_CONNECT_TIMEOUT', '5'))
+ACQUISITION_TIMEOUT = float(os.environ.get('CMBS_NEO4J_ACQUIRE_TIMEOUT', '10'))
+# Driver connection pool size; size it with load_test_mcp.py
+MAX_POOL_SIZE = int(os.environ.get('CMBS_NEO4J_POOL_SIZE', '100'))
+
+_deal_lister = None
+_deal_lister_lock = threading.Lock()
+# Precomputed exposure rollups (see exposure_rollups), e.g. CMBS_ROLLUP_DB=/data/exposure_rollups.sqlite
+ROLLUP_DB = os.environ.get('CMBS_ROLLUP_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'exposure_rollups.sqlite'))
+_exposure_rollups = None
+# Static lookup tables shipped with each export (see lookup_tables), e.g. CMBS_LOOKUP_TABLES=/data/cmbs_lookup_tables.bin.
+# The MSA and owner tools always read them. Bloomberg-name, address and CUSIP lookups are answered from them instead of
+# Neo4j only when CMBS_USE_LOOKUP_TABLES=1 and the file was built from the snapshot loaded into Neo4j, named by
+# CMBS_GRAPH_SNAPSHOT (e.g. CMBS_H_20250430); otherwise those tools query Neo4j.
+LOOKUP_TABLES_PATH = os.environ.get('CMBS_LOOKUP_TABLES', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                       'cmbs_lookup_tables.bin'))
+USE_LOOKUP_TABLES = os.environ.get('CMBS_USE_LOOKUP_TABLES', '').lower() in ('1', 'true', 'yes')
+GRAPH_SNAPSHOT = os.environ.get('CMBS_GRAPH_SNAPSHOT')
+_lookup_tables = None
+_lookup_snapshot_checked = False
+
+
+def get_deal_lister():
+    """Create the DealLister and its driver on first use rather than at import time."""
+    global _deal_lister
+    if _deal_lister is None:
+        with _deal_lister_lock:
+            if _deal_lister is None:
+                # Deferred: the neo4j driver also imports pandas/numpy when they are installed
+                from neo4j_handler import DealLister
+                lister = DealLister(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, DATABASE,
+                                    connection_timeout=CONNECTION_TIMEOUT,
+                                    connection_acquisition_timeout=ACQUISITION_TIMEOUT,
+                                    max_connection_pool_size=MAX_POOL_SIZE)
+                # Opt-in slow-query log, e.g. CMBS_SLOW_QUERY_MS=50; CMBS_PROFILE_ALL=1 records db hits of every
+                # query instead of only the slow ones
+                if os.environ.get('CMBS_SLOW_QUERY_MS'):
+                    lister.enable_profiling(slow_ms=float(os.environ['CMBS_SLOW_QUERY_MS']),
+                                            log_path=os.environ.get('CMBS_SLOW_QUERY_LOG', 'slow_queries.jsonl'),
+                                            profile_all=os.environ.get('CMBS_PROFILE_ALL', '').lower()
+                                            in ('1', 'true', 'yes'))
+                _deal_lister = lister
+    return _deal_lister
+
+
+def get_exposure_rollups():
+    """Open the rollup side table on first use."""
+    global _exposure_rollups
+    if _exposure_rollups is None:
+        with _deal_lister_lock:
+            if _exposure_rollups is None:
+                if not os.path.exists(ROLLUP_DB):
+                    raise FileNotFoundError(f"No exposure rollups at {ROLLUP_DB}; run exposure_rollups.py first")
+                from exposure_rollups import ExposureRollups
+                _exposure_rollups = ExposureRollups(ROLLUP_DB)
+    return _exposure_rollups
+
+
+def get_lookup_tables(required=False):
+    """Memory-map the lookup file on first use; None when there is none (unless required)."""
+    global _lookup_tables
+    if _lookup_tables is None:
+        with _deal_lister_lock:
+            if _lookup_tables is None:
+                if not os.path.exists(LOOKUP_TABLES_PATH):
+                    if required:
+                        raise FileNotFoundError(f"No lookup tables at {LOOKUP_TABLES_PATH}; run lookup_tables.py build first")
+                    return None
+                from lookup_tables import LookupTables
+                _lookup_tables = LookupTables(LOOKUP_TABLES_PATH)
+    return _lookup_tables
 
-# Neo4j connection details
-NEO4J_URI = "bolt://localhost:7689"
-NEO4J_USER = "neo4j"
-NEO4J_PASSWORD = "testtest"
-DATABASE = "gi-cmbs"
 
-# Initialize DealLister
-deal_lister = DealLister(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, DATABASE)
+def get_graph_lookup_tables():
+    """
+    The lookup tables when they may answer in place of Neo4j: enabled by USE_LOOKUP_TABLES, present, and built from
+    GRAPH_SNAPSHOT; None otherwise (a mismatch is logged once).
+    """
+    global _lookup_snapshot_checked
+    if not USE_LOOKUP_TABLES:
+        return None
+    tables = get_lookup_tables()
+    if tables is None:
+        return None
+    snapshot = tables.meta.get('snapshot')
+    if GRAPH_SNAPSHOT is None or snapshot != GRAPH_SNAPSHOT:
+        if not _lookup_snapshot_checked:
+            _lookup_snapshot_checked = True
+            logging.getLogger(__name__).warning(
+                f"Lookup tables at {LOOKUP_TABLES_PATH} were built from {snapshot}, but the graph snapshot is "
+                f"{GRAPH_SNAPSHOT or 'not set (CMBS_GRAPH_SNAPSHOT)'}; lookups go to Neo4j")
+        return None
+    return tables
+
+
+def warm_up():
+    """Build the driver and pre-compile the tool queries in the background."""
+    start = time.perf_counter()
+    try:
+        get_deal_lister().warm_up()
+        logging.getLogger(__name__).info(f"Server warm-up finished in {time.perf_counter() - start:.3f}s")
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Server warm-up failed: {e}")
 
 # Create FastMCP server
 server = FastMCP()
@@ -17,32 +125,134 @@ server = FastMCP()
 # @server.tool()
 # def list_deals():
 #     """List all deals in the database with their properties and addresses."""
-#     return deal_lister.list_deals()
+#     return get_deal_lister().list_deals()
 
-# @server.tool()
-# def search_deal_by_address(address: str):
-#     """Search for deals by address and return a list of matching deals."""
-#     return deal_lister.search_deal_by_address(address)
+@server.tool()
+def search_deal_by_address(address: str):
+    """Search for deals by address and return the matching deals with their property ids, as JSON."""
+    return to_json(get_deal_lister().search_deal_by_address(address))
 
-# @server.tool()
-# def list_properties_by_deal_id(deal_id: str):
-#     """List properties associated with a specific deal ID."""
-#     return deal_lister.list_properties_by_deal_id(deal_id)
+@server.tool()
+def list_properties_by_deal_id(deal_id: str, as_of: str = None):
+    """List the properties of a deal (id, name, address), optionally as of a snapshot date (YYYY-MM-DD), as JSON."""
+    return to_json(get_deal_lister().list_properties_by_deal_id(deal_id, as_of=as_of))
+
+@server.tool()
+def get_bloomberg_name_by_deal_id(deal_id: str, as_of: str = None):
+    """Retrieve the Bloomberg name for a given deal ID, optionally as of a snapshot date (YYYY-MM-DD), as JSON."""
+    tables = get_graph_lookup_tables() if as_of is None else None
+    if tables is not None:
+        return to_json(tables.bloomberg_name_by_deal_id(deal_id))
+    return to_json(get_deal_lister().get_bloomberg_name_by_deal_id(deal_id, as_of=as_of))
+
+@server.tool()
+def search_deal_id_by_address(address: str, as_of: str = None):
+    """
+    Search for deal IDs by address, optionally as of a snapshot date (YYYY-MM-DD), and return the matching deal IDs
+    in numeric order, as JSON.
+    """
+    tables = get_graph_lookup_tables() if as_of is None else None
+    if tables is not None:
+        return to_json(tables.deal_ids_by_address(address))
+    return to_json(get_deal_lister().search_deal_id_by_address(address, as_of=as_of))
+
+@server.tool()
+def get_deal_id_by_cusip(cusip: str):
+    """Return the deal ID of a tranche CUSIP, as JSON."""
+    tables = get_graph_lookup_tables()
+    if tables is not None:
+        return to_json(tables.deal_id_by_cusip(cusip))
+    return to_json(get_deal_lister().get_deal_id_by_cusip(cusip))
+
+@server.tool()
+def list_tranches_by_deal_id(deal_id: str, held_only: bool = False):
+    """List the tranches of a deal (CUSIP, class name, rating, balance, whether the book holds it) as JSON."""
+    return to_json(get_deal_lister().list_tranches_by_deal_id(deal_id, held_only=held_only))
+
+@server.tool()
+def search_deal_ids_by_msa(msa_name: str, limit: int = 100):
+    """
+    Search for the deal IDs with collateral in an MSA (case-insensitive name), in numeric order, as JSON with the
+    total count and the snapshot the lookup tables were built from.
+    """
+    tables = get_lookup_tables(required=True)
+    deal_ids = tables.deal_ids_by_msa(msa_name)
+    return to_json({'total': len(deal_ids), 'deal_ids': deal_ids[:max(0, int(limit))],
+                    'snapshot': tables.meta.get('snapshot')})
+
+@server.tool()
+def search_deal_ids_by_owner(owner_name: str, limit: int = 100):
+    """
+    Search for the deal IDs with collateral owned by an owner (canonical name or any known spelling), in numeric order,
+    as JSON with the total count and the snapshot the lookup tables were built from.
+    """
+    tables = get_lookup_tables(required=True)
+    deal_ids = tables.deal_ids_by_owner(owner_name)
+    return to_json({'total': len(deal_ids), 'deal_ids': deal_ids[:max(0, int(limit))],
+                    'snapshot': tables.meta.get('snapshot')})
 
 @server.tool()
-def get_bloomberg_name_by_deal_id(deal_id: str):
-    """Retrieve the Bloomberg name for a given deal ID."""
-    return deal_lister.get_bloomberg_name_by_deal_id(deal_id)
+def get_deal_card(deal_id: str, fields: str = None, max_properties: int = 25):
+    """
+    One-call overview of a deal: Bloomberg name, CUSIP, property count, top MSAs, property types and owners,
+    and up to max_properties properties, as JSON. fields is a comma-separated subset of
+    id,name,address,latitude,longitude,owner,msa,property_type,year_built (default: name,address,owner,msa,property_type,year_built).
+    """
+    selected = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    return to_json(get_deal_lister().get_deal_card(deal_id, fields=selected, max_properties=min(int(max_properties), 200)))
 
 @server.tool()
-def search_deal_id_by_address(address: str):
-    """Search for deal IDs by address and return a list of matching deal IDs."""
-    return deal_lister.search_deal_id_by_address(address)
+def deals_near(lat: float, lon: float, radius_miles: float):
+    """List deals with collateral properties within radius_miles of the given latitude/longitude, nearest first, as JSON."""
+    return to_json(get_deal_lister().deals_near(lat, lon, radius_miles))
+
+@server.tool()
+def deals_near_address(address: str, radius_miles: float):
+    """List deals with collateral properties within radius_miles of a known property address, as JSON."""
+    return to_json(get_deal_lister().deals_near_address(address, radius_miles))
+
+def _rollup_dimension(dimension):
+    """Reject dimensions the rollups are not computed for instead of answering with no rows."""
+    from exposure_rollups import ROLLUP_DIMENSIONS
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown dimension {dimension!r}; expected one of {', '.join(ROLLUP_DIMENSIONS)}")
+    return dimension
+
+@server.tool()
+def get_cusip_exposure(cusip: str, dimension: str = 'msa_name'):
+    """
+    Exposure of a held CUSIP's collateral by msa_name, trustee_prop_type_full, year_built or state (property counts
+    and %), as JSON.
+    """
+    return to_json(get_exposure_rollups().cusip_exposure(cusip, _rollup_dimension(dimension)))
+
+@server.tool()
+def get_portfolio_exposure(dimension: str = 'msa_name', portfolio: str = 'ALL', limit: int = 25):
+    """
+    Portfolio exposure by msa_name, trustee_prop_type_full, year_built or state; portfolio is an account or ALL.
+    Each deal's properties count once per portfolio; holdings is the number of positions exposed to the value.
+    Returned as JSON.
+    """
+    return to_json(get_exposure_rollups().portfolio_exposure(_rollup_dimension(dimension), portfolio, limit))
 
 # @server.tool()
 # def show_address_by_property_id(property_id: str):
 #     """Show the address for a given property ID."""
-#     return deal_lister.show_address_by_property_id(property_id)
+#     return get_deal_lister().show_address_by_property_id(property_id)
+
+@server.tool()
+def get_server_metrics():
+    """Return the server's query timings and counters in Prometheus text format."""
+    return METRICS.render_prometheus()
 
 if __name__ == "__main__":
+    # Logs go to stderr so they never interfere with the stdio transport
+    logging.basicConfig(level=os.environ.get('CMBS_LOG_LEVEL', 'WARNING'))
+    # Optional Prometheus scrape endpoint, e.g. CMBS_METRICS_PORT=9464; bound to localhost unless
+    # CMBS_METRICS_HOST (e.g. 0.0.0.0) opens it to other hosts
+    if os.environ.get('CMBS_METRICS_PORT'):
+        serve_metrics(int(os.environ['CMBS_METRICS_PORT']), host=os.environ.get('CMBS_METRICS_HOST', '127.0.0.1'))
+    # Optional warm-up, e.g. CMBS_WARM_UP=1; runs alongside the transport so startup is not delayed
+    if os.environ.get('CMBS_WARM_UP', '').lower() in ('1', 'true', 'yes'):
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
     server.run()
\ No newline at end of file
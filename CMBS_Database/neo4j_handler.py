@@ -1,18 +1,251 @@
+import logging
+import time
+import uuid
+
 from neo4j import GraphDatabase
+from pipeline_metrics import METRICS
+from query_profiler import QueryProfiler
+from result_projection import DealRecord, PropertyRecord, TrancheRecord, deal_id_order, project
+from versioned_graph import OPEN_END, delta_statements, normalize_as_of, summarize_delta, version_index_statements
+
+logger = logging.getLogger(__name__)
 
 # Neo4j connection details
 NEO4J_URI = "bolt://localhost:7689"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "testtest"
 
+
+def _current(*names):
+    """
+    Cypher predicate keeping only nodes/relationships of the latest snapshot: the versioned graph closes removed
+    ones with a valid_to date, graphs loaded without versioning have no valid_to at all.
+    """
+    return " AND ".join(f"coalesce({name}.valid_to, '{OPEN_END}') = '{OPEN_END}'" for name in names)
+
+
+# Queries served by the MCP tools; kept as constants so warm_up() compiles exactly the same text.
+# Without as_of they read the current graph (see _current).
+BLOOMBERG_NAME_BY_DEAL_ID_QUERY = f"MATCH (d:Deal {{id: $deal_id}}) WHERE {_current('d')} RETURN d.bloomberg AS bloomberg"
+DEAL_IDS_BY_ADDRESS_QUERY = (
+    "MATCH (d:Deal)-[h:HASPROPERTY]->(p:Property)-[l:LOCATEDAT]->(a) "
+    f"WHERE a.id = $address AND {_current('h', 'l')} "
+    "RETURN d.id AS deal_id"
+)
+# As-of variants for the versioned graph (see versioned_graph): node properties are read from the
+# NodeState valid at $as_of and relationships are filtered on their own validity interval
+BLOOMBERG_NAME_BY_DEAL_ID_AS_OF_QUERY = (
+    "MATCH (d:Deal {id: $deal_id})-[:HAS_STATE]->(s:NodeState) "
+    "WHERE s.valid_from <= $as_of AND s.valid_to > $as_of "
+    "RETURN s.bloomberg AS bloomberg"
+)
+DEAL_IDS_BY_ADDRESS_AS_OF_QUERY = (
+    "MATCH (d:Deal)-[h:HASPROPERTY]->(p:Property)-[l:LOCATEDAT]->(a:Address {id: $address}) "
+    "WHERE h.valid_from <= $as_of AND h.valid_to > $as_of AND l.valid_from <= $as_of AND l.valid_to > $as_of "
+    "RETURN DISTINCT d.id AS deal_id"
+)
+PROPERTIES_BY_DEAL_ID_AS_OF_QUERY = (
+    "MATCH (d:Deal {id: $deal_id})-[h:HASPROPERTY]->(:Property)-[:HAS_STATE]->(s:NodeState) "
+    "WHERE h.valid_from <= $as_of AND h.valid_to > $as_of AND s.valid_from <= $as_of AND s.valid_to > $as_of "
+    "RETURN s.id AS id, s.valid_from AS valid_from, s.valid_to AS valid_to"
+)
+# A deal's representative CUSIP: CUSIPs belong to its Tranche nodes (held ones first), not to the Deal node
+_DEAL_CUSIP_SUBQUERY = (
+    "CALL { WITH d OPTIONAL MATCH (d)-[:HAS_TRANCHE]->(t:Tranche) WITH t ORDER BY t.held DESC, t.cusip "
+    "RETURN head(collect(t.cusip)) AS cusip } "
+)
+# Projected lookups: only the fields of result_projection's records leave the database
+PROPERTIES_BY_DEAL_ID_QUERY = (
+    f"MATCH (d:Deal {{id: $deal_id}})-[h:HASPROPERTY]->(p:Property) WHERE {_current('h')} "
+    f"RETURN p.id AS id, head([(p)-[r:NAMEDAS]->(n:PropName) WHERE {_current('r')} | n.name]) AS name, "
+    f"head([(p)-[r:LOCATEDAT]->(a:Address) WHERE {_current('r')} | a.id]) AS address"
+)
+DEALS_BY_ADDRESS_QUERY = (
+    "MATCH (d:Deal)-[h:HASPROPERTY]->(p:Property)-[l:LOCATEDAT]->(a:Address {id: $address}) "
+    f"WHERE {_current('h', 'l')} "
+    "WITH d, collect(DISTINCT p.id) AS property_ids "
+    + _DEAL_CUSIP_SUBQUERY +
+    "RETURN d.id AS id, d.bloomberg AS bloomberg, cusip, property_ids"
+)
+# Tranches are nodes keyed by CUSIP (unique), so a security lookup is one seek on the constraint's index
+TRANCHE_SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT tranche_cusip IF NOT EXISTS FOR (t:Tranche) REQUIRE t.cusip IS UNIQUE",
+    "CREATE INDEX deal_id IF NOT EXISTS FOR (n:Deal) ON (n.id)",
+]
+# Tranches attach to deals already in the graph (tranches of other deals are skipped, never creating bare Deal
+# nodes); each load stamps its tranches with $load_id, and RESET_UNLOADED_TRANCHES_QUERY clears the holding
+# flags of every tranche the load did not include
+LOAD_TRANCHES_QUERY = (
+    "UNWIND $rows AS row "
+    f"MATCH (d:Deal {{id: row.deal_id}}) WHERE {_current('d')} "
+    "MERGE (t:Tranche {cusip: row.cusip}) "
+    "SET t.name = row.name, t.rating = row.rating, t.balance = row.balance, t.held = row.held, "
+    "t.positions = row.positions, t.par_amount = row.par_amount, t.market_value = row.market_value, "
+    "t.load_id = $load_id "
+    "MERGE (d)-[:HAS_TRANCHE]->(t) "
+    "RETURN count(t) AS loaded"
+)
+RESET_UNLOADED_TRANCHES_QUERY = (
+    "MATCH (t:Tranche) WHERE t.load_id IS NULL OR t.load_id <> $load_id "
+    "SET t.held = false, t.positions = 0, t.par_amount = null, t.market_value = null "
+    "RETURN count(t) AS reset"
+)
+# Loans (see loan_ingest) are keyed by "<deal id>:<loan id>"
+LOAN_SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT loan_id IF NOT EXISTS FOR (l:Loan) REQUIRE l.id IS UNIQUE",
+    "CREATE INDEX deal_id IF NOT EXISTS FOR (n:Deal) ON (n.id)",
+    "CREATE INDEX property_id IF NOT EXISTS FOR (n:Property) ON (n.id)",
+]
+LOAD_LOANS_QUERY = (
+    "UNWIND $rows AS row "
+    f"MATCH (d:Deal {{id: row.deal_id}}) WHERE {_current('d')} "
+    "MERGE (l:Loan {id: row.id}) "
+    "SET l += row.props "
+    "MERGE (d)-[:HAS_LOAN]->(l) "
+    "RETURN count(l) AS loaded"
+)
+LINK_LOAN_PROPERTIES_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (l:Loan {id: row.loan_id}), (p:Property {id: row.property_id}) "
+    "MERGE (l)-[:SECURED_BY]->(p)"
+)
+DEAL_ID_BY_CUSIP_QUERY = "MATCH (d:Deal)-[:HAS_TRANCHE]->(t:Tranche {cusip: $cusip}) RETURN d.id AS deal_id"
+DEAL_IDS_BY_CUSIPS_QUERY = (
+    "UNWIND $cusips AS cusip "
+    "MATCH (d:Deal)-[:HAS_TRANCHE]->(t:Tranche {cusip: cusip}) "
+    "RETURN t.cusip AS cusip, d.id AS deal_id"
+)
+TRANCHES_BY_DEAL_ID_QUERY = (
+    "MATCH (d:Deal {id: $deal_id})-[:HAS_TRANCHE]->(t:Tranche) "
+    "WHERE t.held OR NOT $held_only "
+    "RETURN t.cusip AS cusip, d.id AS deal_id, t.name AS name, t.rating AS rating, t.balance AS balance, "
+    "t.held AS held, t.positions AS positions "
+    "ORDER BY t.cusip"
+)
+# Held tranches first, so a deal's representative CUSIP is one the book owns
+CUSIP_BY_DEAL_ID_QUERY = (
+    "MATCH (d:Deal {id: $deal_id})-[:HAS_TRANCHE]->(t:Tranche) "
+    "RETURN t.cusip AS cusip ORDER BY t.held DESC, t.cusip LIMIT 1"
+)
+SHARES_COLLATERAL_WITH_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Deal {id: row.deal_a}), (b:Deal {id: row.deal_b}) "
+    "MERGE (a)-[r:SHARES_COLLATERAL_WITH]->(b) "
+    "SET r = row.props"
+)
+# One projected round trip for a deal overview: counts and top groups over all properties,
+# plus a capped, ordered property list with the fields of its neighbours inlined
+DEAL_CARD_QUERY = (
+    f"MATCH (d:Deal {{id: $deal_id}}) WHERE {_current('d')} "
+    f"CALL {{ WITH d MATCH (d)-[h:HASPROPERTY]->(p:Property) WHERE {_current('h')} "
+    "RETURN count(DISTINCT p) AS property_count } "
+    f"CALL {{ WITH d MATCH (d)-[h:HASPROPERTY]->(:Property)-[r:INMSA]->(m:MSAName) WHERE {_current('h', 'r')} "
+    "WITH m.name AS value, count(*) AS n ORDER BY n DESC, value LIMIT $max_groups "
+    "RETURN collect({value: value, properties: n}) AS msas } "
+    "CALL { WITH d MATCH (d)-[h:HASPROPERTY]->(:Property)-[r:PROPERTYTYPE]->(t:TrusteePropTypeFull) "
+    f"WHERE {_current('h', 'r')} "
+    "WITH t.id AS value, count(*) AS n ORDER BY n DESC, value LIMIT $max_groups "
+    "RETURN collect({value: value, properties: n}) AS property_types } "
+    "CALL { WITH d MATCH (d)-[h:HASPROPERTY]->(:Property)-[r:OWNEDBY]->(o:PropertyOwner) "
+    f"WHERE {_current('h', 'r')} "
+    "WITH o.ownerName AS value, count(*) AS n ORDER BY n DESC, value LIMIT $max_groups "
+    "RETURN collect({value: value, properties: n}) AS owners } "
+    f"CALL {{ WITH d MATCH (d)-[h:HASPROPERTY]->(p:Property) WHERE {_current('h')} "
+    "WITH DISTINCT p ORDER BY p.id LIMIT $max_properties "
+    "RETURN collect(p {.id, "
+    f"name: head([(p)-[r:NAMEDAS]->(n:PropName) WHERE {_current('r')} | n.name]), "
+    f"address: head([(p)-[r:LOCATEDAT]->(a:Address) WHERE {_current('r')} | a.id]), "
+    f"latitude: head([(p)-[r:LOCATEDAT]->(a:Address) WHERE {_current('r')} | a.latitude]), "
+    f"longitude: head([(p)-[r:LOCATEDAT]->(a:Address) WHERE {_current('r')} | a.longitude]), "
+    f"owner: head([(p)-[r:OWNEDBY]->(o:PropertyOwner) WHERE {_current('r')} | o.ownerName]), "
+    f"msa: head([(p)-[r:INMSA]->(m:MSAName) WHERE {_current('r')} | m.name]), "
+    f"property_type: head([(p)-[r:PROPERTYTYPE]->(t:TrusteePropTypeFull) WHERE {_current('r')} | t.id]), "
+    f"year_built: head([(p)-[r:BUILTAT]->(y:YearBuilt) WHERE {_current('r')} | y.id])}}) AS properties }} "
+    + _DEAL_CUSIP_SUBQUERY +
+    "RETURN d.id AS deal_id, d.bloomberg AS bloomberg, cusip, "
+    "[(d)-[:HAS_TRANCHE]->(t:Tranche) WHERE t.held | t.cusip] AS held_cusips, property_count, "
+    "msas, property_types, owners, properties"
+)
+# Property fields a deal card can return
+DEAL_CARD_FIELDS = ('id', 'name', 'address', 'latitude', 'longitude', 'owner', 'msa', 'property_type', 'year_built')
+DEAL_CARD_DEFAULT_FIELDS = ('name', 'address', 'owner', 'msa', 'property_type', 'year_built')
+GEOCODED_PROPERTIES_QUERY = (
+    "MATCH (d:Deal)-[h:HASPROPERTY]->(p:Property)-[l:LOCATEDAT]->(a:Address) "
+    f"WHERE a.latitude IS NOT NULL AND a.longitude IS NOT NULL AND {_current('h', 'l')} "
+    "RETURN d.id AS deal_id, d.bloomberg AS bloomberg, p.id AS property_id, "
+    "a.id AS address, a.latitude AS latitude, a.longitude AS longitude"
+)
+
 class DealLister:
-    def __init__(self, uri, user, password, database):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    # (query, dummy parameters) pairs pre-compiled by warm_up()
+    WARM_UP_QUERIES = [
+        (BLOOMBERG_NAME_BY_DEAL_ID_QUERY, {'deal_id': ''}),
+        (DEAL_IDS_BY_ADDRESS_QUERY, {'address': ''}),
+        (PROPERTIES_BY_DEAL_ID_QUERY, {'deal_id': ''}),
+        (DEALS_BY_ADDRESS_QUERY, {'address': ''}),
+        (GEOCODED_PROPERTIES_QUERY, {}),
+        (BLOOMBERG_NAME_BY_DEAL_ID_AS_OF_QUERY, {'deal_id': '', 'as_of': ''}),
+        (DEAL_IDS_BY_ADDRESS_AS_OF_QUERY, {'address': '', 'as_of': ''}),
+        (DEAL_CARD_QUERY, {'deal_id': '', 'max_properties': 1, 'max_groups': 1}),
+        (DEAL_ID_BY_CUSIP_QUERY, {'cusip': ''}),
+        (TRANCHES_BY_DEAL_ID_QUERY, {'deal_id': '', 'held_only': False}),
+    ]
+
+    def __init__(self, uri, user, password, database, profiler=None, driver=None, **driver_config):
+        """
+        Create the driver. Extra keyword arguments (e.g. connection_timeout,
+        connection_acquisition_timeout, max_connection_pool_size) are passed to GraphDatabase.driver.
+        An existing driver (e.g. the load-test stub) is used as is instead; uri, user and password are then ignored.
+        """
+        self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password), **driver_config)
         self.database = database
+        self.profiler = profiler
+        self._spatial_index = None
 
     def close(self):
         self.driver.close()
 
+    def warm_up(self, queries=None):
+        """
+        Open a pooled connection and pre-compile query plans with EXPLAIN, so the first
+        real tool call pays neither the connection handshake nor plan compilation.
+        """
+        start = time.perf_counter()
+        self.driver.verify_connectivity()
+        compiled = 0
+        with self.driver.session(database=self.database) as session:
+            for query, params in queries or self.WARM_UP_QUERIES:
+                try:
+                    session.run(f"EXPLAIN {query}", **params).consume()
+                    compiled += 1
+                except Exception as e:
+                    logger.warning(f"Warm-up failed for query '{query[:60]}': {e}")
+        METRICS.observe('warm_up', time.perf_counter() - start)
+        logger.info(f"Warm-up compiled {compiled} queries in {time.perf_counter() - start:.3f}s.")
+        return compiled
+
+    def enable_profiling(self, slow_ms=100.0, log_path='slow_queries.jsonl', profile_all=False, log_all=False):
+        """Record every query and capture PROFILE plans of slow ones (see query_profiler.QueryProfiler)."""
+        self.profiler = QueryProfiler(slow_ms=slow_ms, log_path=log_path, profile_all=profile_all, log_all=log_all)
+        return self.profiler
+
+    def _run(self, session, query, tag, projection=None, **params):
+        """
+        Run a Cypher query inside a timing span and return its records as a list.
+        With a projection (a result_projection record type), each record is converted in the same pass over the result.
+        """
+        with METRICS.span('cypher_query', query=tag):
+            if self.profiler:
+                records = self.profiler.run(session, query, tag, params)
+                if projection is not None:
+                    records = project(records, projection)
+            elif projection is not None:
+                records = project(session.run(query, **params), projection)
+            else:
+                records = list(session.run(query, **params))
+        METRICS.inc('cypher_rows_total', len(records), query=tag)
+        return records
+
     def list_deals(self):
         """List all deals in the database with their properties and addresses."""
         with self.driver.session(database=self.database) as session:
@@ -22,87 +255,85 @@ class DealLister:
                 OPTIONAL MATCH (p)-[:locatedAt]->(a)
                 RETURN d, collect(DISTINCT {property: p, address: a}) as properties
             """
-            result = session.run(query)
+            result = self._run(session, query, 'list_deals')
             
             for record in result:
                 deal = record["d"]
                 properties = record["properties"]
                 
-                print("\nDeal Properties:")
+                logger.info("Deal Properties:")
                 for key, value in deal.items():
-                    print(f"  {key}: {value}")
+                    logger.info(f"  {key}: {value}")
                 
                 if properties and properties[0]["property"] is not None:
-                    print("\nProperties and Addresses:")
+                    logger.info("Properties and Addresses:")
                     for prop in properties:
                         if prop["property"] and prop["address"]:
-                            print(f"  Property ID: {prop['property']['id']}")
-                            print(f"    Address: {prop['address']['id']}")
+                            logger.info(f"  Property ID: {prop['property']['id']}")
+                            logger.info(f"    Address: {prop['address']['id']}")
                         elif prop["property"]:
-                            print(f"  Property ID: {prop['property']['id']}")
-                            print("    Address: Not specified")
-        print("\n=== Debug Information ===")
-        print(f"Database: {self.database}")
+                            logger.info(f"  Property ID: {prop['property']['id']}")
+                            logger.info("    Address: Not specified")
+        logger.debug("=== Debug Information ===")
+        logger.debug(f"Database: {self.database}")
         
         try:
             with self.driver.session(database=self.database) as session:
                 # First check if we have any nodes at all
-                result = session.run("MATCH (n) RETURN count(n) as total_nodes")
-                total_nodes = result.single()["total_nodes"]
-                print(f"Total nodes in database: {total_nodes}")
+                result = self._run(session, "MATCH (n) RETURN count(n) as total_nodes", 'count_nodes')
+                total_nodes = result[0]["total_nodes"]
+                logger.debug(f"Total nodes in database: {total_nodes}")
                 
                 # Check specifically for Deal nodes
-                result = session.run("MATCH (d:Deal) RETURN count(d) as deal_count")
-                deal_count = result.single()["deal_count"]
-                print(f"Number of Deal nodes: {deal_count}")
+                result = self._run(session, "MATCH (d:Deal) RETURN count(d) as deal_count", 'count_deals')
+                deal_count = result[0]["deal_count"]
+                logger.debug(f"Number of Deal nodes: {deal_count}")
                 
                 if deal_count == 0:
-                    print("No Deal nodes found in the database.")
+                    logger.info("No Deal nodes found in the database.")
                     return "No Deal nodes found in the database."
                 
                 
                 # Get all deals with their properties
-                print("\nFetching Deal information:")
-                result = session.run("""
+                logger.debug("Fetching Deal information:")
+                result = self._run(session, """
                     MATCH (d:Deal)
                     OPTIONAL MATCH (d)-[r]->(related)
                     RETURN d, collect(type(r)) as relationships, collect(related) as related_nodes
-                """)
+                """, 'list_deal_relations')
                 
                 for record in result:
                     deal = record["d"]
                     relationships = record["relationships"]
                     related_nodes = record["related_nodes"]
                     
-                    print("\nDeal Properties:")
+                    logger.debug("Deal Properties:")
                     for key, value in deal.items():
-                        print(f"  {key}: {value}")
+                        logger.debug(f"  {key}: {value}")
                     
                     if relationships:
-                        print("Related Information:")
+                        logger.debug("Related Information:")
                         for rel, node in zip(relationships, related_nodes):
                             if node is not None:
-                                print(f"  -{rel}-> {node.labels} {dict(node.items())}")
+                                logger.debug(f"  -{rel}-> {node.labels} {dict(node.items())}")
                 
         except Exception as e:
-            print(f"Error during deal listing: {str(e)}")
+            logger.error(f"Error during deal listing: {str(e)}")
             raise
 
     def clean_database(self, database=None):
         """Remove all nodes and relationships from the database."""
         with self.driver.session(database=database) if database else self.driver.session() as session:
-            print("Cleaning up the database (removing all nodes and relationships)...")
-            session.run("MATCH (n) DETACH DELETE n")
-            print("Database cleanup complete.")
+            logger.info("Cleaning up the database (removing all nodes and relationships)...")
+            self._run(session, "MATCH (n) DETACH DELETE n", 'clean_database')
+            logger.info("Database cleanup complete.")
 
     def list_databases(self):
         """List all database names in the Neo4j instance."""
         with self.driver.session(database="system") as session:
-            result = session.run("SHOW DATABASES")
+            result = self._run(session, "SHOW DATABASES", 'show_databases')
             db_names = [record["name"] for record in result]
-            print("Databases:")
-            for name in db_names:
-                print(name)
+            logger.info(f"Databases: {db_names}")
         return db_names
 
     def create_database(self, db_name):
@@ -110,150 +341,312 @@ class DealLister:
         # First check if the database already exists
         existing_dbs = self.list_databases()
         if db_name in existing_dbs:
-            print(f"Database '{db_name}' already exists. Skipping creation.")
+            logger.info(f"Database '{db_name}' already exists. Skipping creation.")
             return
             
         # If not, create the database
         with self.driver.session(database="system") as session:
             try:
-                session.run(f"CREATE DATABASE `{db_name}`")
-                print(f"Database '{db_name}' created successfully.")
+                self._run(session, f"CREATE DATABASE `{db_name}`", 'create_database')
+                logger.info(f"Database '{db_name}' created successfully.")
             except Exception as e:
-                print(f"Failed to create database '{db_name}': {e}")
+                logger.error(f"Failed to create database '{db_name}': {e}")
 
     def delete_database(self, db_name):
         """Delete a database with the given name."""
         with self.driver.session(database="system") as session:
             try:
-                session.run(f"DROP DATABASE `{db_name}` IF EXISTS")
-                print(f"Database '{db_name}' deleted (if it existed).")
+                self._run(session, f"DROP DATABASE `{db_name}` IF EXISTS", 'delete_database')
+                logger.info(f"Database '{db_name}' deleted (if it existed).")
             except Exception as e:
-                print(f"Failed to delete database '{db_name}': {e}")
+                logger.error(f"Failed to delete database '{db_name}': {e}")
 
     def execute_cypher_file(self, file_path, database=None):
         with open(file_path, 'r', encoding='utf-8') as f:
             cypher_commands = [cmd.strip() for cmd in f.read().split(';') if cmd.strip()]
         total = len(cypher_commands)
-        with self.driver.session(database=database) if database else self.driver.session() as session:
+        failed = 0
+        with METRICS.span('cypher_file'), \
+                self.driver.session(database=database) if database else self.driver.session() as session:
             for idx, command in enumerate(cypher_commands, 1):
-                print(f"Executing command {idx}/{total}...")
+                logger.debug(f"Executing command {idx}/{total}...")
                 try:
-                    session.run(command)
-                    print(f"Command {idx} executed successfully.")
+                    with METRICS.span('cypher_execute'):
+                        session.run(command).consume()
+                    METRICS.inc('cypher_commands_total')
                 except Exception as e:
-                    print(f"Error executing command {idx}: {e}")
+                    failed += 1
+                    logger.error(f"Error executing command {idx}: {e}")
+        logger.info(f"Executed {total - failed}/{total} commands from {file_path}.")
 
     def search_deal_by_address(self, address):
+        """Find the deals holding a property at an address, as DealRecords with the matching property ids."""
         with self.driver.session(database=self.database) as session:
-            # Find deals by address
-            deal_query = (
-                "MATCH (d:Deal) WHERE d.address = $address RETURN d"
-            )
-            deal_results = session.run(deal_query, address=address)
-            deals = [record["d"] for record in deal_results]
-            if deals:
-                print(f"Deals found for address '{address}':")
-                for deal in deals:
-                    print(dict(deal))
-                    # Now find properties related to this deal via PARTOFDEAL
-                    prop_query = (
-                        "MATCH (p)-[:PARTOFDEAL]->(d {id: $deal_id}) RETURN p"
-                    )
-                    prop_results = session.run(prop_query, deal_id=deal['id'])
-                    properties = [record["p"] for record in prop_results]
-                    if properties:
-                        print(f"  Properties for deal ID '{deal['id']}':")
-                        for prop in properties:
-                            print(f"    {dict(prop)}")
-                    else:
-                        print(f"  No properties found for deal ID '{deal['id']}'.")
-            else:
-                print(f"No deals found for address '{address}'.")
+            deals = self._run(session, DEALS_BY_ADDRESS_QUERY, 'search_deal_by_address',
+                              projection=DealRecord, address=address)
+        logger.info(f"Deals found for address '{address}': {len(deals)}")
         return deals
 
-    def list_properties_by_deal_id(self, deal_id):
+    def list_properties_by_deal_id(self, deal_id, as_of=None):
+        """
+        List a deal's properties as PropertyRecords; with as_of (YYYY-MM-DD), as they were in the versioned
+        graph on that date.
+        """
         with self.driver.session(database=self.database) as session:
-            query = (
-                "MATCH (p)-[:PARTOFDEAL]->(d {id: $deal_id}) "
-                "RETURN p"
-            )
-            result = session.run(query, deal_id=deal_id)
-            properties = [record["p"] for record in result]
-            if properties:
-                print(f"Properties for deal ID '{deal_id}':")
-                for prop in properties:
-                    print(dict(prop))
+            if as_of is not None:
+                properties = self._run(session, PROPERTIES_BY_DEAL_ID_AS_OF_QUERY, 'list_properties_by_deal_id_as_of',
+                                       projection=PropertyRecord, deal_id=deal_id, as_of=normalize_as_of(as_of))
             else:
-                print(f"No properties found for deal ID '{deal_id}'.")
+                properties = self._run(session, PROPERTIES_BY_DEAL_ID_QUERY, 'list_properties_by_deal_id',
+                                       projection=PropertyRecord, deal_id=deal_id)
+        logger.info(f"Properties for deal ID '{deal_id}': {len(properties)}")
         return properties
 
     def get_cusip_by_deal_id(self, deal_id):
+        """Return one CUSIP of a deal (a held tranche if it has any), or None if the deal has no Tranche nodes."""
         with self.driver.session(database=self.database) as session:
-            query = (
-                "MATCH (d {id: $deal_id})-[:HASSECURITY]->(c {id: $cusip_id}) "
-                "RETURN c.id AS cusip"
-            )
-            # Extract CUSIP part from deal_id (e.g., 'deal:14' -> 'cusip:05591XAE1')
-            # You may need to adjust this logic based on your actual mapping
-            # For demonstration, let's assume you pass the correct cusip_id
-            cusip_id = self.get_cusip_id_for_deal(deal_id) if hasattr(self, 'get_cusip_id_for_deal') else None
-            result = session.run(query, deal_id=deal_id, cusip_id=cusip_id)
-            record = result.single()
-            if record and record["cusip"]:
-                print(f"CUSIP for deal ID '{deal_id}': {record['cusip']}")
-                return record["cusip"]
-            else:
-                print(f"No CUSIP found for deal ID '{deal_id}'.")
-                return None
+            result = self._run(session, CUSIP_BY_DEAL_ID_QUERY, 'get_cusip_by_deal_id', deal_id=str(deal_id))
+        if result:
+            logger.info(f"CUSIP for deal ID '{deal_id}': {result[0]['cusip']}")
+            return result[0]['cusip']
+        logger.info(f"No CUSIP found for deal ID '{deal_id}'.")
+        return None
 
-    def get_bloomberg_name_by_deal_id(self, deal_id):
-        """Retrieve the Bloomberg name for a given deal ID from the Neo4j database."""
+    def list_tranches_by_deal_id(self, deal_id, held_only=False):
+        """List a deal's tranches as TrancheRecords ordered by CUSIP; with held_only, only those in the book."""
         with self.driver.session(database=self.database) as session:
-            result = session.run(
-                "MATCH (d:Deal {id: $deal_id}) RETURN d.bloomberg AS bloomberg",
-                deal_id=deal_id
-            )
-            record = result.single()
+            tranches = self._run(session, TRANCHES_BY_DEAL_ID_QUERY, 'list_tranches_by_deal_id',
+                                 projection=TrancheRecord, deal_id=str(deal_id), held_only=bool(held_only))
+        logger.info(f"Tranches for deal ID '{deal_id}': {len(tranches)}")
+        return tranches
+
+    def get_deal_id_by_cusip(self, cusip):
+        """Return the deal ID of a tranche CUSIP, or None if there is no such Tranche node."""
+        with self.driver.session(database=self.database) as session:
+            result = self._run(session, DEAL_ID_BY_CUSIP_QUERY, 'get_deal_id_by_cusip', cusip=cusip)
+        if result:
+            logger.info(f"Deal ID for CUSIP '{cusip}': {result[0]['deal_id']}")
+            return result[0]['deal_id']
+        logger.info(f"No deal found for CUSIP '{cusip}'.")
+        return None
+
+    def get_deal_ids_by_cusips(self, cusips):
+        """Map many CUSIPs to their deal IDs in one round trip (CUSIPs without a Tranche node are left out)."""
+        with self.driver.session(database=self.database) as session:
+            result = self._run(session, DEAL_IDS_BY_CUSIPS_QUERY, 'get_deal_ids_by_cusips',
+                               cusips=list(dict.fromkeys(cusips)))
+        return {record['cusip']: record['deal_id'] for record in result}
+
+    def get_bloomberg_name_by_deal_id(self, deal_id, as_of=None):
+        """
+        Retrieve the Bloomberg name for a given deal ID from the Neo4j database.
+        With as_of (YYYY-MM-DD), the name recorded in the versioned graph on that date is returned.
+        """
+        with self.driver.session(database=self.database) as session:
+            if as_of is not None:
+                result = self._run(session, BLOOMBERG_NAME_BY_DEAL_ID_AS_OF_QUERY, 'get_bloomberg_name_by_deal_id_as_of',
+                                   deal_id=deal_id, as_of=normalize_as_of(as_of))
+            else:
+                result = self._run(
+                    session,
+                    BLOOMBERG_NAME_BY_DEAL_ID_QUERY,
+                    'get_bloomberg_name_by_deal_id',
+                    deal_id=deal_id
+                )
+            record = result[0] if result else None
             if record and record["bloomberg"]:
-                print(f"Bloomberg name for deal ID '{deal_id}': {record['bloomberg']}")
+                logger.info(f"Bloomberg name for deal ID '{deal_id}': {record['bloomberg']}")
                 return record["bloomberg"]
             else:
-                print(f"No Bloomberg name found for deal ID '{deal_id}'.")
+                logger.info(f"No Bloomberg name found for deal ID '{deal_id}'.")
                 return None
 
-    def search_deal_id_by_address(self, address):
-        """Search for deal IDs by address and return a list of matching deal IDs."""
+    def search_deal_id_by_address(self, address, as_of=None):
+        """
+        Search for deal IDs by address and return a list of matching deal IDs in numeric order.
+        With as_of (YYYY-MM-DD), only deals holding the property on that date are returned.
+        """
         with self.driver.session(database=self.database) as session:
-            query = (
-                "MATCH (d:Deal)-[:HASPROPERTY]->(p:Property)-[:LOCATEDAT]->(a) "
-                "WHERE a.id = $address "
-                "RETURN d.id AS deal_id"
-            )
-            print(query)
-            result = session.run(query,address=address)
-            deal_ids = [record["deal_id"] for record in result]
+            if as_of is not None:
+                result = self._run(session, DEAL_IDS_BY_ADDRESS_AS_OF_QUERY, 'search_deal_id_by_address_as_of',
+                                   address=address, as_of=normalize_as_of(as_of))
+            else:
+                query = DEAL_IDS_BY_ADDRESS_QUERY
+                logger.debug(query)
+                result = self._run(session, query, 'search_deal_id_by_address', address=address)
+            deal_ids = sorted({record["deal_id"] for record in result}, key=deal_id_order)
             if deal_ids:
-                print(f"Deal IDs found for address '{address}': {deal_ids}")
+                logger.info(f"Deal IDs found for address '{address}': {deal_ids}")
             else:
-                print(f"No deals found for address '{address}'.")
+                logger.info(f"No deals found for address '{address}'.")
             return deal_ids
 
+    def get_deal_card(self, deal_id, fields=None, max_properties=25, max_groups=10):
+        """
+        Summarize a deal in one query: Bloomberg name, CUSIP, property count, the largest MSA, property-type
+        and owner groups, and up to max_properties properties with the requested fields.
+        Args:
+            deal_id (str): Deal id
+            fields (Optional[Iterable[str]]): Property fields out of DEAL_CARD_FIELDS (default DEAL_CARD_DEFAULT_FIELDS)
+            max_properties (int): Cap on the listed properties (the count covers all of them)
+            max_groups (int): Cap on each group list
+        Returns:
+            Optional[dict]: The deal card, or None if the deal does not exist
+        """
+        fields = [f for f in (fields or DEAL_CARD_DEFAULT_FIELDS) if f in DEAL_CARD_FIELDS]
+        with self.driver.session(database=self.database) as session:
+            result = self._run(session, DEAL_CARD_QUERY, 'get_deal_card', deal_id=str(deal_id),
+                               max_properties=max(0, int(max_properties)), max_groups=max(0, int(max_groups)))
+        if not result:
+            logger.info(f"No deal found for deal ID '{deal_id}'.")
+            return None
+        card = result[0].data()
+        # Only the requested, non-empty fields reach the caller (and its token budget)
+        card['properties'] = [{f: prop[f] for f in fields if prop.get(f) is not None}
+                              for prop in card['properties']]
+        card['truncated'] = card['property_count'] > len(card['properties'])
+        logger.info(f"Deal card for deal ID '{deal_id}': {card['property_count']} properties, "
+                    f"{len(card['properties'])} listed.")
+        return card
+
+    def ensure_version_indexes(self):
+        """Create the id and validity indexes used by versioned loading and as-of queries."""
+        with self.driver.session(database=self.database) as session:
+            for statement in version_index_statements():
+                self._run(session, statement, 'ensure_version_indexes')
+            self._run(session, "CALL db.awaitIndexes(300)", 'await_indexes')
+
+    def _ensure_schema(self, statements, tag):
+        with self.driver.session(database=self.database) as session:
+            for statement in statements:
+                self._run(session, statement, tag)
+            self._run(session, "CALL db.awaitIndexes(300)", 'await_indexes')
+
+    def ensure_tranche_schema(self):
+        """Create the Tranche CUSIP uniqueness constraint and the Deal id index."""
+        self._ensure_schema(TRANCHE_SCHEMA_STATEMENTS, 'ensure_tranche_schema')
+
+    def ensure_loan_schema(self):
+        """Create the Loan id uniqueness constraint and the Deal and Property id indexes."""
+        self._ensure_schema(LOAN_SCHEMA_STATEMENTS, 'ensure_loan_schema')
+
+    def load_tranches(self, rows, batch_size=1000):
+        """
+        Upsert Tranche nodes and their HAS_TRANCHE edges from deal_tranche rows with holding flags
+        (see extract_intex_db_to_kg.CMBSDatabaseHandler.get_tranche_rows). Re-loading a later snapshot
+        updates the flags in place, and tranches the load does not include (sold, or of a deal no longer
+        in the graph) are no longer held. Tranches of deals that are not in the graph are skipped.
+        Returns:
+            Dict[str, int]: Tranches loaded, skipped and reset
+        """
+        self.ensure_tranche_schema()
+        start = time.perf_counter()
+        load_id = uuid.uuid4().hex
+        loaded = reset = 0
+        with METRICS.span('tranche_load'), self.driver.session(database=self.database) as session:
+            for i in range(0, len(rows), batch_size):
+                result = self._run(session, LOAD_TRANCHES_QUERY, 'load_tranches', rows=rows[i:i + batch_size],
+                                   load_id=load_id)
+                loaded += result[0]['loaded'] if result else 0
+            result = self._run(session, RESET_UNLOADED_TRANCHES_QUERY, 'reset_unloaded_tranches', load_id=load_id)
+            reset = result[0]['reset'] if result else 0
+        counts = {'loaded': loaded, 'skipped': len(rows) - loaded, 'reset': reset}
+        logger.info(f"Loaded tranches in {time.perf_counter() - start:.2f}s: {counts}")
+        return counts
+
+    def load_loans(self, rows, batch_size=1000):
+        """
+        Upsert Loan nodes and their HAS_LOAN edges from loan_ingest.loan_rows (one chunk of collateral).
+        Loans of deals that are not in the graph are skipped.
+        Returns:
+            Dict[str, int]: Loans loaded and skipped
+        """
+        loaded = 0
+        with METRICS.span('loan_load'), self.driver.session(database=self.database) as session:
+            for i in range(0, len(rows), batch_size):
+                result = self._run(session, LOAD_LOANS_QUERY, 'load_loans', rows=rows[i:i + batch_size])
+                loaded += result[0]['loaded'] if result else 0
+        return {'loaded': loaded, 'skipped': len(rows) - loaded}
+
+    def link_loan_properties(self, rows, batch_size=1000):
+        """Add SECURED_BY edges from Loan to Property nodes for (loan_id, property_id) rows; missing nodes are skipped."""
+        with METRICS.span('loan_load'), self.driver.session(database=self.database) as session:
+            for i in range(0, len(rows), batch_size):
+                self._run(session, LINK_LOAN_PROPERTIES_QUERY, 'link_loan_properties', rows=rows[i:i + batch_size])
+
+    def load_snapshot_delta(self, delta, batch_size=1000):
+        """
+        Apply a snapshot change set (see versioned_graph.SnapshotLedger.diff) in one transaction:
+        closed versions get valid_to = snapshot date, new versions start at it.
+        """
+        start = time.perf_counter()
+        statements = delta_statements(delta, batch_size)
+        with METRICS.span('snapshot_load'), self.driver.session(database=self.database) as session:
+            with session.begin_transaction() as tx:
+                for query, params in statements:
+                    tx.run(query, **params).consume()
+                tx.commit()
+        METRICS.inc('cypher_commands_total', len(statements))
+        logger.info(f"Loaded snapshot {delta['snapshot_date']} changes with {len(statements)} statements "
+                    f"in {time.perf_counter() - start:.2f}s: {summarize_delta(delta)}")
+
+    def write_collateral_overlaps(self, rows, replace=True, batch_size=1000):
+        """
+        Write SHARES_COLLATERAL_WITH edges between Deal nodes (see collateral_overlap.overlap_edge_rows).
+        With replace=True, edges from a previous analysis are removed first.
+        """
+        with METRICS.span('collateral_overlap_write'), self.driver.session(database=self.database) as session:
+            if replace:
+                self._run(session, "MATCH (:Deal)-[r:SHARES_COLLATERAL_WITH]->(:Deal) DELETE r", 'clear_collateral_overlaps')
+            for i in range(0, len(rows), batch_size):
+                self._run(session, SHARES_COLLATERAL_WITH_QUERY, 'write_collateral_overlaps', rows=rows[i:i + batch_size])
+        logger.info(f"Wrote {len(rows)} SHARES_COLLATERAL_WITH edges.")
+
+    def refresh_spatial_index(self):
+        """(Re)build the in-memory spatial index from geocoded Address nodes in the graph."""
+        from spatial_index import PropertySpatialIndex  # deferred: pulls in numpy
+        with self.driver.session(database=self.database) as session:
+            records = [record.data() for record in
+                       self._run(session, GEOCODED_PROPERTIES_QUERY, 'refresh_spatial_index')]
+        self._spatial_index = PropertySpatialIndex(records)
+        logger.info(f"Spatial index built over {len(self._spatial_index)} geocoded properties.")
+        return self._spatial_index
+
+    def deals_near(self, lat, lon, radius):
+        """Return deals with collateral within `radius` miles of (lat, lon), nearest first."""
+        if self._spatial_index is None:
+            self.refresh_spatial_index()
+        deals = self._spatial_index.deals_within(float(lat), float(lon), float(radius))
+        logger.info(f"Found {len(deals)} deals within {radius} miles of ({lat}, {lon}).")
+        return deals
+
+    def deals_near_address(self, address, radius):
+        """Return deals with collateral within `radius` miles of a geocoded property address."""
+        if self._spatial_index is None:
+            self.refresh_spatial_index()
+        location = self._spatial_index.locate(address)
+        if location is None:
+            logger.info(f"No geocoded location found for address '{address}'.")
+            return []
+        return self.deals_near(location[0], location[1], radius)
+
     def show_address_by_property_id(self, property_id):
         """Show the address for a given property ID."""
         with self.driver.session(database=self.database) as session:
             query = (
                 "MATCH (p {id: $property_id}) RETURN p.address AS address"
             )
-            result = session.run(query, property_id=property_id)
-            record = result.single()
+            result = self._run(session, query, 'show_address_by_property_id', property_id=property_id)
+            record = result[0] if result else None
             if record and record["address"]:
-                print(f"Address for property ID '{property_id}': {record['address']}")
+                logger.info(f"Address for property ID '{property_id}': {record['address']}")
                 return record["address"]
             else:
-                print(f"No address found for property ID '{property_id}'.")
+                logger.info(f"No address found for property ID '{property_id}'.")
                 return None
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     lister = DealLister(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,'gi-cmbs')
     lister.create_database("gi-cmbs")
     lister.execute_cypher_file('/Users/jackyfox/PycharmProjects/TWGglobal_fc/CMBS_Database/cmbs_graph_05591XAE1.cypher',database='gi-cmbs')
@@ -263,7 +656,7 @@ if __name__ == "__main__":
         # lister.list_properties_by_deal_id("deal:14")
         # lister.list_databases()
         re=lister.get_bloomberg_name_by_deal_id("14")
-        print(f"re:{re}")
+        logger.info(f"re:{re}")
         # lister.show_address_by_property_id("property:14:9218 Balcones Club Drive, Austin, TX")
         
         # Search for deals by an address
@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from entity_resolution import MinHashLSH, name_tokens
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_SUFFIXES = ('.txt', '.md', '.json')
+PROCESSED_DIRNAME = 'processed'
+QUEUE_FILENAME = 'queue.jsonl'
+DISCARDED_FILENAME = 'discarded.jsonl'
+# Street-suffix spellings folded together on both the holdings and the article side
+_STREET_ALIASES = {'ST': 'STREET', 'AVE': 'AVENUE', 'AV': 'AVENUE', 'BLVD': 'BOULEVARD', 'RD': 'ROAD',
+                   'DR': 'DRIVE', 'LN': 'LANE', 'PKWY': 'PARKWAY', 'HWY': 'HIGHWAY', 'CT': 'COURT', 'PL': 'PLACE',
+                   'N': 'NORTH', 'S': 'SOUTH', 'E': 'EAST', 'W': 'WEST'}
+_CUSIP_PATTERN = re.compile(r'\b[0-9]{3}[0-9A-Z]{5}[0-9]\b')
+_TOKEN_PATTERN = re.compile(r'[A-Z0-9]+')
+
+
+def read_article(path: str) -> Dict[str, Any]:
+    """
+    Load one article: a .json file with title/body (or text) fields, or a plain-text file whose first
+    non-empty line is the title.
+    """
+    with open(path, encoding='utf-8', errors='replace') as f:
+        raw = f.read()
+    article_id = os.path.splitext(os.path.basename(path))[0]
+    if path.endswith('.json'):
+        data = json.loads(raw)
+        title, text = data.get('title', ''), data.get('body') or data.get('text') or ''
+        article_id = str(data.get('id', article_id))
+    else:
+        lines = [line.strip() for line in raw.splitlines() if line.strip()]
+        title, text = (lines[0] if lines else ''), raw
+    return {'id': article_id, 'path': path, 'title': title, 'text': text}
+
+
+def text_tokens(text: str) -> List[str]:
+    """Upper-cased alphanumeric tokens with street suffixes spelled out."""
+    return [_STREET_ALIASES.get(t, t) for t in _TOKEN_PATTERN.findall(text.upper())]
+
+
+def phrase_tokens(text: Optional[str]) -> List[str]:
+    """
+    Tokens the holdings matcher compares, for holdings phrases and article text alike: entity-name tokens
+    (entity_resolution.name_tokens: legal forms and fillers dropped, abbreviations spelled out) with street
+    suffixes spelled out, so "Acme Hldgs Co." in an article matches the owner "ACME HOLDINGS, LLC".
+    """
+    return [_STREET_ALIASES.get(t, t) for t in name_tokens(text)]
+
+
+class NearDuplicateFilter:
+    """
+    Streaming near-duplicate detection with MinHash LSH over word shingles. Kept articles stay indexed
+    (up to capacity, oldest evicted first); an article is a duplicate when it shares an LSH band with an
+    indexed article and their signatures agree on at least threshold of the rows (estimated Jaccard).
+    """
+
+    def __init__(self, threshold: float = 0.7, shingle_size: int = 3, capacity: int = 20000,
+                 num_perm: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.capacity = capacity
+        self.lsh = MinHashLSH(num_perm, bands)
+        self._signatures: 'OrderedDict[str, Tuple[np.ndarray, np.ndarray]]' = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+
+    def _shingles(self, text: str) -> set:
+        tokens = text_tokens(text)
+        k = self.shingle_size
+        return {' '.join(tokens[i:i + k]) for i in range(max(1, len(tokens) - k + 1))} or {''}
+
+    def filter(self, articles: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Check a batch in order against the index and against earlier articles of the batch; unique articles are
+        indexed. An article is never a duplicate of its own id, so a batch retried after a failure is not
+        suppressed by its first attempt. Returns, per article, the id of the article it duplicates, or None.
+        """
+        if not articles:
+            return []
+        signatures = self.lsh.signatures([self._shingles(a['title'] + '\n' + a['text']) for a in articles])
+        band_keys = self.lsh.band_keys(signatures)
+        duplicate_of = []
+        for article, signature, keys in zip(articles, signatures, band_keys):
+            match = None
+            candidates = {c for band, key in enumerate(keys.tolist()) for c in self._buckets.get((band, key), ())}
+            for candidate in sorted(candidates - {article['id']}):
+                if np.mean(self._signatures[candidate][0] == signature) >= self.threshold:
+                    match = candidate
+                    break
+            duplicate_of.append(match)
+            if match is None:
+                self._add(article['id'], signature, keys)
+        return duplicate_of
+
+    def _add(self, article_id: str, signature: np.ndarray, keys: np.ndarray) -> None:
+        if article_id in self._signatures:
+            self._remove(article_id)
+        self._signatures[article_id] = (signature, keys)
+        for band, key in enumerate(keys.tolist()):
+            self._buckets[(band, key)].append(article_id)
+        while len(self._signatures) > self.capacity:
+            self._remove(next(iter(self._signatures)))
+
+    def _remove(self, article_id: str) -> None:
+        _, keys = self._signatures.pop(article_id)
+        for band, key in enumerate(keys.tolist()):
+            bucket = self._buckets[(band, key)]
+            bucket.remove(article_id)
+            if not bucket:
+                del self._buckets[(band, key)]
+
+
+class HoldingsMatcher:
+    """
+    Phrase index over the holdings: Bloomberg deal names, street addresses, property names and owner names of
+    every held CUSIP's collateral, plus the held CUSIPs themselves. An article is scanned once, looking up each
+    of its token n-grams whose length occurs in the index.
+    """
+
+    def __init__(self, phrases: Dict[str, List[Tuple[str, str, Tuple[str, ...], Tuple[str, ...]]]],
+                 cusips: Dict[str, str]):
+        """
+        Args:
+            phrases: Token phrase -> (kind, display text, deal ids, CUSIPs) entries
+            cusips: Held CUSIP -> deal id
+        """
+        self.phrases = phrases
+        self.cusips = cusips
+        self.lengths = sorted({len(p.split()) for p in phrases})
+
+    @classmethod
+    def from_handler(cls, db_handler, min_name_tokens: int = 2) -> 'HoldingsMatcher':
+        """
+        Build the index from CMBSDatabaseHandler.get_holdings_collateral and the deals table. Every phrase is
+        tokenized by phrase_tokens, as article text is in match(). Names shorter than min_name_tokens tokens
+        (after dropping legal forms) are too generic to match on.
+        """
+        collateral = db_handler.get_holdings_collateral()
+        deals = db_handler.get_deals()
+        bloomberg = dict(zip(deals['deal_id'].astype(str), deals['bloomberg_name'])) if not deals.empty else {}
+        entries: Dict[Tuple[str, str, str], Tuple[set, set]] = defaultdict(lambda: (set(), set()))
+        cusips = {}
+        for row in collateral.itertuples(index=False):
+            deal_id = str(row.deal_id)
+            cusips[row.cusip] = deal_id
+            candidates = [('deal', bloomberg.get(deal_id), phrase_tokens(bloomberg.get(deal_id))),
+                          ('address', row.address, phrase_tokens((row.address or '').split(',')[0])),
+                          ('property', row.prop_name, phrase_tokens(row.prop_name)),
+                          ('owner', row.owner_name, phrase_tokens(row.owner_name))]
+            for kind, text, tokens in candidates:
+                if not text or len(tokens) < min_name_tokens:
+                    continue
+                if kind == 'address' and not tokens[0].isdigit():
+                    continue
+                deal_ids, held = entries[(' '.join(tokens), kind, text)]
+                deal_ids.add(deal_id)
+                held.add(row.cusip)
+        phrases: Dict[str, list] = defaultdict(list)
+        for (phrase, kind, text), (deal_ids, held) in entries.items():
+            phrases[phrase].append((kind, text, tuple(sorted(deal_ids)), tuple(sorted(held))))
+        logger.info(f"Holdings matcher: {len(phrases)} phrases over {len(cusips)} held CUSIPs")
+        return cls(dict(phrases), cusips)
+
+    def match(self, text: str) -> List[Dict[str, Any]]:
+        """Holdings mentioned in a text, one entry per matched phrase."""
+        matches, seen = [], set()
+        for cusip in set(_CUSIP_PATTERN.findall(text.upper())):
+            if cusip in self.cusips:
+                matches.append({'kind': 'cusip', 'text': cusip, 'deal_ids': [self.cusips[cusip]], 'cusips': [cusip]})
+        tokens = phrase_tokens(text)
+        for i in range(len(tokens)):
+            for n in self.lengths:
+                if i + n > len(tokens):
+                    break
+                phrase = ' '.join(tokens[i:i + n])
+                if phrase in seen:
+                    continue
+                for kind, display, deal_ids, held in self.phrases.get(phrase, ()):
+                    seen.add(phrase)
+                    matches.append({'kind': kind, 'text': display, 'deal_ids': list(deal_ids), 'cusips': list(held)})
+        return matches
+
+
+_worker_matcher: Optional[HoldingsMatcher] = None
+
+
+def _init_worker(matcher: HoldingsMatcher) -> None:
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _match_article(article: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    matches = _worker_matcher.match(article['title'] + '\n' + article['text'])
+    return {**article, 'matches': matches,
+            'cusips': sorted({c for m in matches for c in m['cusips']}),
+            'deal_ids': sorted({d for m in matches for d in m['deal_ids']}),
+            'match_ms': round((time.perf_counter() - start) * 1000.0, 3)}
+
+
+def _percentiles(values: Iterable[float]) -> Dict[str, float]:
+    values = np.asarray(list(values), dtype=float)
+    if not len(values):
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2), 'max_ms': round(float(values.max()), 2)}
+
+
+class NewsBatchProcessor:
+    """
+    Batch news triage ahead of the LLM analyst step (prompt.txt): articles dropped into input_dir are read,
+    near-duplicates suppressed, the rest matched against the holdings on a worker pool, and the unique
+    articles that mention a holding appended to output_dir/queue.jsonl. Duplicates and irrelevant articles
+    go to discarded.jsonl; processed inputs move to input_dir/processed, prefixed with the batch time.
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, matcher: HoldingsMatcher,
+                 dedup: Optional[NearDuplicateFilter] = None, workers: int = 4, batch_size: int = 500,
+                 settle_s: float = 0.5):
+        """
+        Args:
+            input_dir (str): Directory watched for articles (ARTICLE_SUFFIXES)
+            output_dir (str): Directory of the queue and discarded JSONL files
+            matcher (HoldingsMatcher): Holdings index, shipped once to each worker
+            dedup (Optional[NearDuplicateFilter]): Near-duplicate filter kept across batches
+            workers (int): Worker processes; 0 matches in this process
+            batch_size (int): Most articles taken per batch
+            settle_s (float): Files modified more recently than this are left for the next poll (still being written)
+        """
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.processed_dir = os.path.join(input_dir, PROCESSED_DIRNAME)
+        self.matcher = matcher
+        self.dedup = dedup or NearDuplicateFilter()
+        self.batch_size = batch_size
+        self.settle_s = settle_s
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.processed_dir, exist_ok=True)
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(matcher,)) if workers else None
+        if self.pool is None:
+            _init_worker(matcher)
+        else:
+            # Start the workers (and ship them the matcher) now rather than inside the first batch's latency
+            list(self.pool.map(abs, range(workers)))
+        self.totals = {'articles': 0, 'duplicates': 0, 'relevant': 0, 'irrelevant': 0, 'failed': 0, 'seconds': 0.0}
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def pending(self) -> List[str]:
+        """Settled article files waiting in the input directory, oldest first."""
+        now = time.time()
+        entries = [e for e in os.scandir(self.input_dir)
+                   if e.is_file() and e.name.endswith(ARTICLE_SUFFIXES) and now - e.stat().st_mtime >= self.settle_s]
+        return [e.path for e in sorted(entries, key=lambda e: (e.stat().st_mtime, e.name))][:self.batch_size]
+
+    def process_batch(self, paths: List[str]) -> Dict[str, Any]:
+        """
+        Process a batch of article files.
+        Returns:
+            Dict[str, Any]: Counts, throughput and per-article latency (pickup to output) of the batch
+        """
+        picked_up = time.perf_counter()
+        articles, failed = [], 0
+        for path in paths:
+            try:
+                articles.append(read_article(path))
+            except (OSError, ValueError, AttributeError) as e:
+                # AttributeError: a .json file whose top level is not an object
+                failed += 1
+                METRICS.inc('errors_total', stage='news_read')
+                logger.warning(f"Skipping unreadable article {path}: {e}")
+        with METRICS.span('news_dedup'):
+            duplicate_of = self.dedup.filter(articles)
+        unique = [a for a, dup in zip(articles, duplicate_of) if dup is None]
+        # Results are written as they arrive, so an article's latency does not wait for the whole batch
+        results = self.pool.map(_match_article, unique, chunksize=4) if self.pool else map(_match_article, unique)
+
+        latencies, match_ms, relevant = [], [], 0
+        with open(os.path.join(self.output_dir, QUEUE_FILENAME), 'a', encoding='utf-8') as queue, \
+                open(os.path.join(self.output_dir, DISCARDED_FILENAME), 'a', encoding='utf-8') as discarded:
+            for article, dup in zip(articles, duplicate_of):
+                if dup is not None:
+                    discarded.write(json.dumps({'id': article['id'], 'path': article['path'], 'reason': 'duplicate',
+                                                'duplicate_of': dup}, ensure_ascii=False) + '\n')
+            for result in results:
+                latency_ms = (time.perf_counter() - picked_up) * 1000.0
+                if result['matches']:
+                    relevant += 1
+                    queue.write(json.dumps({**result, 'latency_ms': round(latency_ms, 3)}, ensure_ascii=False) + '\n')
+                else:
+                    discarded.write(json.dumps({'id': result['id'], 'path': result['path'], 'reason': 'irrelevant'},
+                                               ensure_ascii=False) + '\n')
+                latencies.append(latency_ms)
+                match_ms.append(result['match_ms'])
+                METRICS.observe('news_article', latency_ms / 1000.0)
+        # Prefixed with the time and a random suffix, so a later article with the same file name never
+        # overwrites an earlier one
+        prefix = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}-"
+        for path in paths:
+            if os.path.exists(path):
+                shutil.move(path, os.path.join(self.processed_dir, prefix + os.path.basename(path)))
+
+        seconds = time.perf_counter() - picked_up
+        stats = {'articles': len(articles), 'duplicates': len(articles) - len(unique), 'relevant': relevant,
+                 'irrelevant': len(unique) - relevant, 'failed': failed, 'seconds': round(seconds, 3),
+                 'articles_per_s': round(len(articles) / seconds, 1) if seconds else 0.0,
+                 'match_ms': _percentiles(match_ms), 'latency': _percentiles(latencies)}
+        for key in ('articles', 'duplicates', 'relevant', 'irrelevant', 'failed', 'seconds'):
+            self.totals[key] += stats[key]
+        METRICS.inc('news_articles_total', len(articles))
+        METRICS.inc('news_duplicates_total', stats['duplicates'])
+        METRICS.inc('news_relevant_total', relevant)
+        logger.info(f"Batch of {len(articles)} articles in {seconds:.2f}s ({stats['articles_per_s']}/s): "
+                    f"{stats['duplicates']} duplicates, {relevant} relevant, p95 latency {stats['latency']['p95_ms']} ms")
+        return stats
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Process the pending articles (one batch); None when there are none."""
+        paths = self.pending()
+        return self.process_batch(paths) if paths else None
+
+    def watch(self, poll_interval: float = 2.0, max_idle_polls: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Poll the input directory and process articles as they arrive, until interrupted or, with max_idle_polls,
+        until that many consecutive polls found nothing. Returns the run totals.
+        """
+        idle = 0
+        try:
+            while max_idle_polls is None or idle < max_idle_polls:
+                if self.run_once() is None:
+                    idle += 1
+                    if max_idle_polls is None or idle < max_idle_polls:
+                        time.sleep(poll_interval)
+                else:
+                    idle = 0
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
+        seconds = self.totals['seconds']
+        return {**self.totals, 'articles_per_s': round(self.totals['articles'] / seconds, 1) if seconds else 0.0}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Watch a directory of news articles, suppress near-duplicates and '
+                                                 'queue the articles that mention held securities.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database (holdings)')
+    parser.add_argument('input_dir', help='Directory the articles are dropped into')
+    parser.add_argument('--output-dir', default=None, help='Queue directory (default: <input_dir>/out)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Matching processes (0: inline)')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--threshold', type=float, default=0.7, help='Estimated Jaccard similarity of a duplicate')
+    parser.add_argument('--poll', type=float, default=2.0, help='Seconds between directory polls')
+    parser.add_argument('--once', action='store_true', help='Process what is pending and exit')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    processor = NewsBatchProcessor(args.input_dir, args.output_dir or os.path.join(args.input_dir, 'out'),
+                                   HoldingsMatcher.from_handler(CMBSDatabaseHandler(args.db_path)),
+                                   NearDuplicateFilter(args.threshold), workers=args.workers,
+                                   batch_size=args.batch_size, settle_s=0.0 if args.once else 0.5)
+    try:
+        totals = processor.watch(args.poll, max_idle_polls=1 if args.once else None)
+    finally:
+        processor.close()
+    print(json.dumps(totals, indent=2))
@@ -0,0 +1,146 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.optimized.sqlite'
+
+# Columns copied per table and the covering indexes that serve CMBSDatabaseHandler's lookups.
+# Each index leads with the lookup key and carries every selected column, so lookups never touch the table.
+SIDECAR_TABLES: Dict[str, Tuple[List[str], List[Tuple[str, List[str]]]]] = {
+    'account_holding': (
+        ['cusip', 'ult_issuer_name'],
+        [('idx_account_holding_cusip', ['cusip', 'ult_issuer_name'])],
+    ),
+    'deal_tranche': (
+        ['tr_cusip', 'deal_id'],
+        [('idx_deal_tranche_cusip', ['tr_cusip', 'deal_id'])],
+    ),
+    'deals': (
+        ['deal_id', 'bloomberg_name'],
+        [('idx_deals_deal_id', ['deal_id', 'bloomberg_name'])],
+    ),
+    'propinfo': (
+        ['deal_id', 'address', 'state', 'year_built', 'trustee_prop_type_full', 'msa_name', 'prop_name',
+         'owner_name', 'owner_type'],
+        [('idx_propinfo_deal_id', ['deal_id', 'address', 'state', 'year_built', 'trustee_prop_type_full',
+                                   'msa_name', 'prop_name', 'owner_name', 'owner_type']),
+         ('idx_propinfo_address', ['address', 'state'])],
+    ),
+}
+
+
+def sidecar_path_for(db_path: str) -> str:
+    """Default location of the optimized working copy: next to the snapshot, e.g. CMBS_H_20250430.optimized.sqlite."""
+    return f"{db_path}{SIDECAR_SUFFIX}"
+
+
+def snapshot_fingerprint(db_path: str) -> str:
+    """Cheap identity of a snapshot file (size and modification time), stored in the sidecar to detect changes."""
+    stat = os.stat(db_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_sidecar_fresh(db_path: str, sidecar_path: Optional[str] = None) -> bool:
+    """
+    Check whether the sidecar exists and was built from the current snapshot.
+    Returns:
+        bool: True if the sidecar can be used as is
+    """
+    sidecar_path = sidecar_path or sidecar_path_for(db_path)
+    if not os.path.exists(sidecar_path):
+        return False
+    conn = None
+    try:
+        conn = sqlite3.connect(f"file:{sidecar_path}?mode=ro", uri=True)
+        row = conn.execute("SELECT value FROM sidecar_meta WHERE key = 'fingerprint'").fetchone()
+        return bool(row) and row[0] == snapshot_fingerprint(db_path)
+    except sqlite3.Error:
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def build_optimized_copy(db_path: str, sidecar_path: Optional[str] = None) -> str:
+    """
+    Copy the columns the handler needs from an Intex snapshot into an indexed, analyzed and vacuumed SQLite file.
+    The copy is built in a temporary file and moved into place, so readers never see a half-built sidecar.
+    Args:
+        db_path (str): Path to the Intex SQLite snapshot
+        sidecar_path (Optional[str]): Output path; defaults to sidecar_path_for(db_path)
+    Returns:
+        str: Path to the sidecar file
+    """
+    sidecar_path = sidecar_path or sidecar_path_for(db_path)
+    tmp_path = f"{sidecar_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    start = time.perf_counter()
+    fingerprint = snapshot_fingerprint(db_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("ATTACH DATABASE ? AS src", (db_path,))
+        for table, (columns, indexes) in SIDECAR_TABLES.items():
+            source_columns = {row[1] for row in conn.execute(f"PRAGMA src.table_info({table})")}
+            if not source_columns:
+                logger.warning(f"The '{table}' table was not found in {db_path}; skipping.")
+                continue
+            present = [c for c in columns if c in source_columns]
+            column_list = ", ".join(present)
+            # Insert in key order so rows of one deal/CUSIP are also contiguous in the table
+            conn.execute(f"CREATE TABLE main.{table} AS SELECT {column_list} FROM src.{table} ORDER BY {present[0]}")
+            for index_name, index_columns in indexes:
+                index_columns = [c for c in index_columns if c in source_columns]
+                if index_columns:
+                    conn.execute(f"CREATE INDEX main.{index_name} ON {table} ({', '.join(index_columns)})")
+            rows = conn.execute(f"SELECT count(*) FROM main.{table}").fetchone()[0]
+            logger.info(f"Copied {rows} rows of {table} ({column_list}).")
+        conn.execute("CREATE TABLE main.sidecar_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO main.sidecar_meta VALUES (?, ?)", [
+            ('source_path', os.path.abspath(db_path)),
+            ('fingerprint', fingerprint),
+            ('built_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ])
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, sidecar_path)
+    METRICS.observe('sidecar_build', time.perf_counter() - start)
+    logger.info(f"Optimized working copy written to {sidecar_path} in {time.perf_counter() - start:.2f}s")
+    return sidecar_path
+
+
+def ensure_optimized_copy(db_path: str, sidecar_path: Optional[str] = None) -> str:
+    """Return the sidecar path, (re)building it if it is missing or was built from a different snapshot."""
+    sidecar_path = sidecar_path or sidecar_path_for(db_path)
+    if is_sidecar_fresh(db_path, sidecar_path):
+        return sidecar_path
+    return build_optimized_copy(db_path, sidecar_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Build the optimized, indexed working copy of an Intex snapshot.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--output', default=None, help='Sidecar path (default: <db_path>.optimized.sqlite)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the sidecar is up to date')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.force:
+        build_optimized_copy(args.db_path, args.output)
+    else:
+        ensure_optimized_copy(args.db_path, args.output)
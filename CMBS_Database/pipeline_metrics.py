@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+# Labels are stored as a sorted tuple of (key, value) pairs so they can be used as dict keys
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape a label value for the Prometheus text format: backslash, double quote and line feed."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process registry of counters and timing spans, rendered in Prometheus text format.
+
+    Counters are monotonically increasing totals (rows, nodes, edges, errors). Spans record how
+    often a stage ran and how long it took in total, exposed as Prometheus summaries (_count/_sum).
+    """
+
+    def __init__(self, namespace: str = "cmbs"):
+        """
+        Args:
+            namespace (str): Prefix for every exported metric name
+        """
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._timings: Dict[str, Dict[LabelKey, list]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Increase a counter, e.g. inc('rows_fetched_total', 120, table='propinfo')."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one timed execution of a stage."""
+        key = _label_key(labels)
+        with self._lock:
+            stats = self._timings.setdefault(name, {}).setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """
+        Time the enclosed block as stage `name`. Exceptions are counted in errors_total{stage=name} and re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('errors_total', stage=name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """Return a plain-dict copy of all counters and timings, e.g. for JSON logging or benchmarks."""
+        with self._lock:
+            return {
+                'counters': {name: {_format_labels(k): v for k, v in series.items()}
+                             for name, series in self._counters.items()},
+                'timings': {name: {_format_labels(k): {'count': s[0], 'sum_seconds': s[1], 'max_seconds': s[2]}
+                                   for k, s in series.items()}
+                            for name, series in self._timings.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            for name in sorted(self._timings):
+                metric = f"{self.namespace}_{name}_seconds"
+                lines.append(f"# TYPE {metric} summary")
+                for labels, (count, total, _) in sorted(self._timings[name].items()):
+                    lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+                    lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"# TYPE {metric}_max gauge")
+                for labels, (_, _, longest) in sorted(self._timings[name].items()):
+                    lines.append(f"{metric}_max{_format_labels(labels)} {longest:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> str:
+        """
+        Write the metrics to a file (e.g. for the node_exporter textfile collector).
+        The file is written atomically so a scraper never reads a partial file.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+
+# Process-wide default registry shared by the batch pipeline, DealLister and the MCP server
+METRICS = MetricsRegistry()
+
+
+def serve_metrics(port: int, registry: MetricsRegistry = METRICS, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics in Prometheus text format from a daemon thread.
+    Args:
+        port (int): Port to listen on
+        registry (MetricsRegistry): Registry to expose
+        host (str): Interface to bind; local only by default, e.g. "0.0.0.0" for a remote scraper
+    Returns:
+        ThreadingHTTPServer: The running server (call shutdown() to stop it)
+    """
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,213 @@
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_LOG = 'slow_queries.jsonl'
+
+# Queries with side effects are never re-run under PROFILE. CALL { ... } / CALL (x) { ... } subqueries are reads
+# unless they contain a write clause themselves; procedure calls may write.
+_WRITE_CLAUSES = re.compile(r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|CALL\s+[A-Za-z_])",
+                            re.IGNORECASE)
+# Administration and schema commands cannot run under PROFILE at all
+_ADMIN_COMMANDS = re.compile(
+    r"^\s*(SHOW|DROP|ALTER|START|STOP|GRANT|DENY|REVOKE|"
+    r"CREATE\s+(OR\s+REPLACE\s+)?"
+    r"(DATABASE|ALIAS|USER|ROLE|CONSTRAINT|((RANGE|TEXT|POINT|LOOKUP|FULLTEXT|VECTOR)\s+)?INDEX))\b",
+    re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+
+
+def query_shape(query: str) -> str:
+    """
+    Reduce a Cypher query to its shape: literals replaced by '?' and whitespace collapsed,
+    so the same query with different inlined values is aggregated together.
+    """
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return " ".join(shape.split())
+
+
+def is_read_only(query: str) -> bool:
+    return not _WRITE_CLAUSES.search(query)
+
+
+def is_profilable(query: str) -> bool:
+    return not _ADMIN_COMMANDS.search(query)
+
+
+def _plan_tree(plan: Optional[dict]) -> Optional[dict]:
+    """Keep the useful parts of a PROFILE plan: operator, db hits, rows, details and children."""
+    if not plan:
+        return None
+    args = plan.get('args', {}) or {}
+    node = {
+        'operator': plan.get('operatorType'),
+        'dbHits': plan.get('dbHits', 0),
+        'rows': plan.get('rows', 0),
+    }
+    if args.get('Details'):
+        node['details'] = args['Details']
+    children = [_plan_tree(child) for child in plan.get('children', []) or []]
+    if children:
+        node['children'] = children
+    return node
+
+
+def total_db_hits(plan: Optional[dict]) -> int:
+    """Sum db hits over every operator of a (raw or trimmed) PROFILE plan."""
+    if not plan:
+        return 0
+    own = plan.get('dbHits', 0) or 0
+    return own + sum(total_db_hits(child) for child in plan.get('children', []) or [])
+
+
+class QueryProfiler:
+    """
+    Opt-in profiling hook for DealLister.
+
+    Every query is recorded with its wall time, row count and result counters. Queries slower than
+    `slow_ms` are re-run once under PROFILE (read-only queries only) and written, with their plan and
+    db hits, to a JSONL slow-query log. With profile_all=True every query (writes included, they still
+    run only once) is executed under PROFILE, so db hits are recorded for all of them; only
+    administration and schema commands, which cannot be profiled, are left without. By default db_hits is
+    therefore None for queries under the slow threshold.
+    """
+
+    def __init__(self, slow_ms: float = 100.0, log_path: Optional[str] = DEFAULT_SLOW_QUERY_LOG,
+                 profile_all: bool = False, log_all: bool = False):
+        """
+        Args:
+            slow_ms (float): Wall-time threshold above which a query counts as slow
+            log_path (Optional[str]): JSONL file for slow queries (None keeps records in memory only)
+            profile_all (bool): Run every query under PROFILE instead of re-running only slow reads
+            log_all (bool): Also write fast queries to the log, so `report` covers total time of every shape
+        """
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.profile_all = profile_all
+        self.log_all = log_all
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def run(self, session, query: str, tag: str, params: Dict[str, Any]) -> list:
+        """
+        Execute a query through the profiler and return its records.
+        Args:
+            session: Open neo4j session
+            query (str): Cypher query
+            tag (str): Name of the calling DealLister method
+            params (Dict[str, Any]): Query parameters
+        Returns:
+            list: The query's records
+        """
+        profiled = self.profile_all and is_profilable(query)
+        start = time.perf_counter()
+        result = session.run(f"PROFILE {query}" if profiled else query, **params)
+        records = list(result)
+        summary = result.consume()
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        plan = summary.profile if profiled else None
+
+        slow = elapsed_ms >= self.slow_ms
+        if slow and plan is None and is_read_only(query):
+            try:
+                plan = session.run(f"PROFILE {query}", **params).consume().profile
+            except Exception as e:
+                logger.warning(f"Could not PROFILE slow query '{tag}': {e}")
+
+        entry = {
+            'ts': round(time.time(), 3),
+            'tag': tag,
+            'shape': query_shape(query),
+            'wall_ms': round(elapsed_ms, 3),
+            'server_ms': (summary.result_available_after or 0) + (summary.result_consumed_after or 0),
+            'rows': len(records),
+            'counters': {k: v for k, v in vars(summary.counters).items() if not k.startswith('_') and v},
+            'db_hits': total_db_hits(plan) if plan is not None else None,
+            'slow': slow,
+        }
+        if slow:
+            entry['params'] = {k: v if isinstance(v, (str, int, float, bool)) or v is None else str(v)
+                               for k, v in params.items()}
+            entry['plan'] = _plan_tree(plan)
+            logger.warning(f"Slow query '{tag}': {entry['wall_ms']} ms, {entry['rows']} rows, db hits {entry['db_hits']}")
+        self._record(entry)
+        return records
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries.append(entry)
+            if self.log_path and (entry['slow'] or self.log_all):
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+
+    def report(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Rank the query shapes recorded in this process by total time."""
+        return rank_query_shapes(self.entries, limit)
+
+
+def rank_query_shapes(entries: List[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Aggregate query records by shape and rank them by total wall time.
+    Returns:
+        List[Dict[str, Any]]: One row per shape with calls, total/mean/p95/max ms, rows, db hits and slow count
+    """
+    by_shape: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        stats = by_shape.setdefault(entry['shape'], {
+            'shape': entry['shape'], 'tags': set(), 'times': [], 'rows': 0, 'db_hits': 0, 'slow': 0})
+        stats['tags'].add(entry.get('tag'))
+        stats['times'].append(entry['wall_ms'])
+        stats['rows'] += entry.get('rows', 0)
+        stats['db_hits'] += entry.get('db_hits') or 0
+        stats['slow'] += 1 if entry.get('slow') else 0
+    ranking = []
+    for stats in by_shape.values():
+        times = sorted(stats.pop('times'))
+        stats['tags'] = sorted(t for t in stats['tags'] if t)
+        stats.update(calls=len(times), total_ms=round(sum(times), 3), mean_ms=round(sum(times) / len(times), 3),
+                     p95_ms=times[min(len(times) - 1, int(0.95 * len(times)))], max_ms=times[-1])
+        ranking.append(stats)
+    ranking.sort(key=lambda s: s['total_ms'], reverse=True)
+    return ranking[:limit]
+
+
+def load_query_log(log_path: str) -> List[Dict[str, Any]]:
+    with open(log_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_report(ranking: List[Dict[str, Any]]) -> None:
+    print(f"{'total_ms':>10} {'calls':>6} {'mean_ms':>9} {'p95_ms':>9} {'max_ms':>9} {'db_hits':>9} {'slow':>5}  shape")
+    for stats in ranking:
+        shape = stats['shape'] if len(stats['shape']) <= 100 else stats['shape'][:97] + '...'
+        print(f"{stats['total_ms']:>10.1f} {stats['calls']:>6} {stats['mean_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['max_ms']:>9.2f} {stats['db_hits']:>9} {stats['slow']:>5}  {shape}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Rank DealLister query shapes from a slow-query log.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help='Rank query shapes by total time')
+    report_parser.add_argument('log', nargs='?', default=DEFAULT_SLOW_QUERY_LOG, help='JSONL query log')
+    report_parser.add_argument('--limit', type=int, default=20)
+    report_parser.add_argument('--plans', action='store_true', help='Also print the slowest PROFILE plan per shape')
+    args = parser.parse_args()
+
+    entries = load_query_log(args.log)
+    ranking = rank_query_shapes(entries, args.limit)
+    print_report(ranking)
+    if args.plans:
+        for stats in ranking:
+            slowest = max((e for e in entries if e['shape'] == stats['shape'] and e.get('plan')),
+                          key=lambda e: e['wall_ms'], default=None)
+            if slowest:
+                print(f"\n--- {stats['shape'][:100]} ({slowest['wall_ms']} ms) ---")
+                print(json.dumps(slowest['plan'], indent=2))
@@ -0,0 +1,120 @@
+import dataclasses
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Type
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class PropertyRecord:
+    """A collateral property as returned by DealLister (Property node id = its address string)."""
+    id: str
+    name: Optional[str] = None
+    address: Optional[str] = None
+    valid_from: Optional[str] = None
+    valid_to: Optional[str] = None
+
+
+@dataclass(slots=True)
+class DealRecord:
+    """A deal as returned by DealLister, with the ids of the properties that matched the lookup."""
+    id: str
+    bloomberg: Optional[str] = None
+    cusip: Optional[str] = None
+    property_ids: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class TrancheRecord:
+    """A tranche of a deal (Tranche node keyed by CUSIP) with its holding flags."""
+    cusip: str
+    deal_id: Optional[str] = None
+    name: Optional[str] = None
+    rating: Optional[str] = None
+    balance: Optional[float] = None
+    held: bool = False
+    positions: int = 0
+
+
+def project(records: Iterable, record_type: Type) -> list:
+    """
+    Convert driver records to record_type instances in a single pass over the result. Columns named and ordered
+    like the leading dataclass fields are passed positionally; any other column set goes by name.
+    """
+    names = tuple(f.name for f in dataclasses.fields(record_type))
+    projected, positional = [], None
+    for record in records:
+        if positional is None:
+            keys = tuple(record.keys())
+            positional = keys == names[:len(keys)]
+        projected.append(record_type(*record) if positional else record_type(**dict(zip(keys, record))))
+    return projected
+
+
+def deal_id_order(deal_id) -> tuple:
+    """Sort key of deal ids: numeric ids in numeric order ('9' before '10'), then any others alphabetically."""
+    deal_id = str(deal_id)
+    return (0, int(deal_id), '') if deal_id.isdigit() else (1, 0, deal_id)
+
+
+def _default(obj):
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    return str(obj)
+
+
+def to_json(value) -> str:
+    """
+    Compact JSON for tool responses; dataclasses are encoded natively by orjson when it is installed.
+    A str is what FastMCP passes through as a single text block, without its own generic conversion.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default).decode()
+    return json.dumps(value, default=_default, separators=(',', ':'), ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import pydantic_core
+    from neo4j import Record
+    from neo4j.graph import Graph, Node
+    parser = argparse.ArgumentParser(description='Serialization cost per 1k records: raw Node results with '
+                                                 'generic conversion vs projected records with to_json.')
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    graph = Graph()
+    raw = [Record(zip(['p'], [Node(graph, f'4:x:{i}', i, ['Property'], {'id': f'{i} Main Street, Dallas, TX'})]))
+           for i in range(args.records)]
+    projected = [Record(zip(['id', 'name', 'address'],
+                            [f'{i} Main Street, Dallas, TX', f'Main Street Office {i}', f'{i} Main Street, Dallas, TX']))
+                 for i in range(args.records)]
+
+    def before():
+        # Previous path: materialize the result, keep the Node objects, log each one and let FastMCP
+        # convert the list generically (one text block per item, nodes rendered through str())
+        nodes = [record['p'] for record in list(raw)]
+        for node in nodes:
+            logger.debug(dict(node))
+        return [pydantic_core.to_json(node, fallback=str, indent=2).decode() for node in nodes]
+
+    def after():
+        return to_json(project(projected, PropertyRecord))
+
+    for name, func in (('before', before), ('after', after)):
+        func()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            func()
+        per_1k = (time.perf_counter() - start) / args.repeat * 1000.0 * 1000.0 / args.records
+        print(f"{name:<7} {per_1k:8.3f} ms per 1k records")
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
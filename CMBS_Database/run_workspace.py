@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'manifest.json'
+DEFAULT_RUNS_DIRNAME = 'runs'
+# Artifact kinds that are run deliverables rather than intermediates
+DELIVERABLE_KINDS = ('combined_csv', 'excel', 'lookup_tables', 'exposure_rollups', 'metrics')
+
+
+class RunWorkspace:
+    """
+    Directory owned by one pipeline run, with a manifest of every artifact the run produced.
+    Combining and cleanup read the manifest instead of scanning directories, so they cost O(outputs),
+    and runs for different snapshots (or the same one) never touch each other's files.
+    """
+
+    def __init__(self, directory: str, manifest: Optional[Dict[str, Any]] = None):
+        self.dir = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        self.manifest = manifest or {'run_id': os.path.basename(directory), 'created_at': time.time(),
+                                     'status': 'running', 'artifacts': []}
+
+    @classmethod
+    def create(cls, base_dir: str, snapshot: str = 'run') -> 'RunWorkspace':
+        """
+        Create a fresh workspace under base_dir/runs, named after the snapshot, the time and a random suffix.
+        """
+        run_id = f"{snapshot}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(base_dir, DEFAULT_RUNS_DIRNAME, run_id)
+        os.makedirs(directory)
+        workspace = cls(directory)
+        workspace.manifest['snapshot'] = snapshot
+        workspace.save()
+        logger.info(f"Run workspace: {directory}")
+        return workspace
+
+    @classmethod
+    def open(cls, directory: str) -> 'RunWorkspace':
+        """Open the workspace of an earlier run from its manifest."""
+        with open(os.path.join(directory, MANIFEST_FILENAME), encoding='utf-8') as f:
+            return cls(directory, json.load(f))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def register(self, path: str, kind: str, save: bool = False) -> str:
+        """Record an artifact written into the workspace; save=True persists the manifest right away."""
+        self.manifest['artifacts'].append({'path': os.path.relpath(path, self.dir), 'kind': kind})
+        if save:
+            self.save()
+        return path
+
+    def artifacts(self, kinds: Optional[Iterable[str]] = None) -> List[str]:
+        kinds = set(kinds) if kinds is not None else None
+        return [os.path.join(self.dir, a['path']) for a in self.manifest['artifacts']
+                if kinds is None or a['kind'] in kinds]
+
+    def save(self, status: Optional[str] = None) -> None:
+        """Write the manifest atomically."""
+        if status:
+            self.manifest['status'] = status
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def combine_csv(self, kind: str, output_name: str) -> Optional[str]:
+        """Concatenate the CSV artifacts of a kind (header of the first only) into a registered combined_csv."""
+        inputs = sorted(self.artifacts([kind]))
+        if not inputs:
+            logger.warning(f"No {kind} artifacts in {self.dir}")
+            return None
+        output_file = self.path(output_name)
+        with open(output_file, 'w', encoding='utf-8') as outfile:
+            for n, input_file in enumerate(inputs):
+                with open(input_file, encoding='utf-8') as infile:
+                    if n:
+                        infile.readline()
+                    outfile.writelines(infile)
+        logger.info(f"Combined {len(inputs)} {kind} artifacts into {output_file}")
+        return self.register(output_file, 'combined_csv', save=True)
+
+    def cleanup(self, keep_kinds: Iterable[str] = DELIVERABLE_KINDS) -> int:
+        """
+        Delete the run's intermediate artifacts listed in the manifest, keeping the deliverable kinds.
+        Returns:
+            int: Number of files removed
+        """
+        keep_kinds = set(keep_kinds)
+        kept, removed = [], 0
+        for artifact in self.manifest['artifacts']:
+            path = os.path.join(self.dir, artifact['path'])
+            if artifact['kind'] in keep_kinds:
+                kept.append(artifact)
+                continue
+            for suffix in ('', '-wal', '-shm') if path.endswith('.sqlite') else ('',):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+                    removed += 1
+        self.manifest['artifacts'] = kept
+        self.save(status='cleaned')
+        logger.info(f"Removed {removed} files from {self.dir}, kept {len(kept)} deliverables")
+        return removed
+
+
+def latest_artifact(base_dir: str, kind: str, exclude: Optional[str] = None) -> Optional[str]:
+    """
+    Newest artifact of a kind still present in an earlier run under base_dir/runs, e.g. to seed an incremental
+    refresh. Runs that did not complete are ignored.
+    Args:
+        base_dir (str): Directory holding the runs/ directory
+        kind (str): Artifact kind
+        exclude (Optional[str]): Workspace directory to skip (the current run)
+    Returns:
+        Optional[str]: Path of the artifact, or None
+    """
+    runs_dir = os.path.join(base_dir, DEFAULT_RUNS_DIRNAME)
+    if not os.path.isdir(runs_dir):
+        return None
+    candidates = []
+    with os.scandir(runs_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir() or (exclude and os.path.abspath(entry.path) == os.path.abspath(exclude)):
+                continue
+            try:
+                workspace = RunWorkspace.open(entry.path)
+            except (OSError, ValueError):
+                continue
+            if workspace.manifest.get('status') not in ('complete', 'cleaned'):
+                continue
+            for path in workspace.artifacts([kind]):
+                if os.path.exists(path):
+                    candidates.append((workspace.manifest.get('created_at', 0), path))
+    return max(candidates)[1] if candidates else None
+
+
+# Per-CUSIP files written next to the database by exports that ran without a workspace
+LEGACY_PREFIX = 'cmbs_'
+LEGACY_SUFFIXES = ('.txt', '.csv', '.jsonld', '.cypher')
+
+
+def clean_workspace(directory: str) -> int:
+    """
+    Clean up a run workspace from its manifest. A directory without a manifest only gets its own top-level
+    legacy cmbs_* export files removed (no recursive walk).
+    Returns:
+        int: Number of files removed
+    """
+    if os.path.exists(os.path.join(directory, MANIFEST_FILENAME)):
+        return RunWorkspace.open(directory).cleanup()
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.startswith(LEGACY_PREFIX) and entry.name.endswith(LEGACY_SUFFIXES):
+                logger.debug(f"Deleting file: {entry.path}")
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='List or clean up pipeline run workspaces.')
+    parser.add_argument('workspace', nargs='+', help='Run workspace directories')
+    parser.add_argument('--cleanup', action='store_true', help='Delete intermediate artifacts')
+    parser.add_argument('--all', action='store_true', help='With --cleanup, also delete deliverables')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for workspace_dir in args.workspace:
+        workspace = RunWorkspace.open(workspace_dir)
+        if args.cleanup:
+            workspace.cleanup(keep_kinds=() if args.all else DELIVERABLE_KINDS)
+        else:
+            print(json.dumps(workspace.manifest, indent=2))
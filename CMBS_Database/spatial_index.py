@@ -0,0 +1,117 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from get_geo_from_address import normalize_address
+
+EARTH_RADIUS_MILES = 3958.7613
+# One degree of latitude is ~69.05 miles everywhere; used for the bounding-box prefilter
+MILES_PER_DEGREE_LAT = 69.05
+
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized great-circle distance from one point to many points.
+    Args:
+        lat (float): Latitude of the query point in degrees
+        lon (float): Longitude of the query point in degrees
+        lats (np.ndarray): Latitudes in degrees
+        lons (np.ndarray): Longitudes in degrees
+    Returns:
+        np.ndarray: Distances in miles
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class PropertySpatialIndex:
+    """
+    Latitude-sorted spatial index over geocoded property locations.
+
+    A radius query first narrows candidates to the latitude band with a binary search,
+    applies a longitude bounding box, and only then runs vectorized haversine on what is left.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        """
+        Build the index.
+        Args:
+            records (Iterable[Dict[str, Any]]): Rows with deal_id, bloomberg, property_id, address, latitude, longitude
+        """
+        rows = [r for r in records if r.get('latitude') is not None and r.get('longitude') is not None]
+        rows.sort(key=lambda r: float(r['latitude']))
+        self.lats = np.array([float(r['latitude']) for r in rows], dtype=np.float64)
+        self.lons = np.array([float(r['longitude']) for r in rows], dtype=np.float64)
+        self.deal_ids = np.array([str(r['deal_id']) for r in rows], dtype=object)
+        self.bloomberg = np.array([r.get('bloomberg') for r in rows], dtype=object)
+        self.property_ids = np.array([r.get('property_id') for r in rows], dtype=object)
+        self.addresses = np.array([r.get('address') for r in rows], dtype=object)
+        self._address_index = {normalize_address(r.get('address')): i for i, r in enumerate(rows)}
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def locate(self, address: str) -> Optional[tuple]:
+        """Return (latitude, longitude) of an indexed address, or None."""
+        i = self._address_index.get(normalize_address(address))
+        return (float(self.lats[i]), float(self.lons[i])) if i is not None else None
+
+    def query_radius(self, lat: float, lon: float, radius_miles: float) -> List[Dict[str, Any]]:
+        """
+        Find all indexed properties within a radius of a point.
+        Args:
+            lat (float): Latitude in degrees
+            lon (float): Longitude in degrees
+            radius_miles (float): Search radius in miles
+        Returns:
+            List[Dict[str, Any]]: Matching properties sorted by distance, each with a 'distance_miles' field
+        """
+        if not len(self):
+            return []
+        dlat = radius_miles / MILES_PER_DEGREE_LAT
+        lo = np.searchsorted(self.lats, lat - dlat, side='left')
+        hi = np.searchsorted(self.lats, lat + dlat, side='right')
+        if lo >= hi:
+            return []
+        candidates = np.arange(lo, hi)
+        cos_lat = max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        dlon = radius_miles / (MILES_PER_DEGREE_LAT * cos_lat)
+        lon_gap = np.abs((self.lons[candidates] - lon + 180.0) % 360.0 - 180.0)
+        candidates = candidates[lon_gap <= dlon]
+        distances = haversine_miles(lat, lon, self.lats[candidates], self.lons[candidates])
+        within = distances <= radius_miles
+        candidates, distances = candidates[within], distances[within]
+        order = np.argsort(distances, kind='stable')
+        return [{
+            'deal_id': self.deal_ids[i],
+            'bloomberg': self.bloomberg[i],
+            'property_id': self.property_ids[i],
+            'address': self.addresses[i],
+            'latitude': float(self.lats[i]),
+            'longitude': float(self.lons[i]),
+            'distance_miles': round(float(d), 3),
+        } for i, d in zip(candidates[order], distances[order])]
+
+    def deals_within(self, lat: float, lon: float, radius_miles: float) -> List[Dict[str, Any]]:
+        """
+        Group a radius query by deal.
+        Returns:
+            List[Dict[str, Any]]: One entry per deal (deal_id, bloomberg, nearest_miles, properties),
+                                  ordered by the distance of the deal's nearest property
+        """
+        deals: Dict[str, Dict[str, Any]] = {}
+        for hit in self.query_radius(lat, lon, radius_miles):
+            deal = deals.setdefault(hit['deal_id'], {
+                'deal_id': hit['deal_id'],
+                'bloomberg': hit['bloomberg'],
+                'nearest_miles': hit['distance_miles'],
+                'properties': [],
+            })
+            deal['properties'].append({
+                'property_id': hit['property_id'],
+                'address': hit['address'],
+                'distance_miles': hit['distance_miles'],
+            })
+        return list(deals.values())
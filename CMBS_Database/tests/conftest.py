@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+from neo4j import Record
+
+# The pipeline modules import each other as top-level modules (python CMBS_Database/<module>.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeResult(list):
+    """Records of one query; consume() returns nothing, like a summary nobody reads."""
+
+    def consume(self):
+        return None
+
+
+class FakeDriver:
+    """
+    Stand-in for a neo4j driver: every session.run(query, **params) is logged and answered by
+    respond(query, params), which returns a list of dicts (turned into neo4j Records).
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.log = []
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **params):
+        self.log.append((query, params))
+        return FakeResult(Record(row) for row in self.respond(query, params) or [])
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        return None
+
+
+@pytest.fixture
+def make_lister():
+    """Build a DealLister whose driver is a FakeDriver around respond(query, params)."""
+    from neo4j_handler import DealLister
+
+    def make(respond=lambda query, params: []):
+        return DealLister(None, None, None, 'test', driver=FakeDriver(respond))
+    return make
+
+
+@pytest.fixture(scope='session')
+def synthetic_db(tmp_path_factory):
+    """A small synthetic Intex snapshot (see generate_synthetic_intex_db), shared by the tests that only read it."""
+    from generate_synthetic_intex_db import generate_synthetic_intex_db
+    path = str(tmp_path_factory.mktemp('intex') / 'CMBS_H_20250430')
+    generate_synthetic_intex_db(path, num_properties=600, properties_per_deal=20)
+    return path
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import sqlite3
+
+from benchmark_pipeline import PipelineBenchmark, compare_to_baseline
+from generate_synthetic_intex_db import generate_synthetic_intex_db
+
+
+def _dump_digest(path):
+    conn = sqlite3.connect(path)
+    digest = hashlib.sha1('\n'.join(conn.iterdump()).encode('utf-8')).hexdigest()
+    conn.close()
+    return digest
+
+
+def test_generator_is_deterministic_and_reports_its_rows(tmp_path):
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    counts = generate_synthetic_intex_db(first, num_properties=200, properties_per_deal=20)
+    assert generate_synthetic_intex_db(second, num_properties=200, properties_per_deal=20) == counts
+    assert _dump_digest(first) == _dump_digest(second)
+    conn = sqlite3.connect(first)
+    assert {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in counts} == counts
+    assert conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0] == 0
+    conn.close()
+    assert counts['propinfo'] == 200 and counts['deals'] == 10
+
+
+def test_only_slowdowns_beyond_tolerance_and_noise_regress():
+    baseline = {'meta': {'scale': 1000}, 'stages': {'export': {'seconds': 1.0}, 'lookups': {'seconds': 0.01},
+                                                    'combine': {'seconds': 2.0}}}
+    results = {'meta': {'scale': 1000}, 'stages': {'export': {'seconds': 1.6}, 'lookups': {'seconds': 0.05},
+                                                   'combine': {'seconds': 2.5}, 'new_stage': {'seconds': 9.0}}}
+    assert compare_to_baseline(results, baseline, tolerance=0.5) == [
+        {'stage': 'export', 'baseline': 1.0, 'current': 1.6, 'ratio': 1.6}]
+
+
+def test_mismatched_run_settings_are_reported(capsys):
+    baseline = {'meta': {'tool': 'get_server_metrics', 'warm_up': False}, 'stages': {'import_server': {'seconds': 0.8}}}
+    results = {'meta': {'tool': 'get_deal_card', 'warm_up': False}, 'stages': {'import_server': {'seconds': 0.8}}}
+    assert compare_to_baseline(results, baseline, meta_keys=('tool', 'warm_up')) == []
+    warnings = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Warning')]
+    assert warnings == ["Warning: baseline was recorded with a different tool; comparison may not be meaningful."]
+
+
+def test_benchmark_runs_in_its_own_workspace_and_removes_it(tmp_path):
+    db_path = str(tmp_path / 'CMBS_SYNTH_200')
+    generate_synthetic_intex_db(db_path, num_properties=200, properties_per_deal=20)
+    stale = tmp_path / 'cmbs_pltr_nodes_STALE.csv'
+    stale.write_text('id\nstale\n')
+    bench = PipelineBenchmark(db_path, max_cusips=5)
+    try:
+        stages = bench.run()
+        assert not bench.work_dir.startswith(str(tmp_path))
+    finally:
+        bench.close()
+    assert stages['combine_csv_files']['items'] == len(bench.cusips) == 5
+    assert stages['export_holdings_to_archive']['items'] == stages['archive_combine_csv']['items'] == 5
+    assert not os.path.exists(bench.work_dir)
+    assert sorted(os.listdir(tmp_path)) == ['CMBS_SYNTH_200', 'cmbs_pltr_nodes_STALE.csv']
+    assert stale.read_text() == 'id\nstale\n'
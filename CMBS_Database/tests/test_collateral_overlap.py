@@ -0,0 +1,37 @@
+import pandas as pd
+
+from collateral_overlap import analyze_collateral_overlap, overlap_edge_rows
+
+COLUMNS = ['cusip', 'deal_id', 'prop_name', 'address', 'state', 'owner_name']
+COLLATERAL = pd.DataFrame([
+    ('C1', 1, 'Tower One', '100 Main Street', 'TX', 'Acme LLC'),
+    ('C2', 2, 'tower one', '100 Main St.', 'TX', 'Beta LLC'),
+    ('C2', 2, 'Annex', '5 Oak Ave', 'TX', 'Gamma LLC'),
+    ('C3', 3, 'Plaza', '9 Elm Rd', 'NY', 'Gamma  llc'),
+    ('C4', 4, 'Mall', '1 Pine Rd', 'CA', 'Unknown'),
+    ('C5', 5, 'Depot', '2 Birch Rd', 'CA', 'Unknown'),
+    ('C6', 6, 'Yard', '3 Cedar Rd', 'WA', 'Hub Owner'),
+    ('C7', 7, 'Dock', '4 Maple Rd', 'WA', 'Hub Owner'),
+    ('C8', 8, 'Shed', '6 Ash Rd', 'WA', 'Hub Owner'),
+], columns=COLUMNS)
+
+
+def test_shared_collateral_links_deals_and_components():
+    result = analyze_collateral_overlap(COLLATERAL, max_feature_degree=2)
+    pairs = {(p['deal_a'], p['deal_b']): p for p in result['pairs']}
+    assert set(pairs) == {('1', '2'), ('2', '3')}
+    assert (pairs[('1', '2')]['shared_properties'], pairs[('1', '2')]['shared_addresses']) == (1, 1)
+    assert pairs[('2', '3')]['shared_owners'] == 1 and pairs[('2', '3')]['shared_total'] == 1
+    # Placeholder owners link nothing; the hub owner joins its deals without pairwise counts
+    assert [c['deals'] for c in result['components']] == [['1', '2', '3'], ['6', '7', '8']]
+    assert result['components'][0]['cusips'] == ['C1', 'C2', 'C3']
+    assert result['summary']['hub_features_skipped'] == {'properties': 0, 'owners': 1, 'addresses': 0}
+
+    edges = overlap_edge_rows(result)
+    assert {(e['deal_a'], e['deal_b'], e['props']['component']) for e in edges} == {('1', '2', 1), ('2', '3', 1)}
+
+
+def test_min_shared_filters_pairs_but_not_components():
+    result = analyze_collateral_overlap(COLLATERAL, min_shared=2)
+    assert [(p['deal_a'], p['deal_b']) for p in result['pairs']] == [('1', '2')]
+    assert len(result['components']) == 2
@@ -0,0 +1,49 @@
+import os
+import shutil
+import sqlite3
+
+import pyarrow.dataset as ds
+
+from columnar_cache import ColumnarQueryEngine, ingest_snapshot_to_parquet, property_type_mix
+
+
+def test_cache_matches_the_snapshot_and_widens_misfit_columns(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE propinfo SET year_built = 'unknown' WHERE rowid = 1")
+    conn.commit()
+    counts = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+              for table in ('propinfo', 'deals', 'collateral')}
+    mix = dict(conn.execute(
+        "SELECT trustee_prop_type_full, count(*) FROM propinfo WHERE deal_id IN (SELECT t.deal_id FROM deal_tranche t "
+        "JOIN account_holding h ON h.cusip = t.tr_cusip) GROUP BY trustee_prop_type_full").fetchall())
+    conn.close()
+
+    cache_dir = ingest_snapshot_to_parquet(path, str(tmp_path / 'cache'))
+    propinfo = ds.dataset(os.path.join(cache_dir, 'propinfo'), format='parquet', partitioning='hive')
+    assert str(propinfo.schema.field('year_built').type) == 'string'
+    assert str(propinfo.schema.field('deal_id').type) == 'int64'
+    assert os.path.isdir(os.path.join(cache_dir, 'propinfo', 'state=TX'))
+
+    engine = ColumnarQueryEngine(cache_dir)
+    try:
+        for table, rows in counts.items():
+            assert engine.query(f"SELECT count(*) AS n FROM {table}")['n'][0] == rows
+        assert engine.query("SELECT count(*) AS n FROM propinfo WHERE year_built = 'unknown'")['n'][0] == 1
+        result = property_type_mix(engine)
+        assert dict(zip(result['trustee_prop_type_full'], result['properties'])) == mix
+    finally:
+        engine.close()
+
+
+def test_unchanged_snapshot_is_not_reingested(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    cache_dir = ingest_snapshot_to_parquet(path, str(tmp_path / 'cache'))
+    deals = os.path.join(cache_dir, 'deals')
+    shutil.rmtree(deals)
+    assert ingest_snapshot_to_parquet(path, cache_dir) == cache_dir
+    assert not os.path.exists(deals)
+    ingest_snapshot_to_parquet(path, cache_dir, force=True)
+    assert os.path.isdir(deals)
@@ -0,0 +1,45 @@
+from collections import Counter
+
+from deal_memo import DealMemo, group_by_deal
+from export_archive import JSONLD_GRAPH, PLTR_NODES, ExportArchive
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+
+
+def test_memo_evicts_the_least_recently_used_deal():
+    memo, builds = DealMemo(maxsize=2), []
+
+    def build(key):
+        return lambda: builds.append(key) or key.upper()
+
+    for key in ('a', 'b', 'a', 'c', 'b', 'a'):
+        assert memo.get(key, build(key)) == key.upper()
+    assert builds == ['a', 'b', 'c', 'b', 'a']
+    assert memo.stats() == {'entries': 2, 'maxsize': 2, 'hits': 1, 'misses': 5, 'evictions': 3, 'hit_rate': 0.1667}
+
+
+def test_cusips_are_grouped_by_deal_in_first_seen_order():
+    deal_ids = {'C1': '1', 'C2': '2', 'C3': '1', 'C4': None}
+    assert list(group_by_deal(deal_ids, ['C1', 'C2', 'C3', 'C1', 'C4', 'C5']).items()) == [
+        ('1', ['C1', 'C3']), ('2', ['C2']), (None, ['C4', 'C5'])]
+
+
+def test_memoized_export_builds_each_deal_once_and_writes_the_same_payloads(synthetic_db, tmp_path, monkeypatch):
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    cusips = handler.get_all_holdings_cusip()
+    plain = ExportArchive(str(tmp_path / 'plain.sqlite'))
+    for cusip in cusips:
+        handler.export_cusip_data_to_jsonld(cusip, write_jsonld=True, archive=plain)
+
+    built = Counter()
+    build_deal_subgraph = handler.build_deal_subgraph
+    monkeypatch.setattr(handler, 'build_deal_subgraph',
+                        lambda deal_id, *args: built.update([deal_id]) or build_deal_subgraph(deal_id, *args))
+    memoized = ExportArchive(str(tmp_path / 'memoized.sqlite'))
+    stats = handler.export_holdings(deal_memo=DealMemo(maxsize=1), write_jsonld=True, archive=memoized)
+
+    assert stats['exported'] == stats['cusips'] and not stats['failed']
+    assert set(built.values()) == {1} and len(built) == stats['deals'] < stats['cusips']
+    for kind in (PLTR_NODES, JSONLD_GRAPH):
+        assert list(memoized.iter_payloads(kind)) == list(plain.iter_payloads(kind))
+    plain.close()
+    memoized.close()
@@ -0,0 +1,56 @@
+import shutil
+import sqlite3
+
+import numpy as np
+
+from entity_resolution import EntityResolver, MinHashLSH, _shingles, name_tokens, resolve_entities
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+
+
+def test_initials_are_kept():
+    assert name_tokens('J C Penney Co') == ['J', 'C', 'PENNEY']
+    assert name_tokens('Building C LLC') == ['BUILDING', 'C']
+    assert name_tokens('Building L LLC') != name_tokens('Building C LLC')
+
+
+def test_legal_forms_are_dropped():
+    assert name_tokens('Acme Holdings, L.L.C.') == name_tokens('ACME HLDGS LLC') == ['ACME', 'HOLDINGS']
+
+
+def test_resolver_merges_spelling_variants_only():
+    mapping, stats = EntityResolver().resolve({'Acme Holdings LLC': 10, 'ACME HLDGS L.L.C.': 2,
+                                               'Tower A Owner LLC': 3, 'Tower B Owner LLC': 3})
+    assert mapping.get('ACME HLDGS L.L.C.') == 'Acme Holdings LLC'
+    assert 'Tower A Owner LLC' not in mapping and 'Tower B Owner LLC' not in mapping
+
+
+def test_long_names_differing_in_a_letter_stay_apart():
+    mapping, _ = EntityResolver().resolve({'Westfield Shopping Center Phase A': 2,
+                                           'Westfield Shopping Center Phase B': 1,
+                                           'Westfield Shopping Centre Phase A': 1})
+    assert mapping == {'Westfield Shopping Centre Phase A': 'Westfield Shopping Center Phase A'}
+
+
+def test_lsh_buckets_similar_names_within_a_partition():
+    names = ['HARBOR POINTE OFFICE PARK', 'HARBOUR POINTE OFFICE PARK', 'HARBOR POINTE OFFICE PARK', 'GLENWOOD MALL']
+    lsh = MinHashLSH(num_perm=64, bands=32)
+    signatures = lsh.signatures([_shingles(n) for n in names])
+    pairs = {tuple(sorted(members.tolist())) for members in lsh.buckets(signatures, np.array([0, 0, 1, 0]))}
+    assert (0, 1) in pairs
+    assert not any(2 in pair or 3 in pair for pair in pairs)
+
+
+def test_snapshot_owner_variants_resolve_to_one_name(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    conn = sqlite3.connect(path)
+    owner = conn.execute("SELECT owner_name FROM propinfo GROUP BY owner_name ORDER BY count(*) DESC").fetchone()[0]
+    conn.execute("UPDATE propinfo SET owner_name = ? WHERE rowid = (SELECT min(rowid) FROM propinfo "
+                 "WHERE owner_name = ?)", (owner.upper() + ', L.L.C.', owner))
+    conn.commit()
+    conn.close()
+
+    aliases, report = resolve_entities(CMBSDatabaseHandler(path, use_sidecar=False))
+    assert aliases.canonical('owner_name', owner.upper() + ', L.L.C.') == owner
+    assert aliases.aliases('owner_name', owner) == [owner.upper() + ', L.L.C.']
+    assert report['PropertyOwner']['merged'] >= 1 and set(report) == {'PropertyOwner', 'PropName'}
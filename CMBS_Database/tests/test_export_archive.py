@@ -0,0 +1,36 @@
+import json
+import os
+import shutil
+
+from deal_memo import PLTR_NODES_HEADER
+from export_archive import JSONLD_GRAPH, PLTR_NODES, ExportArchive
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+
+
+def test_archived_exports_round_trip_and_combine(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    handler = CMBSDatabaseHandler(path, use_sidecar=False)
+    cusips = handler.get_all_holdings_cusip()[:5]
+    archive = ExportArchive(str(tmp_path / 'export.sqlite'), commit_every=2)
+    for cusip in cusips:
+        handler.export_cusip_data_to_jsonld(cusip, write_jsonld=True, archive=archive)
+    archive.close()
+    assert sorted(os.listdir(tmp_path)) == ['CMBS_H_20250430', 'export.sqlite']
+
+    archive = ExportArchive(str(tmp_path / 'export.sqlite'))
+    assert archive.cusips() == archive.cusips(JSONLD_GRAPH) == sorted(cusips)
+    payloads = [archive.get(cusip, PLTR_NODES) for cusip in sorted(cusips)]
+    assert all(payload.startswith(PLTR_NODES_HEADER) for payload in payloads)
+    assert json.loads(archive.get(cusips[0], JSONLD_GRAPH))['@graph']
+
+    combined = archive.combine_csv(str(tmp_path / 'combined.csv'))
+    with open(combined, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines.count(PLTR_NODES_HEADER.strip()) == 1
+    assert len(lines) == 1 + sum(payload.count('\n') - 1 for payload in payloads)
+    assert archive.combine_csv(str(tmp_path / 'none.csv'), kind='other') is None
+    assert not os.path.exists(tmp_path / 'none.csv')
+
+    archive.remove()
+    assert not any(name.startswith('export.sqlite') for name in os.listdir(tmp_path))
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from exposure_rollups import ALL_PORTFOLIOS, ExposureRollups, compute_cusip_rollups
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+
+
+def _expected_portfolio_counts(handler, holdings, dimension):
+    """Properties per value with each (portfolio, deal) counted once, straight from the snapshot."""
+    collateral = handler.get_holdings_collateral(holdings['cusip'].unique().tolist())
+    deals = collateral[['cusip', 'deal_id']].drop_duplicates()
+    held_deals = holdings.merge(deals, on='cusip')[['deal_id']].drop_duplicates()
+    properties = collateral.drop_duplicates(['deal_id', 'address', 'state', 'prop_name']).merge(held_deals, on='deal_id')
+    labels = compute_cusip_rollups(properties.assign(cusip='x'), [dimension])
+    return dict(zip(labels['value'], labels['properties']))
+
+
+def _portfolio_counts(rollups, dimension, portfolio=ALL_PORTFOLIOS):
+    return {row['value']: row['properties'] for row in rollups.portfolio_exposure(dimension, portfolio)}
+
+
+def test_portfolio_counts_each_deal_once(synthetic_db, tmp_path):
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    holdings = handler.get_account_holdings()
+    rollups = ExposureRollups(str(tmp_path / 'rollups.sqlite'))
+    rollups.refresh(handler, holdings)
+    expected = _expected_portfolio_counts(handler, holdings, 'state')
+    assert _portfolio_counts(rollups, 'state') == expected
+    total_properties = handler._execute_query(
+        "SELECT count(*) AS n FROM propinfo WHERE deal_id IN (SELECT t.deal_id FROM deal_tranche t "
+        "JOIN account_holding h ON h.cusip = t.tr_cusip)")['n'].iloc[0]
+    assert sum(expected.values()) == total_properties
+    rollups.close()
+
+
+def test_incremental_refresh_matches_full_rebuild(synthetic_db, tmp_path):
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    holdings = handler.get_account_holdings()
+    rollups = ExposureRollups(str(tmp_path / 'rollups.sqlite'))
+    rollups.refresh(handler, holdings)
+    # Sell every other position, then buy one back
+    changed = pd.concat([holdings.iloc[::2], holdings.iloc[1:2]])
+    rollups.refresh(handler, changed)
+    rebuilt = ExposureRollups(str(tmp_path / 'rebuilt.sqlite'))
+    rebuilt.refresh(handler, changed)
+    for portfolio in rebuilt.portfolios():
+        assert rollups.portfolio_exposure('msa_name', portfolio) == rebuilt.portfolio_exposure('msa_name', portfolio)
+    assert _portfolio_counts(rollups, 'msa_name') == _expected_portfolio_counts(handler, changed, 'msa_name')
+    rollups.close()
+    rebuilt.close()
+
+
+def test_whole_years_next_to_nulls_have_no_decimals():
+    collateral = pd.DataFrame({'cusip': ['A', 'A', 'A'], 'year_built': [2003.0, None, 1999.0]})
+    rollups = compute_cusip_rollups(collateral, ['year_built'])
+    assert sorted(rollups['value']) == ['1999', '2003', 'Unknown']
@@ -0,0 +1,43 @@
+import shutil
+import sqlite3
+
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+
+
+def test_null_owner_gets_no_owner_node(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    conn = sqlite3.connect(path)
+    deal_id = conn.execute("SELECT deal_id FROM propinfo LIMIT 1").fetchone()[0]
+    conn.execute("UPDATE propinfo SET owner_name = NULL, owner_type = NULL WHERE deal_id = ?", (deal_id,))
+    conn.commit()
+    conn.close()
+
+    handler = CMBSDatabaseHandler(path, use_sidecar=False)
+    assert all(p['owner_name'] is None for p in handler.get_property_info_by_deal_id(deal_id))
+    deal = handler.build_deal_subgraph(deal_id)
+    graph = deal.graph.jsonld_graph()
+    assert deal.property_ids
+    assert not [item for item in graph if item['@type'] == 'PropertyOwner']
+    assert all('ownedBy' not in item for item in graph if item['@type'] == 'Property')
+
+
+def test_arrow_batches_of_a_query_share_one_schema(tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER, score INTEGER, note TEXT)")
+    conn.executemany("INSERT INTO notes VALUES (?, ?, ?)", [(i, i, None) for i in range(4)]
+                     + [(4, 4.5, 'late text'), (5, 5, 7)])
+    conn.commit()
+    conn.close()
+    handler = CMBSDatabaseHandler(path, use_sidecar=False)
+
+    batches = list(handler.iter_query("SELECT id, note FROM notes ORDER BY id", batch_rows=2, as_arrow=True))
+    assert len(batches) == 3 and len({batch.schema for batch in batches}) == 1
+    assert str(batches[0].schema.field('note').type) == 'string'
+    assert batches[2].column(1).to_pylist() == ['late text', '7']
+
+    batches = list(handler.iter_table('notes', batch_rows=2, as_arrow=True))
+    assert len({batch.schema for batch in batches}) == 1
+    assert [str(field.type) for field in batches[0].schema] == ['int64', 'double', 'string']
+    assert batches[2].column(1).to_pylist() == [4.5, 5.0]
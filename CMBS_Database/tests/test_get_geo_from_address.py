@@ -0,0 +1,54 @@
+import os
+
+from get_geo_from_address import BatchGeocoder, GeocodeCache
+
+
+def _write_gazetteer(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('address,state,latitude,longitude\n')
+        for address, state, lat, lon in rows:
+            f.write(f'{address},{state},{lat},{lon}\n')
+
+
+def test_cached_counts_hits_among_requested_addresses(tmp_path):
+    gazetteer = tmp_path / 'gazetteer.csv'
+    _write_gazetteer(gazetteer, [('9600 Forest Lane', 'TX', 32.9, -96.7), ('1 Main Street', 'NY', 40.7, -74.0)])
+    geocoder = BatchGeocoder(str(tmp_path / 'cache.sqlite'), str(gazetteer))
+    assert geocoder.geocode_batch(['9600 Forest Lane, TX', '1 Main Street, NY']) == \
+        {'cached': 0, 'resolved': 2, 'missed': 0}
+    # One of the two cached addresses is requested again, plus a new miss
+    assert geocoder.geocode_batch(['9600 Forest Ln., TX', '9600 Forest Lane, TX', '5 Nowhere Rd, CA']) == \
+        {'cached': 1, 'resolved': 0, 'missed': 1}
+    geocoder.close()
+
+
+def test_cached_miss_is_retried_after_gazetteer_changes(tmp_path):
+    gazetteer = tmp_path / 'gazetteer.csv'
+    cache_path = str(tmp_path / 'cache.sqlite')
+    _write_gazetteer(gazetteer, [('9600 Forest Lane', 'TX', 32.9, -96.7)])
+    geocoder = BatchGeocoder(cache_path, str(gazetteer))
+    assert geocoder.geocode_batch(['5 Nowhere Rd, CA'])['missed'] == 1
+    assert geocoder.geocode_batch(['5 Nowhere Rd, CA']) == {'cached': 1, 'resolved': 0, 'missed': 0}
+    geocoder.close()
+
+    _write_gazetteer(gazetteer, [('9600 Forest Lane', 'TX', 32.9, -96.7), ('5 Nowhere Road', 'CA', 34.0, -118.2)])
+    os.utime(gazetteer, ns=(0, os.stat(gazetteer).st_mtime_ns + 1))
+    geocoder = BatchGeocoder(cache_path, str(gazetteer))
+    assert geocoder.geocode_batch(['5 Nowhere Rd, CA']) == {'cached': 0, 'resolved': 1, 'missed': 0}
+    assert geocoder.lookup('5 Nowhere Rd, CA') == (34.0, -118.2)
+    geocoder.close()
+
+
+def test_unversioned_cache_is_migrated(tmp_path):
+    import sqlite3
+    cache_path = str(tmp_path / 'cache.sqlite')
+    conn = sqlite3.connect(cache_path)
+    conn.execute("CREATE TABLE geocode_cache (address_key TEXT PRIMARY KEY, address TEXT, latitude REAL, "
+                 "longitude REAL, source TEXT)")
+    conn.execute("INSERT INTO geocode_cache VALUES ('5 NOWHERE RD CA', '5 Nowhere Rd, CA', NULL, NULL, 'miss')")
+    conn.execute("INSERT INTO geocode_cache VALUES ('1 MAIN ST NY', '1 Main St, NY', 40.7, -74.0, 'gazetteer')")
+    conn.commit()
+    conn.close()
+    cache = GeocodeCache(cache_path)
+    assert cache.known_keys('1:1') == {'1 MAIN ST NY'}
+    cache.close()
@@ -0,0 +1,43 @@
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from graph_builder import GraphBuilder
+from versioned_graph import flatten_jsonld
+
+
+def test_repeated_nodes_merge_and_references_render_as_jsonld():
+    graph = GraphBuilder()
+    for n in range(3):
+        prop = graph.node('Property', f"{n} Main St, TX")
+        graph.ref(prop, 'builtAt', '1999')
+        graph.node('YearBuilt', 1999)
+        graph.ref(graph.node('Deal', '7', dealId='7'), 'hasProperty', prop.id)
+    graph.ref(graph.node('Deal', '8'), 'hasProperty', '0 Main St, TX')
+    graph.ref(graph.node('Deal', '8'), 'hasProperty', '0 Main St, TX')
+    assert graph.label_counts() == {'Property': 3, 'YearBuilt': 1, 'Deal': 2}
+    assert graph.edge_count() == 7
+    items = {(item['@type'], item['@id']): item for item in graph.iter_jsonld()}
+    assert items[('Property', '0 Main St, TX')]['builtAt'] == {'@id': '1999'}
+    assert items[('Deal', '8')]['hasProperty'] == [{'@id': '0 Main St, TX'}]
+    assert len(items[('Deal', '7')]['hasProperty']) == 3
+
+    merged = GraphBuilder()
+    merged.merge(graph, key=('deal', '7'))
+    merged.node('Deal', '7', dealId='changed')
+    merged.merge(graph, key=('deal', '7'))
+    assert merged.tables['Deal']['7'].props == {'dealId': 'changed'}
+    assert merged.node_count() == graph.node_count()
+
+
+def test_builder_export_matches_the_list_collector(synthetic_db):
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    items, graph = [], GraphBuilder()
+    for cusip in handler.get_all_holdings_cusip()[:30]:
+        handler.export_cusip_data_to_jsonld(cusip, write_csv=False, graph_collector=items)
+        handler.export_cusip_data_to_jsonld(cusip, write_csv=False, graph_collector=graph)
+    assert len(items) > graph.node_count()
+    (built_nodes, built_edges), (listed_nodes, listed_edges) = graph.flatten(), flatten_jsonld(items)
+    assert built_edges == listed_edges and built_nodes.keys() == listed_nodes.keys()
+    for key, props in built_nodes.items():
+        # Owner types are collected over every deal; the list keeps the types of whichever deal came last
+        listed_types = set(listed_nodes[key].get('ownerType', '').split('; '))
+        assert listed_types <= set(props.pop('ownerType', '').split('; '))
+        assert props == {k: v for k, v in listed_nodes[key].items() if k != 'ownerType'}
@@ -0,0 +1,45 @@
+import argparse
+
+import load_test_mcp
+import neo4j_cmbs_mcp_server as mcp_server
+from load_test_mcp import StubDealLister, StubGraph, Workload, make_scenario, run_in_process, sample_keys
+
+
+def test_stub_lister_runs_the_real_lister_code(synthetic_db):
+    lister = StubDealLister(StubGraph.from_intex_db(synthetic_db), latency_ms=0)
+    assert lister.database == 'stub' and lister.profiler is None
+    deal_ids, addresses = sample_keys(lister, limit=50)
+    assert lister.search_deal_id_by_address(addresses[0])
+    assert lister.get_bloomberg_name_by_deal_id(deal_ids[0])
+    assert lister.get_bloomberg_name_by_deal_id('missing') is None
+
+
+def test_smoke_scenario_completes_without_errors(synthetic_db, monkeypatch):
+    scenario = make_scenario('smoke', {'requests': 40, 'stub_latency_ms': 0.0})
+    lister = StubDealLister(StubGraph.from_intex_db(synthetic_db), latency_ms=0)
+    monkeypatch.setattr(mcp_server, '_deal_lister', lister)
+    monkeypatch.setattr(mcp_server, '_lookup_tables', None)
+    workload = Workload(*sample_keys(lister, limit=100), scenario)
+    summary = run_in_process(mcp_server.server, workload, scenario)
+    assert summary['requests'] == 40
+    assert summary['error_rate'] == 0.0
+    assert set(summary['tools']) <= set(scenario['mix'])
+
+
+def test_stdio_neo4j_scenario_passes_the_connection_to_the_server(monkeypatch):
+    captured = {}
+
+    class _Lister:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(load_test_mcp, 'make_lister', lambda args, scenario: _Lister())
+    monkeypatch.setattr(load_test_mcp, 'sample_keys', lambda lister, limit, seed: (['1'], ['1 Main St, TX']))
+    monkeypatch.setattr(load_test_mcp, 'run_stdio',
+                        lambda command, workload, scenario, env, seed: captured.update(env) or {})
+    args = argparse.Namespace(transport='stdio', backend='neo4j', sample_keys=10, seed=42, uri='bolt://db:7687',
+                              user='reader', password='secret', database='cmbs-test')
+    load_test_mcp.run_scenario(args, make_scenario('smoke'))
+    assert captured['CMBS_NEO4J_URI'] == 'bolt://db:7687'
+    assert (captured['CMBS_NEO4J_USER'], captured['CMBS_NEO4J_PASSWORD']) == ('reader', 'secret')
+    assert captured['CMBS_NEO4J_DATABASE'] == 'cmbs-test'
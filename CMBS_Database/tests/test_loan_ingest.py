@@ -0,0 +1,53 @@
+import shutil
+import sqlite3
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from loan_ingest import LOANS_FILENAME, LOAN_PROPERTIES_FILENAME, ingest_loans, loan_dtypes
+
+
+def test_first_chunk_of_nulls_keeps_the_declared_type(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE collateral SET loan_name = NULL WHERE rowid <= 100")
+    conn.commit()
+    named, total = conn.execute("SELECT count(loan_name), count(*) FROM collateral").fetchone()
+    conn.close()
+    assert total > 100
+
+    stats = ingest_loans(CMBSDatabaseHandler(path, use_sidecar=False), str(tmp_path / 'loans'), chunk_rows=100)
+    loans = pq.read_table(str(tmp_path / 'loans' / LOANS_FILENAME))
+    assert stats['loans'] == loans.num_rows == total and stats['loan_chunks'] > 1
+    assert str(loans.schema.field('loan_name').type) == 'string'
+    assert loans.column('loan_name').null_count == total - named
+    assert str(loans.schema.field('deal_id').type) == 'int64'
+    assert str(loans.schema.field('coupon').type) == 'float'
+    assert str(loans.schema.field('status').type) == 'string'
+    edges = pq.read_table(str(tmp_path / 'loans' / LOAN_PROPERTIES_FILENAME))
+    assert edges.num_rows == stats['loan_properties'] > 0
+
+
+def test_dtypes_follow_the_arrow_schema():
+    schema = pa.schema([('deal_id', pa.int64()), ('loan_name', pa.string()), ('curr_balance', pa.float64()),
+                        ('coupon', pa.float64()), ('status', pa.string()), ('maturity_date', pa.string()),
+                        ('dscr', pa.string())])
+    assert loan_dtypes(schema) == {'deal_id': 'Int64', 'curr_balance': 'float64', 'coupon': 'float32',
+                                     'status': 'category'}
+
+
+def test_neo4j_load_matches_current_deals_and_counts_skipped_loans(synthetic_db, tmp_path, make_lister):
+    conn = sqlite3.connect(synthetic_db)
+    total, first_deal = conn.execute("SELECT count(*), min(deal_id) FROM collateral").fetchone()
+    conn.close()
+    # Only the first deal is in the graph
+    lister = make_lister(lambda query, params: [{'loaded': sum(row['deal_id'] == str(first_deal)
+                                                               for row in params['rows'])}]
+                         if 'HAS_LOAN' in query else [])
+    stats = ingest_loans(CMBSDatabaseHandler(synthetic_db, use_sidecar=False), str(tmp_path / 'loans'), lister)
+    loaded = stats['loans_loaded']
+    assert 0 < loaded < stats['loans'] == total and stats['loans_skipped'] == total - loaded
+    loan_queries = [query for query, _ in lister.driver.log if 'HAS_LOAN' in query]
+    assert loan_queries and all('MATCH (d:Deal' in query and 'MERGE (d:Deal' not in query for query in loan_queries)
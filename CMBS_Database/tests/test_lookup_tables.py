@@ -0,0 +1,55 @@
+import json
+
+import pandas as pd
+import pytest
+
+import neo4j_cmbs_mcp_server as mcp_server
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from get_geo_from_address import format_property_address
+from lookup_tables import LookupTables, build_lookup_tables, build_table, write_lookup_file
+
+
+@pytest.fixture(scope='module')
+def lookup_file(synthetic_db, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('lookup') / 'cmbs_lookup_tables.bin')
+    build_lookup_tables(CMBSDatabaseHandler(synthetic_db, use_sidecar=False), path)
+    return path
+
+
+def test_lookups_match_the_snapshot(synthetic_db, lookup_file):
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    row = handler.execute_custom_query("SELECT deal_id, address, state FROM propinfo LIMIT 1").iloc[0]
+    tables = LookupTables(lookup_file)
+    assert tables.meta['snapshot'] == 'CMBS_H_20250430'
+    address = format_property_address(row['address'], row['state'])
+    assert str(row['deal_id']) in tables.deal_ids_by_address(address.upper())
+    tranche = handler.execute_custom_query("SELECT tr_cusip, deal_id FROM deal_tranche LIMIT 1").iloc[0]
+    assert tables.deal_id_by_cusip(tranche['tr_cusip']) == str(tranche['deal_id'])
+    assert tables.deal_ids_by_address('404 Nowhere Rd, ZZ') == []
+
+
+def test_deal_ids_are_in_numeric_order(tmp_path):
+    pairs = pd.DataFrame({'key': ['Austin', 'Austin', 'Austin', 'Austin'], 'value': ['10', '9', '100', 'X1']})
+    path = write_lookup_file(str(tmp_path / 'lookup.bin'), {'msa_deals': build_table(pairs)})
+    assert LookupTables(path).lookup('msa_deals', 'austin') == ['9', '10', '100', 'X1']
+
+
+def test_neo4j_deal_ids_are_in_numeric_order(make_lister):
+    lister = make_lister(lambda query, params: [{'deal_id': '10'}, {'deal_id': '9'}, {'deal_id': '10'}])
+    assert lister.search_deal_id_by_address('1 Main St, TX') == ['9', '10']
+
+
+def test_lookup_file_needs_the_flag_and_the_graph_snapshot(lookup_file, make_lister, monkeypatch):
+    monkeypatch.setattr(mcp_server, 'LOOKUP_TABLES_PATH', lookup_file)
+    monkeypatch.setattr(mcp_server, '_lookup_tables', None)
+    monkeypatch.setattr(mcp_server, '_deal_lister', make_lister(lambda query, params: [{'bloomberg': 'FROM NEO4J'}]))
+    deal_id = '1'
+    monkeypatch.setattr(mcp_server, 'USE_LOOKUP_TABLES', False)
+    monkeypatch.setattr(mcp_server, 'GRAPH_SNAPSHOT', 'CMBS_H_20250430')
+    assert json.loads(mcp_server.get_bloomberg_name_by_deal_id(deal_id)) == 'FROM NEO4J'
+    monkeypatch.setattr(mcp_server, 'USE_LOOKUP_TABLES', True)
+    monkeypatch.setattr(mcp_server, 'GRAPH_SNAPSHOT', 'CMBS_H_20250531')
+    assert json.loads(mcp_server.get_bloomberg_name_by_deal_id(deal_id)) == 'FROM NEO4J'
+    monkeypatch.setattr(mcp_server, 'GRAPH_SNAPSHOT', 'CMBS_H_20250430')
+    assert json.loads(mcp_server.get_bloomberg_name_by_deal_id(deal_id)) not in (None, 'FROM NEO4J')
+    assert json.loads(mcp_server.get_deal_id_by_cusip('NOT-A-CUSIP')) is None
@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import neo4j_cmbs_mcp_server as mcp_server
+from spatial_index import PropertySpatialIndex
+
+PROPERTIES = [
+    {'deal_id': '101', 'bloomberg': 'DEAL 2019-C1', 'property_id': '1 Main St, Dallas, TX',
+     'address': '1 Main St, Dallas, TX', 'latitude': 32.78, 'longitude': -96.80},
+    {'deal_id': '202', 'bloomberg': 'DEAL 2020-C2', 'property_id': '9 Elm St, Fort Worth, TX',
+     'address': '9 Elm St, Fort Worth, TX', 'latitude': 32.75, 'longitude': -97.33},
+]
+
+
+@pytest.fixture
+def lister(make_lister, monkeypatch):
+    def respond(query, params):
+        if 'property_count' in query:
+            return [{'deal_id': params['deal_id'], 'bloomberg': 'DEAL 2019-C1', 'cusip': 'C1', 'property_count': 1,
+                     'msas': [], 'property_types': [], 'owners': [],
+                     'properties': [{'name': 'Main Street Office', 'address': '1 Main St, Dallas, TX'}]}]
+        return []
+    deal_lister = make_lister(respond)
+    deal_lister._spatial_index = PropertySpatialIndex(PROPERTIES)
+    monkeypatch.setattr(mcp_server, '_deal_lister', deal_lister)
+    return deal_lister
+
+
+def test_deal_card_is_returned_as_json(lister):
+    card = json.loads(mcp_server.get_deal_card('101', fields='name,address'))
+    assert card['cusip'] == 'C1'
+    assert card['properties'] == [{'name': 'Main Street Office', 'address': '1 Main St, Dallas, TX'}]
+    assert card['truncated'] is False
+
+
+def test_radius_tools_return_json(lister):
+    near = json.loads(mcp_server.deals_near(32.78, -96.80, 5))
+    assert [deal['deal_id'] for deal in near] == ['101']
+    near_address = json.loads(mcp_server.deals_near_address('1 main st, dallas, tx', 50))
+    assert [deal['deal_id'] for deal in near_address] == ['101', '202']
+    assert json.loads(mcp_server.deals_near_address('404 Nowhere Rd, Austin, TX', 5)) == []
+
+
+def test_import_creates_no_driver():
+    code = ("import sys, neo4j_cmbs_mcp_server as s; "
+            "print(s._deal_lister is None, [m for m in ('neo4j', 'neo4j_handler') if m in sys.modules])")
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(mcp_server.__file__),
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ['True', '[]']
+
+
+def test_warm_up_compiles_every_query(make_lister):
+    deal_lister = make_lister()
+    assert deal_lister.warm_up() == len(deal_lister.WARM_UP_QUERIES)
+    assert all(query.startswith('EXPLAIN ') for query, _ in deal_lister.driver.log)
+
+
+def test_warm_up_fails_fast_without_neo4j(monkeypatch, caplog):
+    monkeypatch.setattr(mcp_server, '_deal_lister', None)
+    monkeypatch.setattr(mcp_server, 'NEO4J_URI', 'bolt://127.0.0.1:1')
+    monkeypatch.setattr(mcp_server, 'CONNECTION_TIMEOUT', 1.0)
+    start = time.perf_counter()
+    mcp_server.warm_up()
+    assert time.perf_counter() - start < 5
+    assert 'Server warm-up failed' in caplog.text
+    deal_lister = mcp_server.get_deal_lister()
+    assert mcp_server.get_deal_lister() is deal_lister
+    deal_lister.close()
+
+
+class _Rollups:
+    def cusip_exposure(self, cusip, dimension):
+        return [{'value': 'Dallas, TX', 'properties': 3, 'pct': 75.0}, {'value': 'Austin, TX', 'properties': 1, 'pct': 25.0}]
+
+    def portfolio_exposure(self, dimension, portfolio, limit):
+        return [{'value': 'TX', 'properties': 4, 'holdings': 2, 'pct': 100.0}][:limit]
+
+
+def test_exposure_tools_return_json_and_reject_unknown_dimensions(monkeypatch):
+    monkeypatch.setattr(mcp_server, '_exposure_rollups', _Rollups())
+    assert [row['value'] for row in json.loads(mcp_server.get_cusip_exposure('C1'))] == ['Dallas, TX', 'Austin, TX']
+    assert json.loads(mcp_server.get_portfolio_exposure('state'))[0]['holdings'] == 2
+    with pytest.raises(ValueError, match='msa_name'):
+        mcp_server.get_cusip_exposure('C1', 'msa')
+    with pytest.raises(ValueError):
+        mcp_server.get_portfolio_exposure('State')
+
+
+def test_profile_all_is_read_from_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setattr(mcp_server, '_deal_lister', None)
+    monkeypatch.setenv('CMBS_SLOW_QUERY_MS', '50')
+    monkeypatch.setenv('CMBS_SLOW_QUERY_LOG', str(tmp_path / 'slow.jsonl'))
+    monkeypatch.setenv('CMBS_PROFILE_ALL', '1')
+    deal_lister = mcp_server.get_deal_lister()
+    try:
+        assert deal_lister.profiler.profile_all and deal_lister.profiler.slow_ms == 50.0
+    finally:
+        deal_lister.close()
@@ -0,0 +1,39 @@
+from neo4j_handler import DEALS_BY_ADDRESS_QUERY, PROPERTIES_BY_DEAL_ID_QUERY, DealLister
+
+
+def test_warm_up_compiles_the_property_and_address_tool_queries(make_lister):
+    lister = make_lister()
+    assert lister.warm_up() == len(DealLister.WARM_UP_QUERIES)
+    explained = [query for query, _ in lister.driver.log]
+    assert f"EXPLAIN {PROPERTIES_BY_DEAL_ID_QUERY}" in explained
+    assert f"EXPLAIN {DEALS_BY_ADDRESS_QUERY}" in explained
+
+
+def test_current_view_queries_skip_closed_versions():
+    import neo4j_handler
+    for name in ('BLOOMBERG_NAME_BY_DEAL_ID_QUERY', 'DEAL_IDS_BY_ADDRESS_QUERY', 'PROPERTIES_BY_DEAL_ID_QUERY',
+                 'DEALS_BY_ADDRESS_QUERY', 'DEAL_CARD_QUERY', 'GEOCODED_PROPERTIES_QUERY'):
+        query = getattr(neo4j_handler, name)
+        assert "valid_to, '9999-12-31') = '9999-12-31'" in query, name
+        assert 'd.cusip' not in query, name
+
+
+def test_tranche_load_matches_deals_and_resets_unloaded_tranches(make_lister):
+    from neo4j_handler import LOAD_TRANCHES_QUERY, RESET_UNLOADED_TRANCHES_QUERY
+    assert 'MATCH (d:Deal' in LOAD_TRANCHES_QUERY and 'MERGE (d:Deal' not in LOAD_TRANCHES_QUERY
+    assert 'd.cusip' not in LOAD_TRANCHES_QUERY
+
+    def respond(query, params):
+        if query == LOAD_TRANCHES_QUERY:
+            # Deal 2 is not in the graph
+            return [{'loaded': sum(row['deal_id'] == '1' for row in params['rows'])}]
+        if query == RESET_UNLOADED_TRANCHES_QUERY:
+            return [{'reset': 3}]
+        return []
+    lister = make_lister(respond)
+    rows = [{'cusip': f'C{n}', 'deal_id': '1' if n < 3 else '2', 'held': n == 0} for n in range(5)]
+    assert lister.load_tranches(rows, batch_size=2) == {'loaded': 3, 'skipped': 2, 'reset': 3}
+    load_ids = {params['load_id'] for query, params in lister.driver.log
+                if query in (LOAD_TRANCHES_QUERY, RESET_UNLOADED_TRANCHES_QUERY)}
+    assert len(load_ids) == 1
+    assert lister.driver.log[-1][0] == RESET_UNLOADED_TRANCHES_QUERY
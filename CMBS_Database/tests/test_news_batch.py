@@ -0,0 +1,85 @@
+import json
+import os
+
+import pandas as pd
+
+from news_batch import HoldingsMatcher, NearDuplicateFilter, NewsBatchProcessor
+
+
+class _Holdings:
+    """Handler stand-in with one held CUSIP of deal 7."""
+
+    def get_holdings_collateral(self):
+        return pd.DataFrame({'cusip': ['12345ABC7'], 'deal_id': [7], 'address': ['100 Main St, Dallas'],
+                             'prop_name': ['Main Street Plaza'], 'owner_name': ['Acme Holdings & Co., LLC']})
+
+    def get_deals(self):
+        return pd.DataFrame({'deal_id': [7], 'bloomberg_name': ['COMM 2015-CCRE22']})
+
+
+def _kinds(matcher, text):
+    return {m['kind'] for m in matcher.match(text)}
+
+
+def test_owner_spellings_match_like_the_owner_index():
+    matcher = HoldingsMatcher.from_handler(_Holdings())
+    for text in ('ACME HOLDINGS CO. sold the building', 'Acme Hldgs, the owner', 'Acme Holdings and Co defaulted'):
+        assert 'owner' in _kinds(matcher, text), text
+    assert _kinds(matcher, 'Acme Partners bought a hotel') == set()
+
+
+def test_addresses_deals_and_cusips_match():
+    matcher = HoldingsMatcher.from_handler(_Holdings())
+    assert _kinds(matcher, 'A fire at 100 Main Street. Bonds of COMM 2015-CCRE22 (12345ABC7) fell.') == \
+        {'address', 'deal', 'cusip'}
+    assert all(m['deal_ids'] == ['7'] for m in matcher.match('100 Main St'))
+
+
+def test_batch_queues_relevant_articles_and_drops_duplicates(tmp_path):
+    input_dir, output_dir = str(tmp_path / 'in'), str(tmp_path / 'out')
+    os.makedirs(input_dir)
+    story = 'Main Street Plaza in Dallas lost its anchor tenant this week, the servicer said in a filing.'
+    for name, text in (('a.txt', f'Anchor leaves\n{story}'), ('b.txt', f'Anchor leaves\n{story}'),
+                       ('c.txt', 'Rates\nThe Fed held rates steady on Wednesday.')):
+        with open(os.path.join(input_dir, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+    processor = NewsBatchProcessor(input_dir, output_dir, HoldingsMatcher.from_handler(_Holdings()),
+                                   NearDuplicateFilter(), workers=0, settle_s=0.0)
+    stats = processor.run_once()
+    processor.close()
+    assert (stats['articles'], stats['duplicates'], stats['relevant'], stats['irrelevant']) == (3, 1, 1, 1)
+    with open(os.path.join(output_dir, 'queue.jsonl'), encoding='utf-8') as f:
+        queued = [json.loads(line) for line in f]
+    assert [q['id'] for q in queued] == ['a'] and queued[0]['cusips'] == ['12345ABC7']
+    assert sorted(name.split('-')[-1] for name in os.listdir(os.path.join(input_dir, 'processed'))) == \
+        ['a.txt', 'b.txt', 'c.txt']
+
+
+def _write(directory, name, text):
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_reprocessed_names_are_kept_and_bad_json_is_skipped(tmp_path):
+    input_dir, output_dir = str(tmp_path / 'in'), str(tmp_path / 'out')
+    os.makedirs(input_dir)
+    processor = NewsBatchProcessor(input_dir, output_dir, HoldingsMatcher.from_handler(_Holdings()),
+                                   NearDuplicateFilter(), workers=0, settle_s=0.0)
+    _write(input_dir, 'wire.txt', 'Rates\nThe Fed held rates steady on Wednesday.')
+    _write(input_dir, 'list.json', '["not", "an", "article"]')
+    first = processor.run_once()
+    _write(input_dir, 'wire.txt', 'Anchor leaves\nMain Street Plaza in Dallas lost its anchor tenant this week.')
+    second = processor.run_once()
+    processor.close()
+    assert (first['articles'], first['failed'], second['articles']) == (1, 1, 1)
+    processed = os.listdir(os.path.join(input_dir, 'processed'))
+    assert sorted(name.split('-')[-1] for name in processed) == ['list.json', 'wire.txt', 'wire.txt']
+
+
+def test_retried_articles_are_not_duplicates_of_themselves():
+    dedup = NearDuplicateFilter()
+    articles = [{'id': 'a', 'title': 'Anchor leaves', 'text': 'Main Street Plaza in Dallas lost its anchor tenant.'},
+                {'id': 'b', 'title': 'Anchor leaves', 'text': 'Main Street Plaza in Dallas lost its anchor tenant.'}]
+    assert dedup.filter(articles) == [None, 'a']
+    # The same files again, e.g. after the batch failed before it was written
+    assert dedup.filter(articles) == [None, 'a']
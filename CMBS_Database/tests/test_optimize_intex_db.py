@@ -0,0 +1,43 @@
+import os
+import shutil
+import sqlite3
+
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from optimize_intex_db import ensure_optimized_copy, is_sidecar_fresh, sidecar_path_for
+
+
+def test_sidecar_serves_the_same_lookups_from_covering_indexes(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    assert not is_sidecar_fresh(path)
+    sidecar = ensure_optimized_copy(path)
+    assert sidecar == sidecar_path_for(path) and is_sidecar_fresh(path)
+
+    plain, optimized = CMBSDatabaseHandler(path, use_sidecar=False), CMBSDatabaseHandler(path)
+    assert optimized.lookup_db_path == sidecar
+    for cusip in plain.get_all_holdings_cusip()[:20]:
+        deal_id = plain.get_deal_id_by_cusip(cusip)
+        assert optimized.get_deal_id_by_cusip(cusip) == deal_id
+        assert optimized.get_property_info_by_deal_id(deal_id) == plain.get_property_info_by_deal_id(deal_id)
+
+    conn = sqlite3.connect(sidecar)
+    plan = ' '.join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT deal_id FROM deal_tranche WHERE tr_cusip = ?", ('X',)))
+    conn.close()
+    assert 'COVERING INDEX idx_deal_tranche_cusip' in plan
+
+
+def test_changed_snapshot_rebuilds_the_sidecar(synthetic_db, tmp_path):
+    path = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, path)
+    ensure_optimized_copy(path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE deals SET bloomberg_name = 'RENAMED' WHERE rowid = 1")
+    deal_id = conn.execute("SELECT deal_id FROM deals WHERE rowid = 1").fetchone()[0]
+    conn.commit()
+    conn.close()
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not is_sidecar_fresh(path)
+    assert CMBSDatabaseHandler(path).get_bloomberg_name_by_deal_id(deal_id) == 'RENAMED'
+    assert is_sidecar_fresh(path)
@@ -0,0 +1,46 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pipeline_metrics import MetricsRegistry, serve_metrics
+
+
+def test_counters_and_spans_render_as_prometheus_text(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc('rows_fetched_total', 120, table='propinfo')
+    registry.inc('rows_fetched_total', 30, table='propinfo')
+    registry.inc('rows_fetched_total', table='say "hi"\\')
+    registry.inc('rows_fetched_total', table='two\nlines')
+    with registry.span('export'):
+        pass
+    with pytest.raises(KeyError):
+        with registry.span('export'):
+            raise KeyError('x')
+
+    text = registry.render_prometheus()
+    assert 'cmbs_rows_fetched_total{table="propinfo"} 150' in text
+    assert 'cmbs_rows_fetched_total{table="say \\"hi\\"\\\\"} 1' in text
+    assert 'cmbs_rows_fetched_total{table="two\\nlines"} 1' in text
+    assert 'cmbs_errors_total{stage="export"} 1' in text
+    assert 'cmbs_export_seconds_count 2' in text
+    assert registry.snapshot()['timings']['export']['']['count'] == 2
+    path = registry.write_prometheus(str(tmp_path / 'pipeline_metrics.prom'))
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == text
+    registry.reset()
+    assert registry.render_prometheus() == '\n'
+
+
+def test_metrics_are_served_over_http():
+    registry = MetricsRegistry()
+    registry.inc('alerts_total')
+    server = serve_metrics(0, registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert 'cmbs_alerts_total 1' in response.read().decode('utf-8')
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
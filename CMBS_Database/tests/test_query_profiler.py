@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from neo4j_handler import DEAL_CARD_QUERY, LOAD_TRANCHES_QUERY, TRANCHE_SCHEMA_STATEMENTS
+from query_profiler import QueryProfiler, is_profilable, is_read_only
+
+PLAN = {'operatorType': 'ProduceResults', 'dbHits': 3, 'rows': 1,
+        'children': [{'operatorType': 'NodeIndexSeek', 'dbHits': 4, 'rows': 1}]}
+
+
+class _Result:
+    def __init__(self, profiled, counters):
+        self.profiled = profiled
+        self.counters = counters
+
+    def __iter__(self):
+        return iter([{'n': 1}])
+
+    def consume(self):
+        return SimpleNamespace(profile=PLAN if self.profiled else None, result_available_after=1,
+                               result_consumed_after=1, counters=SimpleNamespace(**self.counters))
+
+
+class _Session:
+    def __init__(self, counters=None):
+        self.queries = []
+        self.counters = counters or {}
+
+    def run(self, query, **params):
+        self.queries.append(query)
+        return _Result(query.startswith('PROFILE '), self.counters)
+
+
+def test_call_subqueries_are_reads():
+    assert is_read_only(DEAL_CARD_QUERY)
+    assert is_read_only("MATCH (d:Deal) CALL { WITH d MATCH (d)--(p) RETURN count(p) AS n } RETURN n")
+    assert not is_read_only(LOAD_TRANCHES_QUERY)
+    assert not is_read_only("CALL db.awaitIndexes(300)")
+    assert not is_read_only("MATCH (n) DETACH DELETE n")
+
+
+def test_schema_and_admin_commands_are_not_profiled():
+    assert all(not is_profilable(statement) for statement in TRANCHE_SCHEMA_STATEMENTS)
+    assert not is_profilable("SHOW DATABASES")
+    assert is_profilable(LOAD_TRANCHES_QUERY)
+
+
+def test_profile_all_records_db_hits_and_counters_for_writes():
+    profiler = QueryProfiler(log_path=None, profile_all=True)
+    session = _Session({'nodes_created': 2, 'properties_set': 0})
+    profiler.run(session, LOAD_TRANCHES_QUERY, 'load_tranches', {'rows': []})
+    assert session.queries == [f"PROFILE {LOAD_TRANCHES_QUERY}"]
+    entry = profiler.entries[0]
+    assert entry['db_hits'] == 7
+    assert entry['counters'] == {'nodes_created': 2}
+
+
+def test_slow_subquery_read_is_profiled():
+    profiler = QueryProfiler(slow_ms=0.0, log_path=None)
+    session = _Session()
+    profiler.run(session, DEAL_CARD_QUERY, 'get_deal_card', {'deal_id': '1'})
+    assert session.queries == [DEAL_CARD_QUERY, f"PROFILE {DEAL_CARD_QUERY}"]
+    assert profiler.entries[0]['db_hits'] == 7
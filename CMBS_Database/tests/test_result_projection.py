@@ -0,0 +1,32 @@
+import json
+
+from neo4j import Record
+
+import result_projection
+from result_projection import DealRecord, PropertyRecord, TrancheRecord, deal_id_order, project, to_json
+
+
+def test_projection_is_positional_for_leading_columns_and_by_name_otherwise():
+    positional = [Record(zip(['id', 'name'], [f"{i} Main St, TX", f"Tower {i}"])) for i in range(3)]
+    assert project(positional, PropertyRecord)[2] == PropertyRecord('2 Main St, TX', 'Tower 2')
+    by_name = [Record(zip(['cusip', 'held', 'deal_id'], ['ABC123456', True, '7']))]
+    assert project(by_name, TrancheRecord) == [TrancheRecord('ABC123456', deal_id='7', held=True)]
+    assert project([], DealRecord) == []
+
+
+def test_lister_results_are_records(make_lister):
+    lister = make_lister(lambda query, params: [{'id': '1 Main St, TX', 'name': 'Tower', 'address': '1 Main St, TX'}])
+    assert lister.list_properties_by_deal_id('7') == [PropertyRecord('1 Main St, TX', 'Tower', '1 Main St, TX')]
+
+
+def test_json_is_the_same_with_and_without_orjson(monkeypatch):
+    value = {'deals': [DealRecord('10', 'BBG 10', property_ids=['1 Main St, TX'])], 'total': 1, 'name': 'Café'}
+    encoded = to_json(value)
+    monkeypatch.setattr(result_projection, 'orjson', None)
+    assert json.loads(to_json(value)) == json.loads(encoded) == {
+        'deals': [{'id': '10', 'bloomberg': 'BBG 10', 'cusip': None, 'property_ids': ['1 Main St, TX']}],
+        'total': 1, 'name': 'Café'}
+
+
+def test_deal_ids_sort_numerically_before_others():
+    assert sorted(['10', '9', 'B2', 100, 'A1'], key=deal_id_order) == ['9', '10', 100, 'A1', 'B2']
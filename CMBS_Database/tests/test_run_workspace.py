@@ -0,0 +1,43 @@
+import os
+
+from run_workspace import RunWorkspace, clean_workspace, latest_artifact
+
+
+def _write(path, text='x'):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def test_cleanup_keeps_deliverables(tmp_path):
+    workspace = RunWorkspace.create(str(tmp_path), 'CMBS_H_20250430')
+    archive = workspace.register(_write(workspace.path('cmbs_export_archive.sqlite')), 'archive')
+    rollups = workspace.register(_write(workspace.path('exposure_rollups.sqlite')), 'exposure_rollups')
+    metrics = workspace.register(_write(workspace.path('pipeline_metrics.prom')), 'metrics')
+    combined = workspace.register(_write(workspace.path('combined_cmbs_pltr_nodes.csv')), 'combined_csv')
+    workspace.save(status='complete')
+    assert clean_workspace(workspace.dir) == 1
+    assert not os.path.exists(archive)
+    assert all(os.path.exists(path) for path in (rollups, metrics, combined))
+    assert RunWorkspace.open(workspace.dir).manifest['status'] == 'cleaned'
+
+
+def test_clean_workspace_without_manifest_only_removes_legacy_exports(tmp_path):
+    legacy = _write(str(tmp_path / 'cmbs_pltr_nodes_C1.csv'))
+    other = _write(str(tmp_path / 'notes.csv'))
+    assert clean_workspace(str(tmp_path)) == 1
+    assert not os.path.exists(legacy) and os.path.exists(other)
+
+
+def test_latest_artifact_skips_unfinished_and_current_runs(tmp_path):
+    base = str(tmp_path)
+    assert latest_artifact(base, 'exposure_rollups') is None
+    first = RunWorkspace.create(base, 'snap')
+    first_rollups = first.register(_write(first.path('exposure_rollups.sqlite')), 'exposure_rollups')
+    first.save(status='complete')
+    crashed = RunWorkspace.create(base, 'snap')
+    crashed.register(_write(crashed.path('exposure_rollups.sqlite')), 'exposure_rollups', save=True)
+    current = RunWorkspace.create(base, 'snap')
+    current.register(_write(current.path('exposure_rollups.sqlite')), 'exposure_rollups')
+    current.save(status='complete')
+    assert latest_artifact(base, 'exposure_rollups', exclude=current.dir) == first_rollups
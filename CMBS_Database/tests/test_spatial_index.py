@@ -0,0 +1,29 @@
+import numpy as np
+
+from spatial_index import PropertySpatialIndex, haversine_miles
+
+
+def _records(lats, lons):
+    return [{'deal_id': i % 7, 'bloomberg': f"DEAL {i % 7}", 'property_id': f"p{i}", 'address': f"{i} Main St, TX",
+             'latitude': lat, 'longitude': lon} for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+def test_radius_query_matches_brute_force():
+    rng = np.random.default_rng(7)
+    lats, lons = rng.uniform(25, 50, 2000), rng.uniform(-125, -65, 2000)
+    index = PropertySpatialIndex(_records(lats, lons) + [{'deal_id': 1, 'latitude': None, 'longitude': None}])
+    assert len(index) == 2000
+    for lat, lon, radius in ((32.8, -96.8, 150), (40.7, -74.0, 40), (47.0, -122.0, 300)):
+        expected = {f"p{i}" for i in np.flatnonzero(haversine_miles(lat, lon, lats, lons) <= radius)}
+        hits = index.query_radius(lat, lon, radius)
+        assert {hit['property_id'] for hit in hits} == expected
+        assert [hit['distance_miles'] for hit in hits] == sorted(hit['distance_miles'] for hit in hits)
+
+
+def test_query_wraps_the_antimeridian_and_groups_by_deal():
+    index = PropertySpatialIndex(_records([51.0, 51.0, 51.0], [179.9, -179.9, 170.0]))
+    deals = index.deals_within(51.0, 179.95, 20)
+    assert [deal['deal_id'] for deal in deals] == ['0', '1']
+    assert all(len(deal['properties']) == 1 for deal in deals)
+    assert index.locate('1 main street, tx') == (51.0, -179.9)
+    assert index.locate('9 Nowhere Rd') is None
@@ -0,0 +1,75 @@
+import json
+import shutil
+import sqlite3
+from collections import Counter
+
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from versioned_graph import SnapshotLedger, build_snapshot_graph, delta_statements
+
+
+def _reverse_holdings(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("CREATE TABLE reordered AS SELECT * FROM account_holding ORDER BY rowid DESC; "
+                       "DROP TABLE account_holding; ALTER TABLE reordered RENAME TO account_holding;")
+    conn.close()
+
+
+def test_reordered_holdings_change_nothing(synthetic_db, tmp_path):
+    reordered = str(tmp_path / 'CMBS_H_20250531')
+    shutil.copy(synthetic_db, reordered)
+    _reverse_holdings(reordered)
+    ledger = SnapshotLedger(str(tmp_path / 'ledger.sqlite'))
+    ledger.commit(ledger.diff(build_snapshot_graph(CMBSDatabaseHandler(synthetic_db, use_sidecar=False)), '2025-04-30'))
+    delta = ledger.diff(build_snapshot_graph(CMBSDatabaseHandler(reordered, use_sidecar=False)), '2025-05-31')
+    ledger.close()
+    assert Counter(node['label'] for node in delta['nodes_changed']) == Counter()
+    assert not delta['nodes_added'] and not delta['nodes_removed']
+    assert not delta['edges_added'] and not delta['edges_removed']
+
+
+def test_snapshot_deal_nodes_carry_no_cusip(synthetic_db):
+    graph = build_snapshot_graph(CMBSDatabaseHandler(synthetic_db, use_sidecar=False))
+    deals = [item for item in graph if item['@type'] == 'Deal']
+    assert deals and all('cusip' not in deal for deal in deals)
+
+
+def test_owner_types_are_collected_in_sorted_order():
+    from graph_builder import GraphBuilder
+    first, second = GraphBuilder(), GraphBuilder()
+    for graph, types in ((first, ('Private', 'Public', None)), (second, (None, 'Public', 'Private'))):
+        for owner_type in types:
+            graph.node('PropertyOwner', 'Acme LLC', ownerName='Acme LLC', ownerType=owner_type)
+    assert first.jsonld_graph() == second.jsonld_graph()
+    assert first.jsonld_graph()[0]['ownerType'] == 'Private; Public'
+
+
+def test_per_cusip_exports_carry_no_deal_cusip(synthetic_db, tmp_path):
+    from run_workspace import RunWorkspace
+    handler = CMBSDatabaseHandler(synthetic_db, use_sidecar=False)
+    workspace = RunWorkspace.create(str(tmp_path), 'CMBS_H_20250430')
+    cusip = handler.get_all_holdings_cusip()[0]
+    collected = []
+    handler.export_cusip_data_to_jsonld(cusip, write_jsonld=True, write_csv=False, graph_collector=collected,
+                                        workspace=workspace)
+    with open(workspace.path(f'cmbs_graph_{cusip}.jsonld'), encoding='utf-8') as f:
+        exported = json.load(f)['@graph']
+    for graph in (exported, collected):
+        deals = [item for item in graph if item['@type'] == 'Deal']
+        assert len(deals) == 1 and 'cusip' not in deals[0]
+
+
+def test_readded_node_takes_only_its_new_properties(tmp_path):
+    ledger = SnapshotLedger(str(tmp_path / 'ledger.sqlite'))
+    deal = {'@type': 'Deal', '@id': '7', 'dealId': '7', 'bloomberg': 'OLD 2019-C1', 'note': 'dropped later'}
+    other = {'@type': 'Deal', '@id': '8', 'dealId': '8'}
+    for date, graph in (('2025-01-31', [deal, other]), ('2025-02-28', [other]),
+                        ('2025-03-31', [{'@type': 'Deal', '@id': '7', 'dealId': '7', 'bloomberg': 'NEW'}, other])):
+        delta = ledger.diff(graph, date)
+        ledger.commit(delta)
+    ledger.close()
+    assert [(n['id'], n['props']) for n in delta['nodes_added']] == [('7', {'dealId': '7', 'bloomberg': 'NEW'})]
+
+    (query, params), = [(q, p) for q, p in delta_statements(delta) if 'MERGE (n:Deal' in q]
+    assert 'SET n = row.props' in query and '+=' not in query
+    assert 'ON CREATE SET n.valid_from = $date' in query and 'n.valid_from = valid_from' in query
+    assert params['rows'][0]['props'] == {'dealId': '7', 'bloomberg': 'NEW'}
@@ -0,0 +1,64 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from extract_intex_db_to_kg import CMBSDatabaseHandler
+from versioned_graph import SnapshotLedger, build_snapshot_graph
+from watchlist import Watchlist, validate_rule
+
+
+def _held_deals(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT t.deal_id FROM deal_tranche t JOIN account_holding h ON h.cusip = t.tr_cusip "
+        "ORDER BY t.deal_id")]
+
+
+def test_alerts_follow_exact_properties_and_name_their_deal(synthetic_db, tmp_path):
+    base = str(tmp_path / 'CMBS_H_20250430')
+    shutil.copy(synthetic_db, base)
+    conn = sqlite3.connect(base)
+    watched, other, unwatched = _held_deals(conn)[:3]
+    # The watched deal has a property without an address, sharing the UnknownAddress node with later ones
+    conn.execute("UPDATE propinfo SET address = NULL WHERE rowid = (SELECT min(rowid) FROM propinfo WHERE deal_id = ?)",
+                 (watched,))
+    conn.commit()
+    address, state, msa_name = conn.execute(
+        "SELECT address, state, msa_name FROM propinfo WHERE deal_id = ? AND address IS NOT NULL LIMIT 1",
+        (other,)).fetchone()
+    conn.close()
+
+    nxt = str(tmp_path / 'CMBS_H_20250531')
+    shutil.copy(base, nxt)
+    conn = sqlite3.connect(nxt)
+    conn.execute("UPDATE propinfo SET trustee_prop_type_full = 'Changed' WHERE address = ? AND state = ?",
+                 (address, state))
+    conn.execute("UPDATE propinfo SET address = NULL, owner_name = 'Someone Else' "
+                 "WHERE rowid = (SELECT min(rowid) FROM propinfo WHERE deal_id = ?)", (unwatched,))
+    conn.commit()
+    conn.close()
+
+    ledger = SnapshotLedger(str(tmp_path / 'ledger.sqlite'))
+    ledger.commit(ledger.diff(build_snapshot_graph(CMBSDatabaseHandler(base, use_sidecar=False)), '2025-04-30'))
+    delta = ledger.diff(build_snapshot_graph(CMBSDatabaseHandler(nxt, use_sidecar=False)), '2025-05-31')
+    ledger.close()
+
+    watchlist = Watchlist([
+        {'id': 'deal', 'scope': 'deal', 'key': watched},
+        {'id': 'address', 'scope': 'address', 'key': f"{address.lower()},  {state}",
+         'events': ['property_type_changed']},
+        {'id': 'msa', 'scope': 'msa', 'key': msa_name.upper(), 'events': ['property_type_changed']},
+    ])
+    watchlist.compile(CMBSDatabaseHandler(base, use_sidecar=False))
+    assert f"{address}, {state}" in watchlist.property_index
+    assert 'UnknownAddress' not in watchlist.property_index
+
+    alerts = watchlist.evaluate(delta)
+    assert {alert['rule_id'] for alert in alerts} == {'address', 'msa'}
+    assert all(alert['property_id'] == f"{address}, {state}" and alert['new'] == 'Changed' for alert in alerts)
+    assert all(alert['deal_id'] == str(other) for alert in alerts)
+
+
+def test_rules_cannot_watch_the_unknown_address():
+    with pytest.raises(ValueError):
+        validate_rule({'id': 'r', 'scope': 'address', 'key': 'unknownaddress'})
@@ -0,0 +1,363 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from graph_builder import GraphBuilder
+from pipeline_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Open-ended validity is stored as a far-future date rather than NULL, so
+# "valid_from <= $as_of AND valid_to > $as_of" is a plain range predicate that indexes can serve.
+OPEN_END = '9999-12-31'
+DEFAULT_LEDGER_FILENAME = 'graph_versions.sqlite'
+
+# Target label of each JSON-LD reference key; references that resolve to no node of that label are skipped
+REFERENCE_TARGETS = {
+    'hasProperty': 'Property',
+    'locatedAt': 'Address',
+    'builtAt': 'YearBuilt',
+    'partOfDeal': 'Deal',
+    'propertyType': 'TrusteePropTypeFull',
+    'ownedBy': 'PropertyOwner',
+    'inMsa': 'MSAName',
+    'namedAs': 'PropName',
+    'usedProperty': 'Property',
+    'hasAlias': 'Alias',
+}
+
+_SNAPSHOT_DATE = re.compile(r'(\d{4})(\d{2})(\d{2})')
+
+
+def snapshot_date_from_path(db_path: str) -> str:
+    """
+    Snapshot date of an Intex file, taken from its name (e.g. CMBS_H_20250430 -> 2025-04-30),
+    falling back to the file's modification date.
+    """
+    match = _SNAPSHOT_DATE.search(os.path.basename(db_path))
+    if match:
+        return '-'.join(match.groups())
+    return datetime.date.fromtimestamp(os.path.getmtime(db_path)).isoformat()
+
+
+def normalize_as_of(as_of) -> str:
+    """Accept a date, datetime or 'YYYY-MM-DD'/'YYYYMMDD' string and return 'YYYY-MM-DD'."""
+    if isinstance(as_of, datetime.datetime):
+        return as_of.date().isoformat()
+    if isinstance(as_of, datetime.date):
+        return as_of.isoformat()
+    text = str(as_of).strip()
+    match = _SNAPSHOT_DATE.fullmatch(text.replace('-', ''))
+    if not match:
+        raise ValueError(f"Invalid as_of date: {as_of!r} (expected YYYY-MM-DD)")
+    return '-'.join(match.groups())
+
+
+def relationship_type(key: str) -> str:
+    """Relationship type for a JSON-LD reference key, as jsonld_to_cypher names it."""
+    return key.upper().replace(' ', '_')
+
+
+def _is_reference(value) -> bool:
+    return isinstance(value, dict) and '@id' in value
+
+
+def flatten_jsonld(graph: Iterable[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, str], Dict[str, Any]], set]:
+    """
+    Split JSON-LD @graph items into nodes and edges, keyed by label as well as id
+    (a Property and its Address share the same id string).
+    Returns:
+        Tuple[Dict, set]: {(label, id): properties} and {(src_label, src_id, rel_type, dst_label, dst_id)}
+    """
+    nodes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    references = []
+    for item in graph:
+        label, node_id = item['@type'], str(item['@id'])
+        props = nodes.setdefault((label, node_id), {})
+        for key, value in item.items():
+            if key in ('@id', '@type'):
+                continue
+            # Like jsonld_to_cypher, an empty list counts as a (empty) reference list
+            targets = value if isinstance(value, list) and all(_is_reference(v) for v in value) else \
+                [value] if _is_reference(value) else None
+            if targets is None:
+                props[key] = value
+            else:
+                references.extend((label, node_id, key, str(t['@id'])) for t in targets)
+    edges = set()
+    dangling = 0
+    for src_label, src_id, key, dst_id in references:
+        dst_label = REFERENCE_TARGETS.get(key)
+        if dst_label and (dst_label, dst_id) in nodes:
+            edges.add((src_label, src_id, relationship_type(key), dst_label, dst_id))
+        else:
+            dangling += 1
+    if dangling:
+        logger.debug(f"Skipped {dangling} references to nodes outside the graph.")
+    return nodes, edges
+
+
+def _props_json(props: Dict[str, Any]) -> str:
+    return json.dumps(props, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SnapshotLedger:
+    """
+    Local record of the versions that are currently open in the graph, used to compute
+    the change set between consecutive snapshots without reading the whole graph back from Neo4j.
+    History itself lives in the graph (NodeState nodes and relationship validity intervals).
+    """
+
+    def __init__(self, ledger_path: str):
+        self.ledger_path = ledger_path
+        self.conn = sqlite3.connect(ledger_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_date TEXT PRIMARY KEY, source_path TEXT, recorded_at TEXT,
+                nodes_added INTEGER, nodes_changed INTEGER, nodes_removed INTEGER,
+                edges_added INTEGER, edges_removed INTEGER);
+            CREATE TABLE IF NOT EXISTS open_nodes (
+                label TEXT, id TEXT, props_hash TEXT, valid_from TEXT, PRIMARY KEY (label, id)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS open_edges (
+                src_label TEXT, src_id TEXT, rel TEXT, dst_label TEXT, dst_id TEXT, valid_from TEXT,
+                PRIMARY KEY (src_label, src_id, rel, dst_label, dst_id)) WITHOUT ROWID;
+        """)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def last_snapshot_date(self) -> Optional[str]:
+        row = self.conn.execute("SELECT max(snapshot_date) FROM snapshots").fetchone()
+        return row[0] if row else None
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute("SELECT * FROM snapshots ORDER BY snapshot_date")
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def diff(self, graph: Iterable[Dict[str, Any]], snapshot_date: str) -> Dict[str, Any]:
+        """
+        Compute the change set of a full snapshot graph against the open versions.
+        Args:
+            graph (Iterable[Dict[str, Any]]): JSON-LD @graph items of the whole snapshot
+            snapshot_date (str): 'YYYY-MM-DD'; must be later than the last recorded snapshot
+        Returns:
+            Dict[str, Any]: snapshot_date plus nodes_added/nodes_changed/nodes_removed and edges_added/edges_removed
+        """
+        snapshot_date = normalize_as_of(snapshot_date)
+        last = self.last_snapshot_date()
+        if last and snapshot_date <= last:
+            raise ValueError(f"Snapshot {snapshot_date} is not newer than the last recorded snapshot {last}")
+        start = time.perf_counter()
+        nodes, edges = flatten_jsonld(graph)
+        conn = self.conn
+        conn.execute("DROP TABLE IF EXISTS temp.cur_nodes")
+        conn.execute("DROP TABLE IF EXISTS temp.cur_edges")
+        conn.execute("CREATE TEMP TABLE cur_nodes (label TEXT, id TEXT, props_hash TEXT, PRIMARY KEY (label, id))")
+        conn.execute("CREATE TEMP TABLE cur_edges (src_label TEXT, src_id TEXT, rel TEXT, dst_label TEXT, dst_id TEXT, "
+                     "PRIMARY KEY (src_label, src_id, rel, dst_label, dst_id))")
+        conn.executemany("INSERT INTO cur_nodes VALUES (?, ?, ?)", (
+            (label, node_id, hashlib.sha1(_props_json(props).encode('utf-8')).hexdigest())
+            for (label, node_id), props in nodes.items()))
+        conn.executemany("INSERT INTO cur_edges VALUES (?, ?, ?, ?, ?)", edges)
+
+        def node_rows(query):
+            return [{'label': label, 'id': node_id, 'props': nodes.get((label, node_id), {})}
+                    for label, node_id in conn.execute(query)]
+
+        delta = {
+            'snapshot_date': snapshot_date,
+            'nodes_added': node_rows("SELECT c.label, c.id FROM cur_nodes c LEFT JOIN open_nodes o "
+                                     "ON o.label = c.label AND o.id = c.id WHERE o.id IS NULL"),
+            'nodes_changed': node_rows("SELECT c.label, c.id FROM cur_nodes c JOIN open_nodes o "
+                                       "ON o.label = c.label AND o.id = c.id WHERE o.props_hash != c.props_hash"),
+            'nodes_removed': node_rows("SELECT o.label, o.id FROM open_nodes o LEFT JOIN cur_nodes c "
+                                       "ON o.label = c.label AND o.id = c.id WHERE c.id IS NULL"),
+            'edges_added': [dict(zip(('src_label', 'src_id', 'rel', 'dst_label', 'dst_id'), row)) for row in conn.execute(
+                "SELECT c.* FROM cur_edges c LEFT JOIN open_edges o USING (src_label, src_id, rel, dst_label, dst_id) "
+                "WHERE o.valid_from IS NULL")],
+            'edges_removed': [dict(zip(('src_label', 'src_id', 'rel', 'dst_label', 'dst_id'), row)) for row in conn.execute(
+                "SELECT o.src_label, o.src_id, o.rel, o.dst_label, o.dst_id FROM open_edges o LEFT JOIN cur_edges c "
+                "USING (src_label, src_id, rel, dst_label, dst_id) WHERE c.src_id IS NULL")],
+        }
+        METRICS.observe('snapshot_diff', time.perf_counter() - start)
+        logger.info(f"Snapshot {snapshot_date}: {summarize_delta(delta)} "
+                    f"({len(nodes)} nodes, {len(edges)} edges in {time.perf_counter() - start:.2f}s)")
+        return delta
+
+    def commit(self, delta: Dict[str, Any], source_path: Optional[str] = None) -> None:
+        """Make the snapshot's versions the open ones; call after the delta was applied to the graph."""
+        date = delta['snapshot_date']
+        conn = self.conn
+        conn.execute("DELETE FROM open_nodes WHERE (label, id) IN (SELECT o.label, o.id FROM open_nodes o "
+                     "LEFT JOIN temp.cur_nodes c ON o.label = c.label AND o.id = c.id WHERE c.id IS NULL)")
+        conn.execute("INSERT INTO open_nodes SELECT c.label, c.id, c.props_hash, ? FROM temp.cur_nodes c "
+                     "WHERE true ON CONFLICT (label, id) DO UPDATE SET props_hash = excluded.props_hash, "
+                     "valid_from = excluded.valid_from WHERE open_nodes.props_hash != excluded.props_hash", (date,))
+        conn.execute("DELETE FROM open_edges WHERE (src_label, src_id, rel, dst_label, dst_id) NOT IN "
+                     "(SELECT src_label, src_id, rel, dst_label, dst_id FROM temp.cur_edges)")
+        conn.execute("INSERT OR IGNORE INTO open_edges SELECT *, ? FROM temp.cur_edges", (date,))
+        counts = summarize_delta(delta)
+        conn.execute("INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+            date, source_path, time.strftime('%Y-%m-%dT%H:%M:%S'), counts['nodes_added'], counts['nodes_changed'],
+            counts['nodes_removed'], counts['edges_added'], counts['edges_removed']))
+        conn.commit()
+
+
+def summarize_delta(delta: Dict[str, Any]) -> Dict[str, int]:
+    return {key: len(delta[key]) for key in
+            ('nodes_added', 'nodes_changed', 'nodes_removed', 'edges_added', 'edges_removed')}
+
+
+def delta_statements(delta: Dict[str, Any], batch_size: int = 1000) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Translate a change set into batched, parameterized Cypher. Labels and relationship types cannot be
+    parameters, so rows are grouped by them; each statement is UNWIND $rows over at most batch_size rows.
+
+    Node identity is a stable (:Label {id}) node holding the current properties; every version of its
+    properties is a (:NodeState {valid_from, valid_to}) reached via HAS_STATE. Relationships carry
+    valid_from/valid_to themselves and are closed, never deleted.
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: (query, parameters) pairs, in the order they must run
+    """
+    date = delta['snapshot_date']
+    statements = []
+
+    def add(query, rows):
+        for i in range(0, len(rows), batch_size):
+            statements.append((query, {'rows': rows[i:i + batch_size], 'date': date, 'open_end': OPEN_END}))
+
+    def by(rows, *keys):
+        groups = defaultdict(list)
+        for row in rows:
+            groups[tuple(row[k] for k in keys)].append(row)
+        return sorted(groups.items())
+
+    # Close versions first, then open new ones
+    for (label,), rows in by(delta['nodes_removed'], 'label'):
+        add(f"UNWIND $rows AS row "
+            f"MATCH (n:{label} {{id: row.id}})-[:HAS_STATE]->(s:NodeState {{valid_to: $open_end}}) "
+            f"SET s.valid_to = $date, n.valid_to = $date", rows)
+    for (src_label, rel, dst_label), rows in by(delta['edges_removed'], 'src_label', 'rel', 'dst_label'):
+        add(f"UNWIND $rows AS row "
+            f"MATCH (a:{src_label} {{id: row.src_id}})-[r:{rel} {{valid_to: $open_end}}]->(b:{dst_label} {{id: row.dst_id}}) "
+            f"SET r.valid_to = $date", rows)
+    for (label,), rows in by(delta['nodes_changed'], 'label'):
+        add(f"UNWIND $rows AS row "
+            f"MATCH (n:{label} {{id: row.id}})-[:HAS_STATE]->(old:NodeState {{valid_to: $open_end}}) "
+            f"SET old.valid_to = $date "
+            f"WITH n, row, n.valid_from AS valid_from "
+            f"SET n = row.props, n.id = row.id, n.valid_from = valid_from, n.valid_to = $open_end "
+            f"CREATE (n)-[:HAS_STATE]->(s:NodeState) "
+            f"SET s = row.props, s.id = row.id, s.valid_from = $date, s.valid_to = $open_end", rows)
+    for (label,), rows in by(delta['nodes_added'], 'label'):
+        add(f"UNWIND $rows AS row "
+            f"MERGE (n:{label} {{id: row.id}}) "
+            f"ON CREATE SET n.valid_from = $date "
+            # A node re-added after a removal takes exactly the new properties, not a union with its old ones
+            f"WITH n, row, n.valid_from AS valid_from "
+            f"SET n = row.props, n.id = row.id, n.valid_from = valid_from, n.valid_to = $open_end "
+            f"CREATE (n)-[:HAS_STATE]->(s:NodeState) "
+            f"SET s = row.props, s.id = row.id, s.valid_from = $date, s.valid_to = $open_end", rows)
+    for (src_label, rel, dst_label), rows in by(delta['edges_added'], 'src_label', 'rel', 'dst_label'):
+        add(f"UNWIND $rows AS row "
+            f"MATCH (a:{src_label} {{id: row.src_id}}), (b:{dst_label} {{id: row.dst_id}}) "
+            f"CREATE (a)-[:{rel} {{valid_from: $date, valid_to: $open_end}}]->(b)", rows)
+    return statements
+
+
+def version_index_statements() -> List[str]:
+    """Indexes that serve MERGE/MATCH by id and as-of range predicates on states and relationships."""
+    labels = sorted(set(REFERENCE_TARGETS.values()))
+    statements = [f"CREATE INDEX {label.lower()}_id IF NOT EXISTS FOR (n:{label}) ON (n.id)" for label in labels]
+    statements.append("CREATE INDEX nodestate_validity IF NOT EXISTS FOR (s:NodeState) ON (s.valid_from, s.valid_to)")
+    statements.append("CREATE INDEX nodestate_open IF NOT EXISTS FOR (s:NodeState) ON (s.valid_to)")
+    for rel in sorted({relationship_type(key) for key in REFERENCE_TARGETS}):
+        statements.append(f"CREATE INDEX {rel.lower()}_validity IF NOT EXISTS "
+                          f"FOR ()-[r:{rel}]-() ON (r.valid_from, r.valid_to)")
+    return statements
+
+
+def build_snapshot_graph(db_handler, geocoder=None, entity_map=None) -> List[Dict[str, Any]]:
+    """
+    Build the JSON-LD @graph of every held CUSIP of a snapshot, without writing export files.
+    Nodes shared between CUSIPs (deals, years, MSAs, ...) appear once, and each deal's subgraph is built once.
+    """
+    graph = GraphBuilder()
+    db_handler.export_holdings(geocoder=geocoder, write_csv=False, graph_collector=graph, entity_map=entity_map)
+    return graph.jsonld_graph()
+
+
+def record_snapshot(graph: List[Dict[str, Any]], snapshot_date: str, ledger_path: str,
+                    deal_lister=None, source_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Diff a snapshot graph against the ledger, load the changes into Neo4j (if a DealLister is given)
+    and record the snapshot. The ledger is only updated after the graph write succeeded.
+    Returns:
+        Dict[str, Any]: The change set
+    """
+    ledger = SnapshotLedger(ledger_path)
+    try:
+        delta = ledger.diff(graph, snapshot_date)
+        if deal_lister is not None:
+            deal_lister.load_snapshot_delta(delta)
+        ledger.commit(delta, source_path)
+        return delta
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Load an Intex snapshot into the versioned graph as a change set.')
+    parser.add_argument('db_path', help='Path to the Intex SQLite database')
+    parser.add_argument('--snapshot-date', default=None, help='YYYY-MM-DD (default: taken from the file name)')
+    parser.add_argument('--ledger', default=None, help=f'Version ledger (default: {DEFAULT_LEDGER_FILENAME} next to the DB)')
+    parser.add_argument('--neo4j-uri', default=None, help='Apply the changes to this Neo4j (default: only record them)')
+    parser.add_argument('--neo4j-user', default='neo4j')
+    parser.add_argument('--neo4j-password', default='testtest')
+    parser.add_argument('--database', default='gi-cmbs')
+    parser.add_argument('--watchlist', default=None, help='Evaluate the change set against this watchlist (see watchlist.py)')
+    parser.add_argument('--alerts', default=None, help='Append alert events to this JSON Lines file '
+                                                       '(default: watchlist_alerts.jsonl next to the watchlist)')
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get('CMBS_LOG_LEVEL', 'INFO'))
+
+    from entity_resolution import resolve_entities
+    from extract_intex_db_to_kg import CMBSDatabaseHandler
+    from get_geo_from_address import geocode_propinfo_addresses
+    handler = CMBSDatabaseHandler(args.db_path)
+    geocoder = geocode_propinfo_addresses(handler)
+    # The same canonical owner and property names as the export, so node ids match across both
+    entity_map, _ = resolve_entities(handler)
+    snapshot_graph = build_snapshot_graph(handler, geocoder, entity_map)
+    geocoder.close()
+
+    lister = None
+    if args.neo4j_uri:
+        from neo4j_handler import DealLister
+        lister = DealLister(args.neo4j_uri, args.neo4j_user, args.neo4j_password, args.database)
+        lister.ensure_version_indexes()
+    try:
+        ledger_path = args.ledger or os.path.join(os.path.dirname(os.path.abspath(args.db_path)), DEFAULT_LEDGER_FILENAME)
+        change_set = record_snapshot(snapshot_graph, args.snapshot_date or snapshot_date_from_path(args.db_path),
+                                     ledger_path, lister, source_path=os.path.abspath(args.db_path))
+        if lister:
+            lister.load_tranches(handler.get_tranche_rows())
+        summary = summarize_delta(change_set)
+        if args.watchlist:
+            from watchlist import DEFAULT_ALERTS_FILENAME, process_snapshot
+            alerts_path = args.alerts or os.path.join(os.path.dirname(os.path.abspath(args.watchlist)),
+                                                      DEFAULT_ALERTS_FILENAME)
+            summary['alerts'] = len(process_snapshot(args.watchlist, change_set, handler, alerts_path))
+        print(json.dumps(summary))
+    finally:
+        if lister:
+            lister.close()
@@ -0,0 +1,358 @@
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from get_geo_from_address import UNKNOWN_ADDRESS, format_property_address
+from lookup_tables import normalize_key
+from pipeline_metrics import METRICS
+from result_projection import deal_id_order
+from versioned_graph import relationship_type
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCHLIST_FILENAME = 'watchlist.json'
+DEFAULT_ALERTS_FILENAME = 'watchlist_alerts.jsonl'
+# What a rule can watch: the rule's key is a CUSIP, a deal id, a property address ("address, ST") or an MSA name
+WATCH_SCOPES = ('cusip', 'deal', 'address', 'msa')
+# Alert events derived from a snapshot change set (see versioned_graph.SnapshotLedger.diff)
+ALERT_EVENTS = ('property_added', 'property_removed', 'property_type_changed', 'owner_changed',
+                'bloomberg_name_changed')
+# Property-level events and the relationship whose target changed
+_ATTRIBUTE_EVENTS = {
+    'property_type_changed': relationship_type('propertyType'),
+    'owner_changed': relationship_type('ownedBy'),
+}
+_HAS_PROPERTY = relationship_type('hasProperty')
+_IN_MSA = relationship_type('inMsa')
+_IN_CLAUSE_BATCH = 500
+
+
+def validate_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check a rule {"id", "scope", "key", optional "events"} and return it with events defaulting to all.
+    Raises:
+        ValueError: On a missing id or key, or an unknown scope or event
+    """
+    if not rule.get('id') or rule.get('key') in (None, ''):
+        raise ValueError(f"A watchlist rule needs an id and a key: {rule}")
+    if rule.get('scope') not in WATCH_SCOPES:
+        raise ValueError(f"Rule '{rule['id']}' has scope {rule.get('scope')!r}; expected one of {WATCH_SCOPES}")
+    if rule['scope'] == 'address' and normalize_key(rule['key']) == normalize_key(UNKNOWN_ADDRESS):
+        raise ValueError(f"Rule '{rule['id']}' watches {UNKNOWN_ADDRESS}, the id shared by properties without an "
+                         f"address; watch their deal instead")
+    events = rule.get('events') or list(ALERT_EVENTS)
+    unknown = sorted(set(events) - set(ALERT_EVENTS))
+    if unknown:
+        raise ValueError(f"Rule '{rule['id']}' watches unknown events {unknown}; expected {ALERT_EVENTS}")
+    return {**rule, 'key': str(rule['key']), 'events': list(events)}
+
+
+def _deal_param(deal_id: str):
+    """deal_id is an INTEGER column; bind numeric ids as integers so its index is used."""
+    return int(deal_id) if deal_id.isdigit() else deal_id
+
+
+def _batched(values: List, size: int = _IN_CLAUSE_BATCH) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class Watchlist:
+    """
+    Standing rules over CUSIPs, deals, addresses and MSAs, compiled against a snapshot into two indexes:
+    deal id -> rule ids (deal and CUSIP rules) and property id -> rule ids (every rule, through the properties it
+    covers, keyed on the exact Property node id). Evaluating a change set then only looks up the deals and
+    properties the changes touch, so the cost follows the size of the change set, not of the book or the watchlist.
+    Properties the compiled snapshot did not have are matched on their normalized address and on the MSA they were
+    added in, and properties without an address (all sharing the UNKNOWN_ADDRESS node) only through their deal.
+
+    Compile against the snapshot the next change set is diffed from: the compiled Bloomberg names are the "before"
+    values of bloomberg_name_changed, and evaluate() refreshes them from the change set it processed.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        self.deal_index: Dict[str, List[str]] = {}
+        self.property_index: Dict[str, List[str]] = {}
+        # Normalized address / MSA name -> address / MSA rule ids, for properties added after the compile
+        self.address_index: Dict[str, List[str]] = {}
+        self.msa_index: Dict[str, List[str]] = {}
+        # Deals of each indexed property, reported with its property-level alerts
+        self.property_deals: Dict[str, List[str]] = {}
+        self.deal_names: Dict[str, Optional[str]] = {}
+        # Deal of each deal or CUSIP rule, reported with its property-level alerts
+        self.rule_deals: Dict[str, str] = {}
+        self.compiled_from: Optional[str] = None
+        for rule in rules or ():
+            self.add_rule(rule)
+
+    def add_rule(self, rule: Dict[str, Any]) -> None:
+        """Add or replace a rule; takes effect at the next compile()."""
+        rule = validate_rule(rule)
+        self.rules[rule['id']] = rule
+
+    def remove_rule(self, rule_id: str) -> None:
+        self.rules.pop(rule_id, None)
+
+    def compile(self, db_handler) -> Dict[str, int]:
+        """
+        Resolve the rules against a snapshot: CUSIPs to deals, deals, addresses and MSAs to their properties, and
+        record the Bloomberg names of the watched deals. Only the watched keys are queried.
+        Args:
+            db_handler (CMBSDatabaseHandler): Snapshot the next change set will be diffed from
+        Returns:
+            Dict[str, int]: Rule and index sizes
+        """
+        with METRICS.span('watchlist_compile'):
+            by_scope = defaultdict(list)
+            for rule in self.rules.values():
+                by_scope[rule['scope']].append(rule)
+
+            deal_rules = defaultdict(set)
+            for rule in by_scope['deal']:
+                deal_rules[rule['key']].add(rule['id'])
+            cusip_deals = db_handler.get_deal_ids_by_cusips([r['key'] for r in by_scope['cusip']])
+            for rule in by_scope['cusip']:
+                if rule['key'] in cusip_deals:
+                    deal_rules[cusip_deals[rule['key']]].add(rule['id'])
+                else:
+                    logger.warning(f"Watchlist rule '{rule['id']}': CUSIP {rule['key']} is not in deal_tranche.")
+            address_rules = defaultdict(set)
+            for rule in by_scope['address']:
+                address_rules[normalize_key(rule['key'])].add(rule['id'])
+            msa_rules = defaultdict(set)
+            for rule in by_scope['msa']:
+                msa_rules[normalize_key(rule['key'])].add(rule['id'])
+
+            property_rules, property_deals = defaultdict(set), defaultdict(set)
+            for rule_ids, deal_id, property_id in chain(
+                    ((deal_rules[d], d, p) for d, p in self._deal_properties(db_handler, list(deal_rules))),
+                    self._address_properties(db_handler, address_rules),
+                    self._msa_properties(db_handler, msa_rules)):
+                if property_id != UNKNOWN_ADDRESS:
+                    property_rules[property_id].update(rule_ids)
+                    property_deals[property_id].add(deal_id)
+
+            self.deal_index = {deal_id: sorted(ids) for deal_id, ids in deal_rules.items()}
+            self.property_index = {property_id: sorted(ids) for property_id, ids in property_rules.items()}
+            self.address_index = {key: sorted(ids) for key, ids in address_rules.items()}
+            self.msa_index = {key: sorted(ids) for key, ids in msa_rules.items()}
+            self.property_deals = {property_id: sorted(ids, key=deal_id_order)
+                                   for property_id, ids in property_deals.items()}
+            self.rule_deals = {rule_id: deal_id for deal_id, ids in deal_rules.items() for rule_id in ids}
+            self.deal_names = self._deal_names(db_handler, list(self.deal_index))
+            self.compiled_from = os.path.basename(db_handler.db_path)
+        stats = {'rules': len(self.rules), 'deals': len(self.deal_index), 'properties': len(self.property_index)}
+        logger.info(f"Watchlist compiled against {self.compiled_from}: {stats}")
+        return stats
+
+    @staticmethod
+    def _deal_properties(db_handler, deal_ids: List[str]):
+        for batch in _batched(deal_ids):
+            where = f"deal_id IN ({', '.join('?' * len(batch))})"
+            for rows in db_handler.iter_table('propinfo', ['deal_id', 'address', 'state'], where,
+                                              tuple(_deal_param(d) for d in batch)):
+                for deal_id, address, state in rows:
+                    yield str(deal_id), format_property_address(address, state)
+
+    @staticmethod
+    def _address_properties(db_handler, address_rules: Dict[str, Set[str]]):
+        """(rule ids, deal id, property id) of the properties whose address matches an address rule."""
+        if not address_rules:
+            return
+        for rows in db_handler.iter_table('propinfo', ['deal_id', 'address', 'state'], 'address IS NOT NULL'):
+            for deal_id, address, state in rows:
+                property_id = format_property_address(address, state)
+                rule_ids = address_rules.get(normalize_key(property_id))
+                if rule_ids:
+                    yield rule_ids, str(deal_id), property_id
+
+    @staticmethod
+    def _msa_properties(db_handler, msa_rules: Dict[str, Set[str]]):
+        """(rule ids, deal id, property id) of the properties in an MSA of an MSA rule."""
+        if not msa_rules:
+            return
+        names = db_handler.execute_custom_query("SELECT DISTINCT msa_name FROM propinfo WHERE msa_name IS NOT NULL")
+        matched = [name for name in names['msa_name'] if normalize_key(name) in msa_rules] if not names.empty else []
+        for batch in _batched(matched):
+            where = f"msa_name IN ({', '.join('?' * len(batch))})"
+            for rows in db_handler.iter_table('propinfo', ['msa_name', 'deal_id', 'address', 'state'], where,
+                                              tuple(batch)):
+                for msa_name, deal_id, address, state in rows:
+                    yield msa_rules[normalize_key(msa_name)], str(deal_id), format_property_address(address, state)
+
+    @staticmethod
+    def _deal_names(db_handler, deal_ids: List[str]) -> Dict[str, Optional[str]]:
+        names = {}
+        for batch in _batched(deal_ids):
+            where = f"deal_id IN ({', '.join('?' * len(batch))})"
+            for rows in db_handler.iter_table('deals', ['deal_id', 'bloomberg_name'], where,
+                                              tuple(_deal_param(d) for d in batch)):
+                names.update((str(deal_id), name) for deal_id, name in rows)
+        return names
+
+    def _rules_for(self, deal_id: Optional[str], property_id: Optional[str], event: str,
+                   added_msas: Dict[str, List[str]]) -> List[str]:
+        rule_ids = set(self.deal_index.get(deal_id, ())) if deal_id is not None else set()
+        if property_id is not None and property_id != UNKNOWN_ADDRESS:
+            if property_id in self.property_index:
+                rule_ids.update(self.property_index[property_id])
+            else:
+                # Not in the compiled snapshot: match address rules, and MSA rules on the MSAs it was added in
+                rule_ids.update(self.address_index.get(normalize_key(property_id), ()))
+                for msa_name in added_msas.get(property_id, ()):
+                    rule_ids.update(self.msa_index.get(normalize_key(msa_name), ()))
+        # Rules removed since the last compile may still be indexed
+        return sorted(r for r in rule_ids if r in self.rules and event in self.rules[r]['events'])
+
+    def _alert_deal(self, deal_id: Optional[str], property_id: Optional[str], rule_id: str) -> Optional[str]:
+        """Deal of an alert: the changed deal, else the deal of a deal or CUSIP rule, else the property's deals."""
+        if deal_id is not None:
+            return deal_id
+        if rule_id in self.rule_deals:
+            return self.rule_deals[rule_id]
+        return ', '.join(self.property_deals.get(property_id, ())) or None
+
+    def evaluate(self, delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Alert events of a snapshot change set: one per (matching rule, change). A change is looked up in the
+        indexes by its deal and property, so only rules covering them are considered.
+        Args:
+            delta (Dict[str, Any]): Change set of versioned_graph.SnapshotLedger.diff
+        Returns:
+            List[Dict[str, Any]]: snapshot_date, rule_id, scope, key, event, deal_id, property_id, old, new
+        """
+        start = time.perf_counter()
+        changes = []
+        for kind, event in (('edges_added', 'property_added'), ('edges_removed', 'property_removed')):
+            for edge in delta[kind]:
+                if edge['rel'] == _HAS_PROPERTY:
+                    changes.append((event, edge['src_id'], edge['dst_id'], None, None))
+
+        # A property that appeared or disappeared reports its attribute edges too; those are not attribute changes
+        moved = {n['id'] for key in ('nodes_added', 'nodes_removed') for n in delta[key] if n['label'] == 'Property'}
+        for event, rel in _ATTRIBUTE_EVENTS.items():
+            targets = defaultdict(lambda: ([], []))
+            for index, kind in enumerate(('edges_removed', 'edges_added')):
+                for edge in delta[kind]:
+                    if edge['rel'] == rel and edge['src_label'] == 'Property' and edge['src_id'] not in moved:
+                        targets[edge['src_id']][index].append(edge['dst_id'])
+            for property_id, (old, new) in targets.items():
+                changes.append((event, None, property_id, ', '.join(sorted(old)) or None, ', '.join(sorted(new)) or None))
+
+        for node in delta['nodes_changed']:
+            if node['label'] == 'Deal' and node['id'] in self.deal_names:
+                new_name = node['props'].get('bloomberg')
+                # The export writes a missing name as "None"
+                new_name = None if new_name == 'None' else new_name
+                old_name = self.deal_names[node['id']]
+                if new_name != old_name:
+                    changes.append(('bloomberg_name_changed', node['id'], None, old_name, new_name))
+                    self.deal_names[node['id']] = new_name
+
+        added_msas = defaultdict(list)
+        for edge in delta['edges_added']:
+            if edge['rel'] == _IN_MSA and edge['src_label'] == 'Property':
+                added_msas[edge['src_id']].append(edge['dst_id'])
+
+        alerts = []
+        for event, deal_id, property_id, old, new in changes:
+            for rule_id in self._rules_for(deal_id, property_id, event, added_msas):
+                rule = self.rules[rule_id]
+                alerts.append({'snapshot_date': delta['snapshot_date'], 'rule_id': rule_id, 'scope': rule['scope'],
+                               'key': rule['key'], 'event': event,
+                               'deal_id': self._alert_deal(deal_id, property_id, rule_id),
+                               'property_id': property_id, 'old': old, 'new': new})
+                METRICS.inc('watchlist_alerts_total', event=event)
+        METRICS.observe('watchlist_evaluate', time.perf_counter() - start)
+        logger.info(f"Watchlist: {len(alerts)} alerts from {len(changes)} candidate changes of snapshot "
+                    f"{delta['snapshot_date']} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return alerts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'rules': list(self.rules.values()), 'compiled_from': self.compiled_from,
+                'deal_index': self.deal_index, 'property_index': self.property_index,
+                'address_index': self.address_index, 'msa_index': self.msa_index,
+                'property_deals': self.property_deals, 'deal_names': self.deal_names, 'rule_deals': self.rule_deals}
+
+    def save(self, path: str) -> str:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'Watchlist':
+        """A saved watchlist with its compiled indexes; a file with only "rules" still needs compile()."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        watchlist = cls(data.get('rules', []))
+        watchlist.compiled_from = data.get('compiled_from')
+        watchlist.deal_index = data.get('deal_index', {})
+        watchlist.property_index = data.get('property_index', {})
+        watchlist.address_index = data.get('address_index', {})
+        watchlist.msa_index = data.get('msa_index', {})
+        watchlist.property_deals = data.get('property_deals', {})
+        watchlist.deal_names = data.get('deal_names', {})
+        watchlist.rule_deals = data.get('rule_deals', {})
+        return watchlist
+
+
+def write_alerts(alerts: List[Dict[str, Any]], path: str) -> None:
+    """Append alert events to a JSON Lines file."""
+    with open(path, 'a', encoding='utf-8') as f:
+        for alert in alerts:
+            f.write(json.dumps(alert, ensure_ascii=False) + '\n')
+
+
+def process_snapshot(watchlist_path: str, delta: Dict[str, Any], db_handler,
+                     alerts_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluate a recorded snapshot's change set against a saved watchlist, append the alerts, then recompile the
+    watchlist against that snapshot (the base of the next change set) and save it.
+    """
+    watchlist = Watchlist.load(watchlist_path)
+    if watchlist.compiled_from is None:
+        logger.warning(f"Watchlist {watchlist_path} was never compiled; only deal-level rules can match.")
+    alerts = watchlist.evaluate(delta)
+    if alerts_path:
+        write_alerts(alerts, alerts_path)
+    watchlist.compile(db_handler)
+    watchlist.save(watchlist_path)
+    return alerts
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage the standing-query watchlist of held securities.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add = subparsers.add_parser('add', help='Add a rule')
+    add.add_argument('watchlist', help='Watchlist file')
+    add.add_argument('rule_id')
+    add.add_argument('scope', choices=WATCH_SCOPES)
+    add.add_argument('key', help='CUSIP, deal id, property address ("address, ST") or MSA name')
+    add.add_argument('--events', default=None, help=f'Comma-separated subset of {",".join(ALERT_EVENTS)}')
+    remove = subparsers.add_parser('remove', help='Remove a rule')
+    remove.add_argument('watchlist')
+    remove.add_argument('rule_id')
+    compile_ = subparsers.add_parser('compile', help='Compile the rules against the latest recorded snapshot')
+    compile_.add_argument('watchlist')
+    compile_.add_argument('db_path', help='Path to the Intex SQLite database')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    watchlist = Watchlist.load(args.watchlist) if os.path.exists(args.watchlist) else Watchlist()
+    if args.command == 'add':
+        watchlist.add_rule({'id': args.rule_id, 'scope': args.scope, 'key': args.key,
+                            'events': args.events.split(',') if args.events else None})
+    elif args.command == 'remove':
+        watchlist.remove_rule(args.rule_id)
+    else:
+        from extract_intex_db_to_kg import CMBSDatabaseHandler
+        print(json.dumps(watchlist.compile(CMBSDatabaseHandler(args.db_path))))
+    watchlist.save(args.watchlist)